@@ -0,0 +1,54 @@
+'''
+Benchmark isotopic distributions: convolving atom by atom, the cached
+element powers per peptide, and the batch calculation.
+Run from the repository root with: python -m benchmarks.bench_isotopes
+'''
+import time
+import numpy as np
+from block_maker.cache import ELEMENTS
+from block_maker.isotopes import ISOTOPES, IsotopeCalculator
+from block_maker.peptide import Peptide
+from .bench_peptide import random_sequences
+
+
+def atom_by_atom(composition, n_peaks):
+    '''Return the abundances of the isotopologues, one atom at a time.'''
+    abundances = np.zeros(n_peaks)
+    abundances[0] = 1.0
+    for element in ELEMENTS:
+        atom = np.array([abundance for _, abundance in ISOTOPES[element]])
+        for _ in range(composition[element]):
+            abundances = np.convolve(abundances, atom)[:n_peaks]
+    return abundances
+
+
+def main(n_peaks = 5):
+    settings = ("Iodo- or chloroacetamide", True, [])
+    for length, number in ((15, 100000), (50, 20000)):
+        peptides = [
+            Peptide("BLCK", sequence, *settings)
+            for sequence in random_sequences(number, length)
+        ]
+        start = time.perf_counter()
+        for peptide in peptides[:1000]:
+            atom_by_atom(peptide.composition, n_peaks)
+        naive = (time.perf_counter() - start) / 1000
+        calculator = IsotopeCalculator(n_peaks)
+        start = time.perf_counter()
+        for peptide in peptides:
+            calculator.peptide_distribution(peptide)
+        single = (time.perf_counter() - start) / number
+        calculator = IsotopeCalculator(n_peaks)
+        start = time.perf_counter()
+        calculator.peptide_distributions(peptides)
+        batch = (time.perf_counter() - start) / number
+        print(
+            f"length {length:>3}, {number} peptides: "
+            f"atom by atom {naive * 1e6:.0f} us, "
+            f"cached powers {single * 1e6:.1f} us, "
+            f"batch {batch * 1e6:.1f} us per peptide"
+        )
+
+
+if __name__ == "__main__":
+    main()
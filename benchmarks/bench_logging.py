@@ -0,0 +1,67 @@
+'''
+Benchmark logging per block: the original write_to_log, which opens the log
+file for every message, and the log module, which queues one record per
+block for a listener thread (with and without the JSON lines log).
+Run from the repository root with: python -m benchmarks.bench_logging
+'''
+import datetime
+import os
+import tempfile
+import time
+from block_maker import log
+
+
+def write_to_log_original(path, message):
+    '''The original write_to_log, reopening the log file for every message.'''
+    with open(path, "a") as file:
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        file.write(log.format_log_entry(message, timestamp))
+
+
+def block_messages(i):
+    '''Return log messages like those of one block file.'''
+    return [
+        f"Start processing block 'B{i}' with sequence 'PEPTIDEK'...",
+        f"Writing sequence 'PEPTIDEK' info to block file 'B{i}.block':",
+        f"'B{i}.block' created in 'output'"
+    ]
+
+
+def main(number = 50000):
+    record = {"block_name": "B", "sequence": "PEPTIDEK", "mass": 927.45}
+    with tempfile.TemporaryDirectory() as output_dir:
+        path = os.path.join(output_dir, "original.log")
+        start = time.perf_counter()
+        for i in range(number):
+            for message in block_messages(i):
+                write_to_log_original(path, message)
+        seconds = time.perf_counter() - start
+        print(f"{'write_to_log':>16}: {seconds / number * 1e6:8.1f} us/block")
+
+        for name, json_path in (
+            ("log module", None),
+            ("log module, JSON", os.path.join(output_dir, "blocks.jsonl"))
+        ):
+            log.configure(
+                path = os.path.join(output_dir, "queued.log"),
+                json_path = json_path
+            )
+            logger = log.get_logger()
+            start = time.perf_counter()
+            for i in range(number):
+                log.log_block(
+                    logger, block_messages(i),
+                    record if json_path is not None else None
+                )
+            queued = time.perf_counter() - start
+            log.flush()
+            seconds = time.perf_counter() - start
+            print(
+                f"{name:>16}: {queued / number * 1e6:8.1f} us/block queued, "
+                f"{seconds / number * 1e6:8.1f} us/block written"
+            )
+            log.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+'''
+Benchmark the mass index: building it, single m/z queries and batch queries,
+compared to a linear scan over all peptides.
+Run from the repository root with: python -m benchmarks.bench_mass_index
+'''
+import random
+import time
+from block_maker.mass_index import MassIndex, mz_value
+from .bench_peptide import random_sequences
+
+
+def linear_scan(peptides, mz, tolerance_ppm, max_charge):
+    '''Return the matches of an m/z value by checking every peptide.'''
+    return [
+        (peptide, charge)
+        for charge in range(1, max_charge + 1)
+        for peptide in peptides
+        if abs(mz_value(peptide.mass, charge) - mz) <= mz * tolerance_ppm * 1e-6
+    ]
+
+
+def main():
+    settings = ("Iodo- or chloroacetamide", True, [])
+    rng = random.Random(0)
+    for number in (10000, 100000):
+        entries = [
+            (f"B{i}", sequence)
+            for i, sequence in enumerate(random_sequences(number, 15))
+        ]
+        start = time.perf_counter()
+        index = MassIndex.from_entries(entries, *settings)
+        build = time.perf_counter() - start
+
+        # Observed m/z values close to those of random peptides.
+        mzs = [
+            mz_value(rng.choice(index.peptides).mass, rng.randint(1, 4))
+            + rng.uniform(-0.005, 0.005)
+            for _ in range(10000)
+        ]
+        start = time.perf_counter()
+        # Keep the results, like query_batch does.
+        results = [index.query(mz, 10, 4) for mz in mzs]
+        single = time.perf_counter() - start
+        start = time.perf_counter()
+        results = index.query_batch(mzs, 10, 4)
+        batch = time.perf_counter() - start
+        start = time.perf_counter()
+        for mz in mzs[:20]:
+            linear_scan(index.peptides, mz, 10, 4)
+        scan = (time.perf_counter() - start) / 20
+        print(
+            f"{number:>7} peptides: build {build:.2f} s, "
+            f"query {single / len(mzs) * 1e6:.1f} us, "
+            f"batch {batch / len(mzs) * 1e6:.1f} us, "
+            f"linear scan {scan * 1e6:.0f} us per m/z value"
+        )
+
+
+if __name__ == "__main__":
+    main()
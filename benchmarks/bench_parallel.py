@@ -0,0 +1,30 @@
+'''
+Benchmark parallel block generation for an increasing number of workers.
+Run from the repository root with: python -m benchmarks.bench_parallel
+'''
+import os
+import tempfile
+from block_maker import parallel
+from .bench_peptide import random_sequences
+
+
+def main(number = 50000):
+    settings = ("Iodo- or chloroacetamide", True, ["K", "R"])
+    entries = [
+        (f"B{i}", sequence)
+        for i, sequence in enumerate(random_sequences(number, 15))
+    ]
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        with tempfile.TemporaryDirectory() as output_dir:
+            writer = parallel.generate_blocks(
+                entries, *settings, output_dir = output_dir,
+                workers = workers,
+                log_path = os.path.join(output_dir, "BlockMaker.log")
+            )
+        print(f"{workers:>3} workers: {writer.files_per_second:10.0f} files/s")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
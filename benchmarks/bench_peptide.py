@@ -0,0 +1,149 @@
+'''
+Benchmark Peptide construction for short and long sequences, compared with
+the original Peptide, which loops over the sequence for every calculation.
+Also compare memory use and throughput (including the calculation of the
+mass) of Peptide and CompactPeptide.
+Run from the repository root with: python -m benchmarks.bench_peptide
+'''
+import random
+import timeit
+import tracemalloc
+from block_maker.peptide import CompactPeptide, Peptide
+from block_maker.resources import amino_acids
+from block_maker.resources import constants
+
+
+class OriginalPeptide():
+    '''
+    The composition and mass calculations of the original Peptide, for
+    comparison. Supports the cysteine treatments, methionine oxidation and
+    isotope labeling of the original.
+    '''
+    def __init__(self, block_name, sequence, cysteine_treatment,
+                 methionine_oxidation, isotope_labeling):
+        self.block_name = block_name
+        self.sequence = sequence
+        self.cysteine_treatment = cysteine_treatment
+        self.methionine_oxidation = methionine_oxidation
+        self.isotope_labeling = isotope_labeling
+        self.composition = self.get_composition()
+        self.mass = self.calculate_peptide_mass()
+
+    def get_composition(self):
+        '''Return the composition, adding up the residues one by one.'''
+        composition = {
+            "carbons": 0, "hydrogens": 2, "nitrogens": 0, "oxygens": 1,
+            "sulfurs": 0
+        }
+        for amino_acid in self.sequence:
+            residue = amino_acids.compositions[amino_acid]
+            composition["carbons"] += residue["carbons"]
+            composition["hydrogens"] += residue["hydrogens"]
+            composition["nitrogens"] += residue["nitrogens"]
+            composition["oxygens"] += residue["oxygens"]
+            composition["sulfurs"] += residue["sulfurs"]
+        cysteines = self.sequence.count("C")
+        if self.cysteine_treatment == "Iodo- or chloroacetamide":
+            composition["carbons"] += 2 * cysteines
+            composition["hydrogens"] += 3 * cysteines
+            composition["nitrogens"] += cysteines
+            composition["oxygens"] += cysteines
+        elif self.cysteine_treatment == "Iodo- or chloroacetic acid":
+            composition["carbons"] += 2 * cysteines
+            composition["hydrogens"] += 2 * cysteines
+            composition["oxygens"] += 2 * cysteines
+        if self.methionine_oxidation:
+            composition["oxygens"] += self.sequence.count("M")
+        for amino_acid in self.isotope_labeling:
+            count = self.sequence.count(amino_acid)
+            composition["carbons"] -= amino_acids.compositions[amino_acid]["carbons"] * count
+            composition["nitrogens"] -= amino_acids.compositions[amino_acid]["nitrogens"] * count
+        return composition
+
+    def calculate_peptide_mass(self):
+        '''Return the mass, adding up the residues one by one.'''
+        mass = 0
+        for amino_acid in self.sequence:
+            mass += amino_acids.masses[amino_acid]
+        mass += constants.WATER_MASS
+        cysteines = self.sequence.count("C")
+        if self.cysteine_treatment == "Iodo- or chloroacetamide":
+            mass += (constants.ACETAMIDE_GROUP_MASS - constants.HYDROGEN_MASS) * cysteines
+        elif self.cysteine_treatment == "Iodo- or chloroacetic acid":
+            mass += (constants.ACETIC_ACID_GROUP_MASS - constants.HYDROGEN_MASS) * cysteines
+        if self.methionine_oxidation:
+            mass += constants.OXYGEN_MASS * self.sequence.count("M")
+        for amino_acid in self.isotope_labeling:
+            count = self.sequence.count(amino_acid)
+            mass += constants.C13_MASS_DIFF * amino_acids.compositions[amino_acid]["carbons"] * count
+            mass += constants.N15_MASS_DIFF * amino_acids.compositions[amino_acid]["nitrogens"] * count
+        return round(mass, 9)
+
+
+def random_sequences(number, length, seed = 0):
+    '''Return a list with random peptide sequences of a given length.'''
+    rng = random.Random(seed)
+    residues = list(amino_acids.compositions.keys())
+    return [
+        "".join(rng.choices(residues, k = length)) for _ in range(number)
+    ]
+
+
+def construct(peptide_class, sequences, settings):
+    '''Return peptide objects for sequences, with their mass calculated.'''
+    peptides = [peptide_class("BLCK", sequence, *settings) for sequence in sequences]
+    for peptide in peptides:
+        peptide.mass
+    return peptides
+
+
+def memory_per_object(peptide_class, sequences, settings):
+    '''
+    Return the memory (bytes) per peptide object, with composition and
+    mass calculated, excluding the sequence strings themselves.
+    '''
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    peptides = [peptide_class("BLCK", sequence, *settings) for sequence in sequences]
+    for peptide in peptides:
+        peptide.mass
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(peptides)
+
+
+def main():
+    settings = ("Iodo- or chloroacetamide", True, ["K", "R"])
+    for length, number in (
+        (5, 20000), (10, 20000), (100, 5000), (1000, 500), (10000, 50)
+    ):
+        sequences = random_sequences(number, length)
+        for peptide_class in (OriginalPeptide, Peptide):
+            seconds = min(timeit.repeat(
+                lambda: [
+                    peptide_class("BLCK", sequence, *settings)
+                    for sequence in sequences
+                ],
+                number = 1, repeat = 3
+            ))
+            print(
+                f"{peptide_class.__name__:>15} construction, length {length:>5}: "
+                f"{seconds / number * 1e6:10.2f} us/peptide"
+            )
+
+    sequences = random_sequences(100000, 15)
+    for peptide_class in (Peptide, CompactPeptide):
+        # CompactPeptide calculates on first access: include it.
+        seconds = min(timeit.repeat(
+            lambda: construct(peptide_class, sequences, settings),
+            number = 1, repeat = 3
+        ))
+        print(
+            f"{peptide_class.__name__:>14} construction and mass: "
+            f"{len(sequences) / seconds:12.0f} peptides/s, "
+            f"{memory_per_object(peptide_class, sequences, settings):6.0f} bytes/peptide"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+'''
+Benchmark sequence validation: the character-by-character check in
+check_sequence_validity (as it was before the fast path), the regex-based
+is_valid_sequence, and the batch variant are_valid_sequences.
+Run from the repository root with: python -m benchmarks.bench_validator
+'''
+import timeit
+from block_maker import utils
+from block_maker.resources import amino_acids
+from .bench_peptide import random_sequences
+
+
+def check_sequence_validity_loop(sequence_input):
+    '''The original character-by-character validity check.'''
+    invalid = {"positions": [], "characters": []}
+    for i, char in enumerate(sequence_input):
+        if char not in amino_acids.compositions.keys():
+            invalid["positions"].append(i + 1)
+            invalid["characters"].append(char)
+    return invalid
+
+
+def main():
+    validators = {
+        "character loop": lambda sequences: [
+            len(check_sequence_validity_loop(sequence)["positions"]) == 0
+            for sequence in sequences
+        ],
+        "check_sequence_validity": lambda sequences: [
+            len(utils.check_sequence_validity(sequence)["positions"]) == 0
+            for sequence in sequences
+        ],
+        "is_valid_sequence": lambda sequences: [
+            utils.is_valid_sequence(sequence) for sequence in sequences
+        ],
+        "are_valid_sequences": utils.are_valid_sequences,
+    }
+    for length, number in ((15, 100000), (100, 20000), (1000, 2000)):
+        sequences = random_sequences(number, length)
+        # One invalid sequence in every hundred.
+        for i in range(0, number, 100):
+            sequences[i] = sequences[i][:-1] + "X"
+        for name, validator in validators.items():
+            seconds = min(timeit.repeat(
+                lambda: validator(sequences), number = 1, repeat = 3
+            ))
+            print(
+                f"{name:>24}, length {length:>4}: "
+                f"{number / seconds:12.0f} sequences/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
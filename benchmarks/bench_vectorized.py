@@ -0,0 +1,52 @@
+'''
+Benchmark the compositions and masses of a chunk of peptides: Peptide
+construction per sequence, the batch calculation of the vectorized module,
+and Peptide construction with the batch results in a CompositionCache (as
+in the workers of a parallel run).
+Run from the repository root with: python -m benchmarks.bench_vectorized
+'''
+import timeit
+from block_maker import vectorized
+from block_maker.cache import CompositionCache
+from block_maker.peptide import Peptide
+from .bench_peptide import random_sequences
+
+
+def batch_peptides(sequences, settings):
+    '''Return Peptides with compositions and masses calculated at once.'''
+    cache = CompositionCache(max_size = len(sequences))
+    cache.update(vectorized.cache_items(sequences, *settings))
+    return [
+        Peptide("BLCK", sequence, *settings, cache = cache)
+        for sequence in sequences
+    ]
+
+
+def main(number = 5000):
+    settings = ("Iodo- or chloroacetamide", True, ["K", "R"])
+    cases = {
+        "Peptide": lambda sequences: [
+            Peptide("BLCK", sequence, *settings) for sequence in sequences
+        ],
+        "vectorized batch": lambda sequences: vectorized.calculate_batch(
+            sequences, *settings
+        ),
+        "Peptide with batch": lambda sequences: batch_peptides(
+            sequences, settings
+        ),
+    }
+    for length in (10, 30, 100):
+        # Unique sequences, like a chunk of a parallel run.
+        sequences = list(dict.fromkeys(random_sequences(number, length)))
+        for name, case in cases.items():
+            seconds = min(timeit.repeat(
+                lambda: case(sequences), number = 1, repeat = 5
+            ))
+            print(
+                f"length {length:>3}, {name:>18}: "
+                f"{seconds / len(sequences) * 1e6:8.2f} us/peptide"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+'''
+Benchmark block file writing: one BlockWriter run, a staged BlockWriter
+run, and parallel.generate_blocks with all CPU cores.
+Run from the repository root with: python -m benchmarks.bench_writer
+'''
+import os
+import tempfile
+import time
+from block_maker import log
+from block_maker import parallel
+from block_maker.peptide import Peptide
+from block_maker.writer import BlockWriter
+from .bench_peptide import random_sequences
+
+
+def main(number = 5000):
+    settings = ("Iodo- or chloroacetamide", True, ["K", "R"])
+    sequences = random_sequences(number, 15)
+    for name, staged in (("BlockWriter run", False), ("Staged BlockWriter run", True)):
+        with tempfile.TemporaryDirectory() as output_dir:
+            start = time.perf_counter()
+            with BlockWriter(
+                output_dir, staged = staged,
+                log_path = os.path.join(output_dir, "BlockMaker.log")
+            ) as writer:
+                for i, sequence in enumerate(sequences):
+                    writer.add(Peptide(f"B{i}", sequence, *settings))
+            seconds = time.perf_counter() - start
+            print(f"{name + ':':<28}{number / seconds:10.0f} files/s")
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        parallel.generate_blocks(
+            [(f"B{i}", sequence) for i, sequence in enumerate(sequences)],
+            *settings, output_dir = output_dir,
+            log_path = os.path.join(output_dir, "BlockMaker.log")
+        )
+        seconds = time.perf_counter() - start
+        print(f"{'parallel.generate_blocks:':<28}{number / seconds:10.0f} files/s")
+    log.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+'''
+Benchmark suite for the computation, validation, write and import paths,
+on synthetic peptide sets of 1k, 100k and 1M sequences. The results of
+every run are stored as a JSON file in benchmarks/results, and compared
+with an earlier run, so regressions between versions are visible.
+Run from the repository root with: python -m benchmarks.suite
+
+    python -m benchmarks.suite --label v1.1
+    python -m benchmarks.suite --sizes 1000 100000 --cases peptide validator
+    python -m benchmarks.suite --compare benchmarks/results/<earlier run>.json
+
+Cases that write block files are limited to --max-files peptides. The
+table import of the GUI runs under the offscreen Qt platform, and is
+skipped if PyQt6 is not installed.
+'''
+import argparse
+import contextlib
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+from block_maker import log
+from block_maker import utils
+from block_maker.peptide import Peptide
+from block_maker.writer import BlockWriter
+from .bench_logging import block_messages
+from .bench_peptide import random_sequences
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+SETTINGS = ("Iodo- or chloroacetamide", True, ["K", "R"])
+
+
+def peptide_case(sequences, work_dir):
+    '''Time Peptide construction, with composition and mass.'''
+    start = time.perf_counter()
+    for sequence in sequences:
+        Peptide("BLCK", sequence, *SETTINGS)
+    return time.perf_counter() - start
+
+
+def validator_case(sequences, work_dir):
+    '''Time utils.check_sequence_validity per sequence.'''
+    start = time.perf_counter()
+    for sequence in sequences:
+        utils.check_sequence_validity(sequence)
+    return time.perf_counter() - start
+
+
+def write_block_file_case(sequences, work_dir):
+    '''Time Peptide.write_block_file per peptide, including its logging.'''
+    log.configure(path = os.path.join(work_dir, "BlockMaker.log"))
+    peptides = [
+        Peptide(f"B{i}", sequence, *SETTINGS)
+        for i, sequence in enumerate(sequences)
+    ]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for peptide in peptides:
+            peptide.write_block_file(work_dir)
+    log.flush()
+    seconds = time.perf_counter() - start
+    log.shutdown()
+    return seconds
+
+
+def block_writer_case(sequences, work_dir):
+    '''Time a BlockWriter run, including its logging.'''
+    log.configure(path = os.path.join(work_dir, "BlockMaker.log"))
+    peptides = [
+        Peptide(f"B{i}", sequence, *SETTINGS)
+        for i, sequence in enumerate(sequences)
+    ]
+    start = time.perf_counter()
+    with BlockWriter(work_dir) as writer:
+        for peptide in peptides:
+            writer.add(peptide)
+    log.flush()
+    seconds = time.perf_counter() - start
+    log.shutdown()
+    return seconds
+
+
+def logging_case(sequences, work_dir):
+    '''Time logging the messages of one block per sequence, until written.'''
+    log.configure(path = os.path.join(work_dir, "BlockMaker.log"))
+    logger = log.get_logger()
+    start = time.perf_counter()
+    for i in range(len(sequences)):
+        log.log_block(logger, block_messages(i))
+    log.flush()
+    seconds = time.perf_counter() - start
+    log.shutdown()
+    return seconds
+
+
+def gui_import_case(sequences, work_dir):
+    '''Time importing a text file into the sequence table of MainWindow.'''
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    from block_maker.gui.main_window import MainWindow
+    app = QApplication.instance() or QApplication([])
+    path = os.path.join(work_dir, "sequences.txt")
+    with open(path, "w") as file:
+        file.write("\n".join(sequences))
+    window = MainWindow()
+    with mock.patch(
+        "block_maker.gui.main_window.QFileDialog.getOpenFileName",
+        return_value = (path, "")
+    ):
+        start = time.perf_counter()
+        window.open_text_file()
+        app.processEvents()
+        seconds = time.perf_counter() - start
+    window.close()
+    window.deleteLater()
+    app.processEvents()
+    return seconds
+
+
+# Name: (function, writes block files).
+CASES = {
+    "peptide": (peptide_case, False),
+    "validator": (validator_case, False),
+    "write_block_file": (write_block_file_case, True),
+    "block_writer": (block_writer_case, True),
+    "logging": (logging_case, False),
+    "gui_import": (gui_import_case, False),
+}
+
+
+def synthetic_sequences(size, length = 15):
+    '''
+    Return size unique random sequences, and a copy in which one in every
+    hundred sequences ends with an invalid character (for validation).
+    '''
+    sequences = list(dict.fromkeys(random_sequences(size, length)))
+    invalid = list(sequences)
+    for i in range(0, len(invalid), 100):
+        invalid[i] = invalid[i][:-1] + "X"
+    return sequences, invalid
+
+
+def run_case(name, sequences, repeat):
+    '''Return the best time (s) of a case over repeat runs.'''
+    function, _ = CASES[name]
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as work_dir:
+            seconds = function(sequences, work_dir)
+        if best is None or seconds < best:
+            best = seconds
+    return best
+
+
+def git_commit():
+    '''Return the current git commit of the repository, or None.'''
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd = os.path.dirname(os.path.abspath(__file__)),
+            capture_output = True, text = True, check = True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def latest_results(results_dir, exclude = None):
+    '''Return the path of the most recent results file, or None.'''
+    paths = sorted(
+        path for path in glob.glob(os.path.join(results_dir, "*.json"))
+        if path != exclude
+    )
+    return paths[-1] if paths else None
+
+
+def compare(results, baseline, threshold):
+    '''
+    Print the change per case and size compared to a baseline run.
+    Return the number of cases that are slower by more than threshold.
+    '''
+    earlier = {
+        (result["case"], result["size"]): result
+        for result in baseline["results"]
+    }
+    regressions = 0
+    compared = 0
+    print(f"\nCompared to {baseline.get('label') or baseline['date']}:")
+    for result in results:
+        before = earlier.get((result["case"], result["size"]))
+        if before is None:
+            continue
+        change = result["seconds"] / before["seconds"] - 1
+        slower = change > threshold
+        regressions += slower
+        print(
+            f"{result['case']:>16} {result['size']:>8}: "
+            f"{before['seconds']:9.3f} s -> {result['seconds']:9.3f} s "
+            f"({change:+.0%}){'  SLOWER' if slower else ''}"
+        )
+        compared += 1
+    if compared == 0:
+        print("No cases and sizes in common.")
+    return regressions
+
+
+def build_parser():
+    '''Create the argument parser of the benchmark suite.'''
+    parser = argparse.ArgumentParser(
+        prog = "python -m benchmarks.suite",
+        description = "Run the benchmark suite and store the results."
+    )
+    parser.add_argument(
+        "--sizes", type = int, nargs = "+", default = [1000, 100000, 1000000],
+        help = "numbers of sequences (default: 1000 100000 1000000)"
+    )
+    parser.add_argument(
+        "--cases", nargs = "+", choices = CASES.keys(), default = list(CASES),
+        help = "cases to run (default: all)"
+    )
+    parser.add_argument(
+        "--repeat", type = int, default = 3,
+        help = (
+            "runs per case, the best time is kept (default: 3; "
+            "sets above 100000 sequences are run once)"
+        )
+    )
+    parser.add_argument(
+        "--max-files", type = int, default = 100000,
+        help = "largest set for cases writing block files (default: 100000)"
+    )
+    parser.add_argument(
+        "--label", default = None,
+        help = "label of this run, such as a version number"
+    )
+    parser.add_argument(
+        "--results-dir", default = RESULTS_DIR,
+        help = "directory for the results (default: benchmarks/results)"
+    )
+    parser.add_argument(
+        "--compare", default = None,
+        help = "results file to compare with (default: the latest run)"
+    )
+    parser.add_argument(
+        "--threshold", type = float, default = 0.1,
+        help = "relative slowdown reported as a regression (default: 0.1)"
+    )
+    return parser
+
+
+def main(argv = None):
+    '''Run the benchmark suite. Return 1 if there are regressions.'''
+    args = build_parser().parse_args(argv)
+    results = []
+    for size in args.sizes:
+        sequences, invalid = synthetic_sequences(size)
+        for name in args.cases:
+            _, writes_files = CASES[name]
+            if writes_files and size > args.max_files:
+                print(f"{name:>16} {size:>8}: skipped (--max-files)")
+                continue
+            if name == "gui_import":
+                try:
+                    import PyQt6.QtWidgets
+                except ImportError:
+                    print(f"{name:>16} {size:>8}: skipped (PyQt6 not installed)")
+                    continue
+            repeat = args.repeat if size <= 100000 else 1
+            seconds = run_case(
+                name, invalid if name == "validator" else sequences, repeat
+            )
+            results.append({
+                "case": name,
+                "size": size,
+                "seconds": seconds,
+                "per_second": len(sequences) / seconds
+            })
+            print(
+                f"{name:>16} {size:>8}: {seconds:9.3f} s, "
+                f"{len(sequences) / seconds:12.0f} per second"
+            )
+
+    # Store the results, with the version information of this run.
+    run = {
+        "label": args.label,
+        "date": datetime.datetime.now().isoformat(timespec = "seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results
+    }
+    os.makedirs(args.results_dir, exist_ok = True)
+    name = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    if args.label is not None:
+        name += f"-{args.label}"
+    path = os.path.join(args.results_dir, name + ".json")
+    baseline_path = args.compare or latest_results(args.results_dir, path)
+    with open(path, "w") as file:
+        json.dump(run, file, indent = 2)
+    print(f"\nResults written to '{path}'.")
+
+    if baseline_path is None:
+        return 0
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    return 1 if compare(results, baseline, args.threshold) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
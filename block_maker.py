@@ -1,9 +1,12 @@
+import multiprocessing
 import sys
 from PyQt6.QtWidgets import QApplication, QStyleFactory
 from block_maker.gui.main_window import MainWindow
 
 
 def main():
+    # Required for worker processes in the frozen (executable) version.
+    multiprocessing.freeze_support()
     # Create instance of QApplication.
     app = QApplication(sys.argv)
     # Set the application style to Fusion.
@@ -0,0 +1,168 @@
+'''
+Block files bundled in a single archive (zip or tar), instead of one file
+per block. The archive is written in one streaming pass and read back one
+block at a time. Extract the block files for LaCyTools with:
+
+    python -m block_maker.archive blocks.zip output_dir
+'''
+import argparse
+import io
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from .instrumentation import instrumented
+
+
+# Archive file extensions and the tarfile modes used to write them.
+TAR_MODES = {".tar": "w", ".tar.gz": "w:gz", ".tgz": "w:gz"}
+ARCHIVE_EXTENSIONS = (".zip", *TAR_MODES)
+
+
+def is_archive_path(path):
+    '''Return True if the path has the extension of a supported archive.'''
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+class BlockArchive():
+    '''
+    Write block files into a zip or tar archive, depending on the file
+    extension. The archive is written to a temporary file that replaces
+    the archive when closed, so an interrupted run never leaves a partial
+    archive behind. Use as a context manager:
+
+        with BlockArchive("blocks.zip") as archive:
+            archive.add(peptide.block_name, peptide.block_file_content())
+    '''
+    def __init__(self, path):
+        if not is_archive_path(path):
+            raise ValueError(
+                f"Unknown archive type '{path}', use one of: "
+                + ", ".join(ARCHIVE_EXTENSIONS)
+            )
+        self.path = path
+        self.temp_path = path + ".tmp"
+        self.blocks_added = 0
+        self._zip = None
+        self._tar = None
+
+    def __enter__(self):
+        path = self.path.lower()
+        if path.endswith(".zip"):
+            # Block files are tiny: storing is faster than compressing.
+            self._zip = zipfile.ZipFile(self.temp_path, "w", zipfile.ZIP_STORED)
+        else:
+            mode = next(
+                mode for extension, mode in TAR_MODES.items()
+                if path.endswith(extension)
+            )
+            self._tar = tarfile.open(self.temp_path, mode)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        archive = self._zip or self._tar
+        archive.close()
+        self._zip = None
+        self._tar = None
+        if exc_type is None:
+            os.replace(self.temp_path, self.path)
+        else:
+            os.remove(self.temp_path)
+        return False
+
+    @instrumented(
+        "block files", size = lambda self, block_name, content: len(content)
+    )
+    def add(self, block_name, content):
+        '''Add the contents of a block file to the archive.'''
+        filename = block_name + ".block"
+        if self._zip is not None:
+            self._zip.writestr(filename, content)
+        else:
+            data = content.encode()
+            info = tarfile.TarInfo(filename)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._tar.addfile(info, io.BytesIO(data))
+        self.blocks_added += 1
+
+
+def read_blocks(path, block_names = None):
+    '''
+    Yield (block_name, content) tuples for the block files in an archive,
+    one at a time and in the order they were written. If block_names is
+    given, only those blocks are read.
+    '''
+    if block_names is not None:
+        block_names = set(block_names)
+    if path.lower().endswith(".zip"):
+        with zipfile.ZipFile(path, "r") as archive:
+            for info in archive.infolist():
+                block_name = _block_name(info.filename)
+                if block_name is None:
+                    continue
+                if block_names is None or block_name in block_names:
+                    yield block_name, archive.read(info).decode()
+    else:
+        # Stream through the tar archive, without reading the index first.
+        with tarfile.open(path, "r|*") as archive:
+            for member in archive:
+                block_name = _block_name(member.name)
+                if block_name is None or not member.isfile():
+                    continue
+                if block_names is None or block_name in block_names:
+                    yield block_name, archive.extractfile(member).read().decode()
+
+
+def extract_blocks(path, output_dir, block_names = None):
+    '''
+    Write the block files in an archive (or only those in block_names)
+    to the output directory. Return the number of block files written.
+    '''
+    count = 0
+    for block_name, content in read_blocks(path, block_names):
+        filename = os.path.join(output_dir, block_name + ".block")
+        with open(filename, "w") as file:
+            file.write(content)
+        count += 1
+    return count
+
+
+def _block_name(filename):
+    '''Return the block name of a filename in an archive, or None.'''
+    filename = os.path.basename(filename)
+    if not filename.endswith(".block"):
+        return None
+    return filename[:-len(".block")]
+
+
+def main(argv = None):
+    '''Extract block files from an archive. Return the exit status.'''
+    parser = argparse.ArgumentParser(
+        prog = "python -m block_maker.archive",
+        description = "Extract block files from a BlockMaker archive."
+    )
+    parser.add_argument("archive", help = "zip or tar archive with block files")
+    parser.add_argument(
+        "output_dir", nargs = "?", default = os.getcwd(),
+        help = "directory for the block files (default: current directory)"
+    )
+    parser.add_argument(
+        "-b", "--block", action = "append", dest = "block_names",
+        help = "only extract this block (can be repeated)"
+    )
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.output_dir):
+        print(
+            f"Output directory '{args.output_dir}' does not exist.",
+            file = sys.stderr
+        )
+        return 2
+    count = extract_blocks(args.archive, args.output_dir, args.block_names)
+    print(f"{count} block files extracted to '{args.output_dir}'")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import json
+import os
+from collections import OrderedDict
+
+
+# Order of the elements in a cached composition.
+ELEMENTS = ("carbons", "hydrogens", "nitrogens", "oxygens", "sulfurs")
+
+# Version of the cache file format.
+CACHE_VERSION = 2
+
+
+class CompositionCache():
+    '''
+    Least recently used (LRU) cache with the compositions and masses of
+    peptides, keyed on the sequence and the modification settings. When
+    full, the least recently used entry is evicted. Keeps hit, miss and
+    eviction counts, and can be saved to and loaded from a JSON file to
+    reuse results between runs.
+    '''
+    def __init__(self, max_size = 100000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Key -> (carbons, hydrogens, nitrogens, oxygens, sulfurs, mass).
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(sequence, cysteine_treatment, methionine_oxidation,
+            isotope_labeling):
+        '''Return the cache key for a sequence with its settings.'''
+        return (
+            sequence, cysteine_treatment, bool(methionine_oxidation),
+            "".join(sorted(set(isotope_labeling)))
+        )
+
+    def get(self, key):
+        '''
+        Return the cached (composition, mass) of a key, or None if the key
+        is not present. The composition is a new dictionary.
+        '''
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return dict(zip(ELEMENTS, value)), value[5]
+
+    def put(self, key, composition, mass):
+        '''Store the composition and mass of a key, evicting if full.'''
+        self._entries[key] = (
+            *(composition[element] for element in ELEMENTS), mass
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last = False)
+            self.evictions += 1
+
+    def items(self):
+        '''Return a list of (key, composition, mass), least recent first.'''
+        return [
+            (key, dict(zip(ELEMENTS, value)), value[5])
+            for key, value in self._entries.items()
+        ]
+
+    def update(self, items):
+        '''Store (key, composition, mass) items, e.g. from items().'''
+        for key, composition, mass in items:
+            self.put(key, composition, mass)
+
+    def clear(self):
+        '''Remove all entries and reset the statistics.'''
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        '''Return a dictionary with the size and hit/miss statistics.'''
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups > 0 else 0.0
+        }
+
+    def save(self, path):
+        '''
+        Save the entries to a JSON file, least recently used first, with
+        the version of the format and of the modifications registry.
+        The file is replaced only after it was written completely.
+        '''
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump({
+                "version": CACHE_VERSION,
+                "registry": _registry_hash(),
+                "entries": [
+                    [*key, *value] for key, value in self._entries.items()
+                ]
+            }, file)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path, max_size = 100000):
+        '''
+        Create a cache with the entries saved in a JSON file. Return an
+        empty cache if the file does not exist, or if it was written by
+        another version or with other modifications. Raise ValueError if
+        the file or one of its entries is malformed.
+        '''
+        cache = cls(max_size = max_size)
+        if not os.path.exists(path):
+            return cache
+        with open(path, "r") as file:
+            data = json.load(file)
+        if isinstance(data, dict):
+            entries = data.get("entries")
+            current = (data.get("version"), data.get("registry")) == (
+                CACHE_VERSION, _registry_hash()
+            )
+        else:
+            # Format of earlier versions: only the entries.
+            entries = data
+            current = False
+        if not isinstance(entries, list):
+            raise ValueError("Cache file has no list of entries")
+        for entry in entries:
+            if not _is_valid_entry(entry):
+                raise ValueError(f"Invalid cache entry: {entry!r}")
+        if not current:
+            # Results of other calculations: calculate them again.
+            return cache
+        for entry in entries[max(0, len(entries) - max_size):]:
+            cache._entries[tuple(entry[:4])] = tuple(entry[4:])
+        return cache
+
+
+def _is_valid_entry(entry):
+    '''
+    Return True if a saved entry has a key (sequence, cysteine treatment,
+    methionine oxidation, labeled amino acids), five element counts and
+    a mass.
+    '''
+    if not isinstance(entry, list) or len(entry) != 4 + len(ELEMENTS) + 1:
+        return False
+    sequence, cysteine_treatment, methionine_oxidation, labeling = entry[:4]
+    counts = entry[4:-1]
+    return (
+        isinstance(sequence, str) and isinstance(cysteine_treatment, str)
+        and isinstance(methionine_oxidation, bool)
+        and isinstance(labeling, str)
+        and all(
+            isinstance(count, int) and not isinstance(count, bool)
+            for count in counts
+        )
+        and isinstance(entry[-1], (int, float))
+        and not isinstance(entry[-1], bool)
+    )
+
+
+def _registry_hash():
+    '''Return the hash of the modifications registry.'''
+    # Imported here: the modifications module imports this module.
+    from . import modifications
+    return modifications.registry_hash()
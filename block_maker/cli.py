@@ -0,0 +1,381 @@
+import argparse
+import os
+import sys
+from . import archive
+from . import digestion
+from . import generation
+from . import instrumentation
+from . import log
+from . import modifications
+from .cache import CompositionCache
+from . import parallel
+from . import sequence_io
+from . import summary
+from .resources import amino_acids
+
+
+# Command-line choices for cysteine treatment, mapped to the GUI labels.
+CYSTEINE_TREATMENTS = {
+    "none": "None (reduced form)",
+    "acetamide": "Iodo- or chloroacetamide",
+    "acetic-acid": "Iodo- or chloroacetic acid"
+}
+
+
+def build_parser():
+    '''Create the argument parser for the command-line interface.'''
+    parser = argparse.ArgumentParser(
+        prog = "python -m block_maker",
+        description = (
+            "Generate LaCyTools block files without starting the GUI. "
+            "Sequences are read one per line, optionally preceded by a "
+            "block name and whitespace, and processed as a stream. "
+            "With --fasta, protein sequences are read from a FASTA file "
+            "and digested into peptides."
+        )
+    )
+    parser.add_argument(
+        "input", nargs = "?", default = "-",
+        help = "text file with peptide sequences ('-' or omitted for stdin)"
+    )
+    parser.add_argument(
+        "--fasta", action = "store_true",
+        help = (
+            "read protein sequences in FASTA format and digest them "
+            "(default if the input file ends with .fasta, .fa or .faa)"
+        )
+    )
+    parser.add_argument(
+        "-e", "--enzyme", choices = digestion.ENZYMES.keys(),
+        default = "trypsin", help = "enzyme for digestion (default: trypsin)"
+    )
+    parser.add_argument(
+        "--missed-cleavages", type = int, default = 0,
+        help = "maximum number of missed cleavages (default: 0)"
+    )
+    parser.add_argument(
+        "--min-length", type = int, default = 6,
+        help = "minimum peptide length after digestion (default: 6)"
+    )
+    parser.add_argument(
+        "--max-length", type = int, default = 50,
+        help = "maximum peptide length after digestion (default: 50)"
+    )
+    parser.add_argument(
+        "--min-mass", type = float, default = None,
+        help = "minimum monoisotopic peptide mass after digestion"
+    )
+    parser.add_argument(
+        "--max-mass", type = float, default = None,
+        help = "maximum monoisotopic peptide mass after digestion"
+    )
+    parser.add_argument(
+        "-o", "--output-dir", default = os.getcwd(),
+        help = "directory for the block files (default: current directory)"
+    )
+    parser.add_argument(
+        "-c", "--cysteine-treatment", choices = CYSTEINE_TREATMENTS.keys(),
+        default = "none", help = "cysteine treatment (default: none)"
+    )
+    parser.add_argument(
+        "-m", "--methionine-oxidation", action = "store_true",
+        help = "add one oxygen atom per methionine residue"
+    )
+    parser.add_argument(
+        "-v", "--variable-mod", action = "append", default = [],
+        choices = modifications.variable_modifications(), 
+        dest = "variable_modifications",
+        help = (
+            "variable modification (can be repeated): a block file is "
+            "written for every number of modified sites, with a suffix "
+            "such as '_OxOx' in the block name"
+        )
+    )
+    parser.add_argument(
+        "--max-states", type = int, default = 64,
+        help = (
+            "maximum number of variable modification states per peptide, "
+            "fewest modifications first (default: 64)"
+        )
+    )
+    parser.add_argument(
+        "--max-variable-mods", type = int, default = None,
+        help = "maximum number of variable modifications per peptide"
+    )
+    parser.add_argument(
+        "-l", "--label", default = "",
+        help = (
+            "C-13 and N-15 labeled amino acids as one-letter codes, "
+            "e.g. 'KR'"
+        )
+    )
+    parser.add_argument(
+        "--fsync", action = "store_true",
+        help = "flush all block files to disk at the end of the run"
+    )
+    parser.add_argument(
+        "-i", "--incremental", action = "store_true",
+        help = (
+            "skip block files that are up to date, using a manifest in the "
+            "output directory"
+        )
+    )
+    parser.add_argument(
+        "--prune", action = "store_true",
+        help = (
+            "remove block files of earlier incremental runs that are not "
+            "in the input (implies --incremental)"
+        )
+    )
+    parser.add_argument(
+        "--no-atomic", action = "store_true",
+        help = (
+            "overwrite block files in place instead of replacing them via "
+            "a temporary file (faster, but not safe against interruptions)"
+        )
+    )
+    parser.add_argument(
+        "--staged", action = "store_true",
+        help = (
+            "write all block files to a temporary directory first and only "
+            "move them into the output directory when all are "
+            "written"
+        )
+    )
+    parser.add_argument(
+        "-a", "--archive", metavar = "PATH", default = None,
+        help = (
+            "write all block files into one archive (.zip, .tar, .tar.gz or "
+            ".tgz) instead of the output directory; a relative path is taken "
+            "relative to the output directory"
+        )
+    )
+    parser.add_argument(
+        "-s", "--summary", metavar = "PATH", default = None,
+        help = (
+            "write a table with the name, sequence, mass, composition and "
+            "modifications of all block files (.csv, .npy or .parquet); a "
+            "relative path is taken relative to the output directory"
+        )
+    )
+    parser.add_argument(
+        "--cache", metavar = "PATH", default = None,
+        help = (
+            "JSON file with cached compositions and masses, read before "
+            "and updated after the run"
+        )
+    )
+    parser.add_argument(
+        "--cache-size", type = int, default = 1000000,
+        help = "maximum number of cached peptides (default: 1000000)"
+    )
+    parser.add_argument(
+        "--log-file", metavar = "PATH", default = log.DEFAULT_PATH,
+        help = f"text log file (default: {log.DEFAULT_PATH})"
+    )
+    parser.add_argument(
+        "--log-level", choices = ("DEBUG", "INFO", "WARNING", "ERROR"),
+        default = "INFO", help = "minimum level of logged messages (default: INFO)"
+    )
+    parser.add_argument(
+        "--log-json", metavar = "PATH", default = None,
+        help = (
+            "also write a JSON lines log, with one record per block file "
+            "(name, sequence, mass, composition and settings)"
+        )
+    )
+    parser.add_argument(
+        "--log-max-bytes", type = int, default = 0,
+        help = "rotate log files at this size in bytes (default: 0, never)"
+    )
+    parser.add_argument(
+        "--log-backups", type = int, default = 3,
+        help = "number of rotated log files to keep (default: 3)"
+    )
+    parser.add_argument(
+        "--instrument", action = "store_true",
+        help = (
+            "log the time, calls and bytes written per stage and the peak "
+            "memory at the end of the run (also with BLOCKMAKER_INSTRUMENT=1)"
+        )
+    )
+    parser.add_argument(
+        "--instrument-json", default = None,
+        help = "also write the instrumentation summary to this JSON file"
+    )
+    parser.add_argument(
+        "--cprofile", default = None,
+        help = "profile the run with cProfile and save the stats to this file"
+    )
+    parser.add_argument(
+        "-j", "--workers", type = int, default = None,
+        help = "number of worker processes (default: number of CPU cores)"
+    )
+    return parser
+
+
+def main(argv = None):
+    '''Run the command-line interface. Return the exit status.'''
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    # Check labeled amino acids.
+    isotope_labeling = []
+    for amino_acid in args.label.upper():
+        if amino_acid not in amino_acids.compositions:
+            print(
+                f"Unknown amino acid '{amino_acid}' in --label.",
+                file = sys.stderr
+            )
+            return 2
+        if amino_acid not in isotope_labeling:
+            isotope_labeling.append(amino_acid)
+
+    if not os.path.isdir(args.output_dir):
+        print(
+            f"Output directory '{args.output_dir}' does not exist.",
+            file = sys.stderr
+        )
+        return 2
+
+    if args.methionine_oxidation and "oxidation" in args.variable_modifications:
+        print(
+            "-m/--methionine-oxidation cannot be combined with variable "
+            "oxidation.",
+            file = sys.stderr
+        )
+        return 2
+
+    archive_path = None
+    if args.archive is not None:
+        if not archive.is_archive_path(args.archive):
+            print(
+                f"Unknown archive type '{args.archive}', use one of: "
+                + ", ".join(archive.ARCHIVE_EXTENSIONS),
+                file = sys.stderr
+            )
+            return 2
+        if args.incremental or args.prune or args.staged:
+            print(
+                "--archive cannot be combined with --incremental, --prune "
+                "or --staged.",
+                file = sys.stderr
+            )
+            return 2
+        archive_path = os.path.join(args.output_dir, args.archive)
+
+    summary_path = None
+    if args.summary is not None:
+        summary_path = os.path.join(args.output_dir, args.summary)
+        try:
+            summary.SummaryTable(summary_path)
+        except (ValueError, ImportError) as error:
+            print(error, file = sys.stderr)
+            return 2
+
+    log.configure(
+        path = args.log_file,
+        level = args.log_level,
+        json_path = args.log_json,
+        max_bytes = args.log_max_bytes,
+        backup_count = args.log_backups
+    )
+    if args.instrument or args.instrument_json or args.cprofile:
+        instrumentation.enable(
+            json_path = args.instrument_json, cprofile_path = args.cprofile
+        )
+
+    # Compositions and masses of earlier runs.
+    cache = None
+    if args.cache is not None:
+        try:
+            cache = CompositionCache.load(args.cache, max_size = args.cache_size)
+        except (OSError, ValueError) as error:
+            print(f"Cannot read cache '{args.cache}': {error}", file = sys.stderr)
+            return 2
+
+    # Exit status 1 if any entry is skipped.
+    status = 0
+
+    def warn(entry, message):
+        '''Print and log a warning for a skipped entry.'''
+        nonlocal status
+        print(message, file = sys.stderr)
+        log.get_logger().warning(message.strip())
+        status = 1
+
+    cysteine_treatment = CYSTEINE_TREATMENTS[args.cysteine_treatment]
+    fasta = args.fasta or args.input.lower().endswith(digestion.FASTA_EXTENSIONS)
+
+    # Stream sequences from file or stdin: read (and digest), validate, 
+    # skip duplicates and generate block names, then compute and write 
+    # block files.
+    try:
+        file = sys.stdin if args.input == "-" else open(args.input, "r")
+    except OSError as error:
+        parser.error(f"cannot read input file '{args.input}': {error.strerror}")
+    try:
+        if fasta:
+            # Peptide masses for the mass filter include the modifications.
+            entries = digestion.digest_proteins(
+                digestion.read_fasta(file),
+                enzyme = args.enzyme,
+                missed_cleavages = args.missed_cleavages,
+                min_length = args.min_length,
+                max_length = args.max_length,
+                min_mass = args.min_mass,
+                max_mass = args.max_mass,
+                masses = digestion.residue_masses(
+                    cysteine_treatment, args.methionine_oxidation, 
+                    isotope_labeling
+                )
+            )
+        else:
+            entries = sequence_io.valid_entries(
+                sequence_io.read_entries(file), on_invalid = warn
+            )
+        entries = sequence_io.unique_entries(entries, on_skipped = warn)
+        writer = parallel.generate_blocks(
+            entries,
+            cysteine_treatment = cysteine_treatment,
+            methionine_oxidation = args.methionine_oxidation,
+            isotope_labeling = isotope_labeling,
+            output_dir = args.output_dir,
+            workers = args.workers,
+            fsync = args.fsync,
+            cache = cache,
+            incremental = args.incremental or args.prune,
+            prune = args.prune,
+            atomic = not args.no_atomic,
+            staged = args.staged,
+            archive = archive_path,
+            summary = summary_path,
+            variable = generation.VariableModifications(
+                args.variable_modifications,
+                max_states = args.max_states,
+                max_modifications = args.max_variable_mods
+            )
+        )
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+    print(
+        f"{writer.files_written} block files created in '{writer.location}' "
+        f"({writer.files_per_second:.0f} files/s)"
+    )
+    if summary_path is not None:
+        print(f"Summary table written to '{summary_path}'")
+    if writer.manifest is not None:
+        print(
+            f"{writer.files_skipped} block files up to date, "
+            f"{writer.files_pruned} removed"
+        )
+    if cache is not None:
+        cache.save(args.cache)
+        stats = cache.stats()
+        print(
+            f"Cache: {stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['evictions']} evictions, {stats['size']} peptides"
+        )
+    return status
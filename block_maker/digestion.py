@@ -0,0 +1,135 @@
+'''
+In-silico enzymatic digestion of protein sequences.
+Cleavage sites are found with one precompiled regular expression per
+enzyme, and peptide masses for the mass filter are taken from a prefix sum
+of residue masses, so no Python loop runs over individual residues.
+'''
+import re
+from itertools import accumulate
+from . import modifications
+from . import utils
+from .resources import amino_acids
+from .resources import constants
+
+
+# File extensions of FASTA files.
+FASTA_EXTENSIONS = (".fasta", ".fa", ".faa")
+
+
+# Cleavage rules as regular expressions that match the cleavage sites
+# (the positions between two residues).
+ENZYMES = {
+    # C-terminal of K and R, not before P.
+    "trypsin": re.compile(r"(?<=[KR])(?!P)"),
+    # C-terminal of K and R, also before P.
+    "trypsin/p": re.compile(r"(?<=[KR])"),
+    # C-terminal of K.
+    "lys-c": re.compile(r"(?<=K)"),
+    # N-terminal of K.
+    "lys-n": re.compile(r"(?=K)"),
+    # C-terminal of R, not before P.
+    "arg-c": re.compile(r"(?<=R)(?!P)"),
+    # C-terminal of E (bicarbonate buffer).
+    "glu-c": re.compile(r"(?<=E)"),
+    # C-terminal of D and E (phosphate buffer).
+    "glu-c/d": re.compile(r"(?<=[DE])"),
+    # N-terminal of D.
+    "asp-n": re.compile(r"(?=D)"),
+    # C-terminal of F, W and Y, not before P.
+    "chymotrypsin": re.compile(r"(?<=[FWY])(?!P)"),
+}
+
+
+def read_fasta(file):
+    '''
+    Read protein records from an open FASTA file, one record at a time.
+    Yield (header, sequence) tuples; the header without ">" and the
+    sequence capitalized, with line breaks and spaces removed.
+    '''
+    header = None
+    lines = []
+    for line in file:
+        if line.startswith(">"):
+            if header is not None:
+                yield header, "".join(lines).upper()
+            header = line[1:].strip()
+            lines = []
+        elif header is not None:
+            lines.append("".join(line.split()))
+    if header is not None:
+        yield header, "".join(lines).upper()
+
+
+def residue_masses(cysteine_treatment = None, methionine_oxidation = False,
+                   isotope_labeling = ()):
+    '''
+    Return a dictionary with residue masses including the modifications,
+    as used by Peptide. Residues that do not correspond to any amino acid
+    get a mass of 0 (digest skips peptides containing them).
+    '''
+    return modifications.compile_settings(
+        cysteine_treatment, methionine_oxidation, isotope_labeling
+    ).residue_masses()
+
+
+def digest(protein, enzyme = "trypsin", missed_cleavages = 0, min_length = 6,
+           max_length = 50, min_mass = None, max_mass = None, masses = None):
+    '''
+    Digest a protein sequence and yield its peptides, in order of their
+    position in the protein. Peptides with up to missed_cleavages missed
+    cleavage sites are included. Peptides outside the length or mass
+    limits, or with characters that do not correspond to any amino acid,
+    are skipped. Masses are calculated with the residue masses in masses
+    (by default unmodified, see residue_masses).
+    '''
+    if masses is None:
+        masses = residue_masses()
+    # Positions where the protein is cut, including both termini.
+    sites = [0]
+    sites.extend(
+        match.start() for match in ENZYMES[enzyme].finditer(protein, 1)
+        if match.start() < len(protein)
+    )
+    sites.append(len(protein))
+    # Cumulative residue mass at each position.
+    prefix = [0.0]
+    prefix.extend(accumulate(map(masses.__getitem__, protein)))
+    # Number of amino acid residues up to each position, only needed if
+    # the protein contains other characters (e.g. X or U).
+    valid = None
+    if not utils.is_valid_sequence(protein):
+        valid = [0]
+        valid.extend(
+            accumulate(map(amino_acids.compositions.__contains__, protein))
+        )
+
+    for i in range(len(sites) - 1):
+        start = sites[i]
+        for j in range(i + 1, min(i + 2 + missed_cleavages, len(sites))):
+            end = sites[j]
+            length = end - start
+            if length > max_length:
+                # Longer peptides from this start are also too long.
+                break
+            if length < min_length:
+                continue
+            if valid is not None and valid[end] - valid[start] < length:
+                # Contains a character that is not an amino acid.
+                continue
+            mass = prefix[end] - prefix[start] + constants.WATER_MASS
+            if min_mass is not None and mass < min_mass:
+                continue
+            if max_mass is not None and mass > max_mass:
+                continue
+            yield protein[start:end]
+
+
+def digest_proteins(proteins, **options):
+    '''
+    Digest (header, sequence) protein records, e.g. from read_fasta.
+    Yield (None, peptide) entries for the sequence import pipeline, so
+    block names are generated. Options are passed on to digest.
+    '''
+    for _, protein in proteins:
+        for peptide in digest(protein, **options):
+            yield None, peptide
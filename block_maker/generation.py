@@ -0,0 +1,160 @@
+from collections import Counter
+from . import modifications
+from .naming import BlockNameAllocator
+
+
+def variable_peptides(peptide, names = (), max_states = 64,
+                      max_modifications = None):
+    '''
+    Yield the peptide in every state of the variable modifications in
+    names (see modifications.variable_states), unmodified first. Without
+    variable modifications, only the peptide itself is yielded.
+    '''
+    if len(names) == 0:
+        yield peptide
+        return
+    states = modifications.variable_states(
+        peptide.residue_counts, names, max_states, max_modifications
+    )
+    for state in states:
+        if len(state) == 0:
+            yield peptide
+        else:
+            yield peptide.with_variable_modifications(state)
+
+
+def state_peptides(peptide, states):
+    '''
+    Yield the peptide in every state of a list of (block_name, state)
+    tuples (see VariableModifications.states).
+    '''
+    for block_name, state in states:
+        if len(state) == 0:
+            yield peptide
+        else:
+            yield peptide.with_variable_modifications(state, block_name)
+
+
+class VariableModifications():
+    '''
+    Variable modifications of a run: the modification names, and at most
+    max_states states per peptide with at most max_modifications sites
+    (see modifications.variable_states). The block names of the states
+    are unique within the run.
+    '''
+    def __init__(self, names = (), max_states = 64, max_modifications = None):
+        self.names = tuple(names)
+        self.max_states = max_states
+        self.max_modifications = max_modifications
+        # Block names in use in the run.
+        self.used_names = set()
+        self._allocator = BlockNameAllocator(self.used_names)
+
+    def reserve(self, block_names):
+        '''Mark block names (e.g. of all entries of the run) as in use.'''
+        self.used_names.update(block_names)
+
+    def states(self, block_name, sequence):
+        '''
+        Return the (block_name, state) tuples of a sequence, unmodified
+        first. A state is named after the block name with the suffix of the
+        state (see modifications.state_suffix), with a letter suffix added
+        if that name is in use. Names are allocated on every call.
+        '''
+        self.used_names.add(block_name)
+        if len(self.names) == 0:
+            return [(block_name, ())]
+        states = []
+        for state in modifications.variable_states(
+            Counter(sequence), self.names, self.max_states,
+            self.max_modifications
+        ):
+            state_name = block_name
+            if len(state) > 0:
+                state_name = self._allocator.allocate_name(
+                    block_name + modifications.state_suffix(state)
+                )
+                self.used_names.add(state_name)
+            states.append((state_name, state))
+        return states
+
+    def peptides(self, peptide):
+        '''Yield the peptide in every state, see states.'''
+        return state_peptides(
+            peptide, self.states(peptide.block_name, peptide.sequence)
+        )
+
+
+def block_log_messages(peptide, output_dir):
+    '''
+    Return the list of log messages for writing the block file of a
+    peptide to the output directory, in the order they are logged.
+    '''
+    return [
+        f"Start processing block '{peptide.block_name}' "
+        f"with sequence '{peptide.sequence}'...",
+        *modification_messages(peptide),
+        peptide.block_file_summary(),
+        f"'{peptide.block_name}.block' created in '{output_dir}'"
+    ]
+
+
+def block_record(peptide, output_dir, status = "written"):
+    '''
+    Return a dictionary describing the block file of a peptide, for the
+    JSON lines log: name, sequence, mass, composition and settings.
+    '''
+    return {
+        "block_name": peptide.block_name,
+        "sequence": peptide.sequence,
+        "mass": peptide.mass,
+        "composition": peptide.composition,
+        "cysteine_treatment": peptide.cysteine_treatment,
+        "methionine_oxidation": peptide.methionine_oxidation,
+        "isotope_labeling": list(peptide.isotope_labeling),
+        "variable_modifications": dict(peptide.variable_modifications),
+        "status": status,
+        "location": output_dir
+    }
+
+
+def skipped_log_message(block_name, output_dir):
+    '''Return the log message for a block file that is already up to date.'''
+    return f"'{block_name}.block' in '{output_dir}' is up to date, not written"
+
+
+def modification_messages(peptide):
+    '''
+    Return a list with log messages describing the modifications that
+    apply to the peptide (cysteine treatment, methionine oxidation,
+    variable modifications and isotope labeling).
+    '''
+    messages = []
+    compiled = peptide.compiled_modifications()
+    # Cysteine modification message.
+    treated = any(
+        modification.group == "cysteine" 
+        for modification in compiled.modifications
+    )
+    if peptide.residue_counts.get("C", 0) > 0 and not treated:
+        messages.append("Cysteines untreated (reduced form).")
+    # Messages of the modifications of residues in the peptide.
+    for modification in compiled.modifications:
+        if (modification.message is not None 
+                and peptide.residue_counts.get(modification.site, 0) > 0):
+            messages.append(modification.message)
+    # Variable modification state message.
+    if len(peptide.variable_modifications) > 0:
+        messages.append(
+            "Variable modifications: " + ", ".join(
+                f"{count} x {modifications.REGISTRY[name].label}"
+                for name, count in peptide.variable_modifications
+            )
+        )
+    # Isotope labeling message.
+    if len(peptide.isotope_labeling) > 0:
+        messages.append(
+            "C-13 and N-15 labeled amino acids: "
+            + ", ".join(peptide.isotope_labeling)
+        )
+    return messages
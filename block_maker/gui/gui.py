@@ -12,7 +12,7 @@ from PyQt6 import QtCore, QtGui, QtWidgets
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
         MainWindow.setObjectName("MainWindow")
-        MainWindow.resize(562, 545)
+        MainWindow.resize(562, 575)
         MainWindow.setStyleSheet("* {\n"
 "    font-family: \'DejaVu Sans\';\n"
 "    font-size: 10pt; \n"
@@ -306,23 +306,27 @@ class Ui_MainWindow(object):
         self.listWidget_outputdir.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.DoubleClicked)
         self.listWidget_outputdir.setAlternatingRowColors(True)
         self.listWidget_outputdir.setObjectName("listWidget_outputdir")
-        self.tableWidget_sequences = QtWidgets.QTableWidget(parent=self.centralwidget)
-        self.tableWidget_sequences.setGeometry(QtCore.QRect(20, 300, 521, 161))
-        self.tableWidget_sequences.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.DoubleClicked)
-        self.tableWidget_sequences.setAlternatingRowColors(True)
-        self.tableWidget_sequences.setObjectName("tableWidget_sequences")
-        self.tableWidget_sequences.setColumnCount(2)
-        self.tableWidget_sequences.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidget_sequences.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidget_sequences.setHorizontalHeaderItem(1, item)
-        self.tableWidget_sequences.horizontalHeader().setCascadingSectionResizes(False)
-        self.tableWidget_sequences.horizontalHeader().setDefaultSectionSize(100)
-        self.tableWidget_sequences.horizontalHeader().setSortIndicatorShown(True)
-        self.tableWidget_sequences.horizontalHeader().setStretchLastSection(True)
-        self.tableWidget_sequences.verticalHeader().setVisible(False)
-        self.tableWidget_sequences.verticalHeader().setCascadingSectionResizes(True)
+        self.lineEdit_filter = QtWidgets.QLineEdit(parent=self.centralwidget)
+        self.lineEdit_filter.setGeometry(QtCore.QRect(20, 300, 521, 21))
+        font = QtGui.QFont()
+        font.setFamily("DejaVu Sans")
+        font.setPointSize(8)
+        self.lineEdit_filter.setFont(font)
+        self.lineEdit_filter.setStyleSheet("font-size: 8pt;")
+        self.lineEdit_filter.setClearButtonEnabled(True)
+        self.lineEdit_filter.setObjectName("lineEdit_filter")
+        self.tableView_sequences = QtWidgets.QTableView(parent=self.centralwidget)
+        self.tableView_sequences.setGeometry(QtCore.QRect(20, 325, 521, 141))
+        self.tableView_sequences.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.DoubleClicked)
+        self.tableView_sequences.setAlternatingRowColors(True)
+        self.tableView_sequences.setSortingEnabled(True)
+        self.tableView_sequences.setObjectName("tableView_sequences")
+        self.tableView_sequences.horizontalHeader().setCascadingSectionResizes(False)
+        self.tableView_sequences.horizontalHeader().setDefaultSectionSize(100)
+        self.tableView_sequences.horizontalHeader().setSortIndicatorShown(True)
+        self.tableView_sequences.horizontalHeader().setStretchLastSection(True)
+        self.tableView_sequences.verticalHeader().setVisible(False)
+        self.tableView_sequences.verticalHeader().setCascadingSectionResizes(True)
         self.pushButton_deleteall = QtWidgets.QPushButton(parent=self.centralwidget)
         self.pushButton_deleteall.setGeometry(QtCore.QRect(170, 260, 91, 21))
         font = QtGui.QFont()
@@ -336,6 +340,39 @@ class Ui_MainWindow(object):
 "font-style: normal;\n"
 "font-weight: bold;")
         self.pushButton_deleteall.setObjectName("pushButton_deleteall")
+        self.progressBar_generation = QtWidgets.QProgressBar(parent=self.centralwidget)
+        self.progressBar_generation.setGeometry(QtCore.QRect(20, 530, 431, 21))
+        self.progressBar_generation.setProperty("value", 0)
+        self.progressBar_generation.setVisible(False)
+        self.progressBar_generation.setObjectName("progressBar_generation")
+        self.pushButton_cancel = QtWidgets.QPushButton(parent=self.centralwidget)
+        self.pushButton_cancel.setGeometry(QtCore.QRect(460, 530, 81, 21))
+        font = QtGui.QFont()
+        font.setFamily("DejaVu Sans")
+        font.setPointSize(10)
+        font.setBold(True)
+        font.setItalic(False)
+        font.setWeight(75)
+        self.pushButton_cancel.setFont(font)
+        self.pushButton_cancel.setStyleSheet("background-color: #cc0000;\n"
+"font-style: normal;\n"
+"font-weight: bold;")
+        self.pushButton_cancel.setVisible(False)
+        self.pushButton_cancel.setObjectName("pushButton_cancel")
+        self.checkBox_incremental = QtWidgets.QCheckBox(parent=self.centralwidget)
+        self.checkBox_incremental.setGeometry(QtCore.QRect(20, 480, 141, 20))
+        font = QtGui.QFont()
+        font.setFamily("DejaVu Sans")
+        font.setPointSize(9)
+        self.checkBox_incremental.setFont(font)
+        self.checkBox_incremental.setObjectName("checkBox_incremental")
+        self.checkBox_prune = QtWidgets.QCheckBox(parent=self.centralwidget)
+        self.checkBox_prune.setGeometry(QtCore.QRect(20, 500, 141, 20))
+        font = QtGui.QFont()
+        font.setFamily("DejaVu Sans")
+        font.setPointSize(9)
+        self.checkBox_prune.setFont(font)
+        self.checkBox_prune.setObjectName("checkBox_prune")
         self.frame_2 = QtWidgets.QFrame(parent=self.centralwidget)
         self.frame_2.setGeometry(QtCore.QRect(20, 110, 251, 181))
         self.frame_2.setStyleSheet("border: 1px solid darkgray;")
@@ -362,8 +399,11 @@ class Ui_MainWindow(object):
         self.pushButton_generateblocks.raise_()
         self.listWidget_filelocation.raise_()
         self.listWidget_outputdir.raise_()
-        self.tableWidget_sequences.raise_()
+        self.lineEdit_filter.raise_()
+        self.tableView_sequences.raise_()
         self.pushButton_deleteall.raise_()
+        self.progressBar_generation.raise_()
+        self.pushButton_cancel.raise_()
         MainWindow.setCentralWidget(self.centralwidget)
         self.statusbar = QtWidgets.QStatusBar(parent=MainWindow)
         self.statusbar.setObjectName("statusbar")
@@ -410,12 +450,13 @@ class Ui_MainWindow(object):
         self.label1.setText(_translate("MainWindow", "Import text file with sequences:"))
         self.toolButton_openfile.setText(_translate("MainWindow", "..."))
         self.pushButton_generateblocks.setText(_translate("MainWindow", "Generate block files"))
-        self.tableWidget_sequences.setSortingEnabled(True)
-        item = self.tableWidget_sequences.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "Block name"))
-        item = self.tableWidget_sequences.horizontalHeaderItem(1)
-        item.setText(_translate("MainWindow", "Sequence"))
+        self.lineEdit_filter.setPlaceholderText(_translate("MainWindow", "Filter block names and sequences"))
         self.pushButton_deleteall.setText(_translate("MainWindow", "Delete all"))
+        self.pushButton_cancel.setText(_translate("MainWindow", "Cancel"))
+        self.checkBox_incremental.setToolTip(_translate("MainWindow", "Skip block files that exist with the same contents"))
+        self.checkBox_incremental.setText(_translate("MainWindow", "Skip unchanged files"))
+        self.checkBox_prune.setToolTip(_translate("MainWindow", "Remove block files of earlier runs that are not in the table"))
+        self.checkBox_prune.setText(_translate("MainWindow", "Remove old files"))
 
 
 if __name__ == "__main__":
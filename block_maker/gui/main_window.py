@@ -1,9 +1,15 @@
 import os
-from PyQt6.QtWidgets import QMainWindow, QFileDialog, QMessageBox, QTableWidgetItem
-from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QMainWindow, QFileDialog, QMessageBox
+from PyQt6.QtCore import QThread
 from .gui import Ui_MainWindow
+from .sequence_model import SequenceTableModel
+from .worker import GenerationWorker
+from .. import digestion
+from .. import modifications
+from .. import sequence_io
 from .. import utils
-from ..peptide import Peptide
+from ..cache import CompositionCache
+from ..sequence_store import BLOCK_NAME
 
 
 class MainWindow(QMainWindow):
@@ -11,8 +17,19 @@ class MainWindow(QMainWindow):
         super().__init__()
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self) 
+        # Cysteine treatments of the modifications registry.
+        self.ui.comboBox_C_treatment.clear()
+        self.ui.comboBox_C_treatment.addItems(modifications.cysteine_treatments())
         # Set the initial output directory to the current directory.
         self.ui.listWidget_outputdir.addItem(os.getcwd())
+        # Model with block names, sequences and their validity.
+        self.sequence_model = SequenceTableModel(self)
+        self.ui.tableView_sequences.setModel(self.sequence_model)
+        # Background thread and worker for generating block files.
+        self.worker_thread = None
+        self.worker = None
+        # Compositions and masses of earlier runs in this session.
+        self.composition_cache = CompositionCache()
         # Connect button click signals to functions.
         self.ui.toolButton_openfile.clicked.connect(self.open_text_file)
         self.ui.pushButton_addsequence.clicked.connect(self.add_sequence)
@@ -20,10 +37,14 @@ class MainWindow(QMainWindow):
         self.ui.pushButton_deleteall.clicked.connect(self.delete_all)
         self.ui.toolButton_openoutputdir.clicked.connect(self.open_output_dir)
         self.ui.pushButton_generateblocks.clicked.connect(self.generate_blocks)
-        # Connect edited entry in sequence table to function.
-        self.ui.tableWidget_sequences.itemChanged.connect(
-            self.check_sequence_table_edit
-        )
+        self.ui.pushButton_cancel.clicked.connect(self.cancel_generation)
+        # Old block files can only be removed in incremental mode.
+        self.ui.checkBox_prune.setEnabled(False)
+        self.ui.checkBox_incremental.toggled.connect(self.ui.checkBox_prune.setEnabled)
+        # Show only the rows containing the filter text.
+        self.ui.lineEdit_filter.textChanged.connect(self.sequence_model.set_filter)
+        # Connect invalid edited entry in sequence table to function.
+        self.sequence_model.invalidEdit.connect(self.check_sequence_table_edit)
 
     def show_message_box(self, title, icon, text, informative_text):
         '''Show a message box with an icon and text.'''
@@ -54,9 +75,11 @@ class MainWindow(QMainWindow):
         Open a file dialog for selecting a text file with peptide sequences.
         Display the location of the file in the UI. Read the peptide sequences 
         line by line, check their validity and add them to the list.
+        FASTA files with protein sequences are digested with trypsin first.
         '''
         file_path, _ = QFileDialog.getOpenFileName(
-            None, "Select a Text File", "", "Text Files (*.txt);;All Files (*)"
+            None, "Select a Text File", "", 
+            "Text Files (*.txt);;FASTA Files (*.fasta *.fa *.faa);;All Files (*)"
         )
         if file_path:
             # If a text file was loaded previously, clear existing entries.
@@ -64,23 +87,18 @@ class MainWindow(QMainWindow):
                 self.delete_all()
             # Add file location.
             self.ui.listWidget_filelocation.addItem(file_path)
-            # Read sequences from file.
+            # Read sequences from file, and add them to the table in 
+            # batches. Duplicate sequences are skipped.
             with open(file_path, "r") as file:
-                for line in file:
-                    # Remove leading or trailing spaces, and capitalize letters.
-                    sequence = line.strip().upper()
-                    # Skip empty lines.
-                    if sequence == "":
-                        continue
-                    # Check if the sequence is not a duplicate.
-                    elif any(
-                        self.ui.tableWidget_sequences.item(row, 1) and 
-                        self.ui.tableWidget_sequences.item(row, 1).text() == sequence 
-                        for row in range(self.ui.tableWidget_sequences.rowCount())
-                    ):
-                        continue
-                    else:
-                        self.create_table_entry(sequence)
+                if file_path.lower().endswith(digestion.FASTA_EXTENSIONS):
+                    peptides = digestion.digest_proteins(digestion.read_fasta(file))
+                    chunks = sequence_io.chunks(
+                        (peptide for _, peptide in peptides), 10000
+                    )
+                else:
+                    chunks = sequence_io.read_sequence_chunks(file)
+                for sequences in chunks:
+                    self.sequence_model.append_sequences(sequences)
 
     def add_sequence(self):
         '''Check validity of manual input sequence and add it to table.'''
@@ -96,11 +114,7 @@ class MainWindow(QMainWindow):
                 )
         elif sequence == "":
             pass  # Do nothing in case of empty sequence.
-        elif any(
-            self.ui.tableWidget_sequences.item(row, 1) and 
-            self.ui.tableWidget_sequences.item(row, 1).text() == sequence 
-            for row in range(self.ui.tableWidget_sequences.rowCount())
-        ):
+        elif self.sequence_model.contains_sequence(sequence):
             pass  # Do nothing in case of duplicate sequence.
         else:
             self.create_table_entry(sequence)
@@ -108,28 +122,10 @@ class MainWindow(QMainWindow):
     def create_table_entry(self, sequence):
         '''
         Create an editable entry in the table for a valid sequence.
-        Automatically generates a block name.
+        Automatically generates a block name: the first four letters of 
+        the peptide, with a suffix ("_b", "_c" etc) if already present.
         '''
-        # Add sequence to table (editable).
-        row_position = self.ui.tableWidget_sequences.rowCount()
-        self.ui.tableWidget_sequences.insertRow(row_position)
-        self.ui.tableWidget_sequences.setItem(
-            row_position, 1, QTableWidgetItem(sequence)
-        )
-        # Add a block name (editable), first four letters of peptide by default.
-        # If already present, add "_b", "_c" etc as suffix.
-        block_name = sequence[0:4]
-        suffix = "b"
-        while any(
-            self.ui.tableWidget_sequences.item(row, 0) and 
-            self.ui.tableWidget_sequences.item(row, 0).text() == block_name 
-            for row in range(self.ui.tableWidget_sequences.rowCount())
-        ):
-            block_name = sequence[0:4] + '_' + suffix
-            suffix = chr(ord(suffix) + 1)
-        self.ui.tableWidget_sequences.setItem(
-            row_position, 0, QTableWidgetItem(block_name)
-        )
+        self.sequence_model.append_sequences([sequence])
 
     def delete_sequence(self):
         '''Delete selected rows from the sequence table.'''
@@ -137,45 +133,28 @@ class MainWindow(QMainWindow):
         # A set is used because it automatically removes duplicate indices 
         # (when both block and sequence in a row are selected).
         selected_rows = set(
-            index.row() for index in self.ui.tableWidget_sequences.selectedIndexes()
+            index.row() 
+            for index in self.ui.tableView_sequences.selectedIndexes()
         )
-        # Remove entries from table.
-        # Reverse order iteration is used to prevent issues with 
-        # indices shifting when rows are removed from the table.
-        for row in sorted(selected_rows, reverse = True):
-            self.ui.tableWidget_sequences.removeRow(row)
+        self.sequence_model.remove_rows(selected_rows)
 
     def delete_all(self):
         '''
         Remove all block names and corresponding sequences 
         from the sequence table.
         '''
-        self.ui.tableWidget_sequences.setRowCount(0)
+        self.sequence_model.clear()
         self.ui.listWidget_filelocation.clear()
 
-    def check_sequence_table_edit(self, item):
-        '''Check the validity of an edited sequence entry in the table.'''
-        # Get row and column number of the changed item.
-        row = item.row()
-        column = item.column() 
-
-        # Temporarily disconnect the signal to prevent recursion.
-        # Because changing background color of an entry triggers signal.
-        self.ui.tableWidget_sequences.itemChanged.disconnect(
-            self.check_sequence_table_edit
-        )
-
-        # Check changes.
-        if column == 0:  # The block name was edited.
-            # Remove leading/trailing spaces.
-            block_name = item.text().strip()
-            self.ui.tableWidget_sequences.item(row, column).setText(block_name)
-            # Check its validity: only letters or underscores .
-            valid_block = all(char.isalpha() or char == "_" for char in block_name)
-            if not valid_block or block_name == "":
-                # Highlight the corresponding entry.
-                self.ui.tableWidget_sequences.item(row, column).setBackground(Qt.GlobalColor.red)
-                # Show warning if the entry is invalid (not if it is empty).
+    def check_sequence_table_edit(self, row, column):
+        '''
+        Show a warning for an invalid edited entry in the table.
+        The model already normalized the entry and highlights it in red.
+        '''
+        if column == BLOCK_NAME:  # The block name was edited.
+            block_name = self.sequence_model.value(row, column)
+            # Show warning if the entry is invalid (not if it is empty).
+            if block_name != "":
                 self.show_message_box(
                     title = "Invalid block name",
                     icon = "Warning",
@@ -185,138 +164,147 @@ class MainWindow(QMainWindow):
                         "or no file will be created for it!"
                     )
                 )
-            else:
-                # Remove highlight.
-                self.ui.tableWidget_sequences.item(row, column).setBackground(Qt.GlobalColor.transparent)
         else:  # The sequence was edited.
-            # Remove trailing/leading spaces and capitalize.
-            sequence = item.text().strip().upper()
-            self.ui.tableWidget_sequences.item(row, column).setText(sequence)
-            # Check validity of the sequence.
+            sequence = self.sequence_model.value(row, column)
             invalid = utils.check_sequence_validity(sequence)
-            if (len(invalid["positions"])) > 0 or sequence == "":
-                # Highlight the corresponding entry.
-                self.ui.tableWidget_sequences.item(row, column).setBackground(Qt.GlobalColor.red)
-                if len(invalid["positions"]) > 0:
-                # Show warning in case of invalid entry (not if it is empty).
-                    self.show_message_box(
-                        title = "Invalid sequence",
-                        icon = "Warning",
-                        text = utils.generate_invalid_sequence_warning(invalid, sequence),
-                        informative_text = "Adjust this sequence or no block file will be created for it!"
-                    )
-            else:
-                # Remove highlight.
-                self.ui.tableWidget_sequences.item(row, column).setBackground(Qt.GlobalColor.transparent)
-                
-        # Reconnect the signal.
-        self.ui.tableWidget_sequences.itemChanged.connect(self.check_sequence_table_edit)
+            # Show warning in case of invalid entry (not if it is empty).
+            if len(invalid["positions"]) > 0:
+                self.show_message_box(
+                    title = "Invalid sequence",
+                    icon = "Warning",
+                    text = utils.generate_invalid_sequence_warning(invalid, sequence),
+                    informative_text = "Adjust this sequence or no block file will be created for it!"
+                )
     
     def labeled_amino_acids(self):
-        '''Returns a list with labeled amino acids based on the checkboxes'''
+        '''
+        Returns a list with labeled amino acids based on the checkboxes, 
+        one per labeling modification in the registry.
+        '''
         labeled = []
-        checkboxes = {
-            "A": self.ui.checkBox_A,
-            "R": self.ui.checkBox_R,
-            "N": self.ui.checkBox_N,
-            "D": self.ui.checkBox_D,
-            "C": self.ui.checkBox_C,
-            "E": self.ui.checkBox_E,
-            "Q": self.ui.checkBox_Q,
-            "G": self.ui.checkBox_G,
-            "H": self.ui.checkBox_H,
-            "I": self.ui.checkBox_I,
-            "L": self.ui.checkBox_L,
-            "K": self.ui.checkBox_K,
-            "M": self.ui.checkBox_M,
-            "F": self.ui.checkBox_F,
-            "P": self.ui.checkBox_P,
-            "S": self.ui.checkBox_S,
-            "T": self.ui.checkBox_T,
-            "W": self.ui.checkBox_W,
-            "Y": self.ui.checkBox_Y,
-            "V": self.ui.checkBox_V
-        }
-        for amino_acid, checkbox in checkboxes.items():
+        for modification in modifications.group("labeling"):
+            checkbox = getattr(self.ui, f"checkBox_{modification.site}")
             if checkbox.isChecked():
-                labeled.append(amino_acid)
+                labeled.append(modification.site)
         return labeled
 
     def generate_blocks(self):
-        '''Generate block files for valid entries in the sequence table'''
+        '''
+        Generate block files for valid entries in the sequence table.
+        The files are written by a worker in a background thread, so the 
+        window keeps responding. Progress is shown in the progress bar.
+        '''
         # Get a dictionary with valid sequence entries.
         sequences = self.valid_sequence_entries()
-        for block_name, sequence in sequences.items():
-            # Create instance of Peptide class.
-            peptide = Peptide(
-                block_name, sequence,
-                cysteine_treatment = self.ui.comboBox_C_treatment.currentText(),
-                methionine_oxidation = self.ui.radioButton_M_oxidation.isChecked(),
-                isotope_labeling = self.labeled_amino_acids()
-            )
-        
-            # Write messages to log file.
-            utils.write_to_log(
-                f"Start processing block '{block_name}' "
-                f"with sequence '{sequence}'..."
-            )
-            # Cysteine modification message.
-            if "C" in peptide.sequence:
-                if peptide.cysteine_treatment == "Iodo- or chloroacetamide":
-                    utils.write_to_log(
-                        "Cysteines treated with iodo- or chloroacetamide."
-                    )
-                elif peptide.cysteine_treatment == "Iodo- or chloroacetic acid":
-                    utils.write_to_log(
-                        "Cysteines treated with iodo- or chloroacetic acid."
-                    )
-                else:
-                    utils.write_to_log("Cysteines untreated (reduced form).")
-            # Methionine oxidation message.
-            if "M" in peptide.sequence and peptide.methionine_oxidation:
-                utils.write_to_log("Methionines oxidized.")
-            # Isotope labeling message.
-            if len(peptide.isotope_labeling) > 0:
-                utils.write_to_log(
-                    "C-13 and N-15 labeled amino acids: "
-                    f"{", ".join(peptide.isotope_labeling)}"
-                )
+        if sequences == {} or self.worker_thread is not None:
+            return
 
-            # Create block file
-            peptide.write_block_file(
-                output_dir = self.ui.listWidget_outputdir.item(0).text()
+        # Create the worker and move it to a separate thread.
+        self.worker_thread = QThread()
+        self.worker = GenerationWorker(
+            sequences.items(),
+            cysteine_treatment = self.ui.comboBox_C_treatment.currentText(),
+            methionine_oxidation = self.ui.radioButton_M_oxidation.isChecked(),
+            isotope_labeling = self.labeled_amino_acids(),
+            output_dir = self.ui.listWidget_outputdir.item(0).text(),
+            cache = self.composition_cache,
+            incremental = self.ui.checkBox_incremental.isChecked(),
+            prune = (
+                self.ui.checkBox_incremental.isChecked()
+                and self.ui.checkBox_prune.isChecked()
             )
+        )
+        self.worker.moveToThread(self.worker_thread)
+        self.worker_thread.started.connect(self.worker.run)
+        self.worker.progress.connect(self.update_progress)
+        self.worker.finished.connect(self.generation_finished)
+        self.worker.failed.connect(self.generation_failed)
 
-        # Show completion popup box
-        if sequences != {}:
+        # Show progress bar and cancel button during generation.
+        self.ui.pushButton_generateblocks.setEnabled(False)
+        self.ui.progressBar_generation.setRange(0, len(sequences))
+        self.ui.progressBar_generation.setValue(0)
+        self.ui.progressBar_generation.setVisible(True)
+        self.ui.pushButton_cancel.setEnabled(True)
+        self.ui.pushButton_cancel.setVisible(True)
+        self.worker_thread.start()
+
+    def update_progress(self, done, total):
+        '''Show the number of generated block files in the progress bar.'''
+        self.ui.progressBar_generation.setValue(done)
+
+    def cancel_generation(self):
+        '''Stop the running generation after the files in progress.'''
+        if self.worker is not None:
+            self.worker.cancel()
+            self.ui.pushButton_cancel.setEnabled(False)
+
+    def stop_worker_thread(self):
+        '''Wait for the worker thread to end and reset the UI.'''
+        self.worker_thread.quit()
+        self.worker_thread.wait()
+        self.worker_thread = None
+        self.worker = None
+        self.ui.progressBar_generation.setVisible(False)
+        self.ui.pushButton_cancel.setVisible(False)
+        self.ui.pushButton_generateblocks.setEnabled(True)
+
+    def generation_finished(self, block_names, cancelled, skipped):
+        '''Show a summary of the generated block files.'''
+        self.stop_worker_thread()
+        output_dir = self.ui.listWidget_outputdir.item(0).text()
+        # Mention up-to-date block files that were not written again.
+        skipped_text = ""
+        if skipped > 0:
+            skipped_text = f" ({skipped} up to date, not written again)"
+        if cancelled:
+            self.show_message_box(
+                title = "Block file generation cancelled",
+                icon = "Warning",
+                text = (
+                    f"Generation was cancelled after {len(block_names)} "
+                    f"block files in directory {output_dir}{skipped_text}: "
+                ),
+                informative_text = (
+                    ", ".join([key + ".block" for key in block_names])
+                )
+            )
+        else:
+            # Show completion popup box
             self.show_message_box(
                 title = "Block files generated",
                 icon = "Information",
                 text = (
                     "The following block files were generated in directory "
-                    f"{self.ui.listWidget_outputdir.item(0).text()}: "
+                    f"{output_dir}{skipped_text}: "
                 ),
                 informative_text = (
-                    ", ".join([key + ".block" for key in sequences.keys()])
+                    ", ".join([key + ".block" for key in block_names])
                 )
             )
 
+    def generation_failed(self, error):
+        '''Show a warning when block files could not be written.'''
+        self.stop_worker_thread()
+        self.show_message_box(
+            title = "Block file generation failed",
+            icon = "Critical",
+            text = "Block files could not be written.",
+            informative_text = error
+        )
+
+    def closeEvent(self, event):
+        '''Cancel a running generation before closing the window.'''
+        if self.worker_thread is not None:
+            self.worker.cancel()
+            self.worker_thread.quit()
+            self.worker_thread.wait()
+        super().closeEvent(event)
+
     def valid_sequence_entries(self):
         '''
-        Determine valid entries in the sequence tableWidget.
+        Determine valid entries in the sequence table.
         Return a dictionary with block names as keys and their 
         corresponding sequences as values.
         '''
-        valid = {}  # Initiate empty dictionary
-        for row in range(self.ui.tableWidget_sequences.rowCount()):
-            block_name_item = self.ui.tableWidget_sequences.item(row, 0)
-            sequence_item = self.ui.tableWidget_sequences.item(row, 1)
-            # Check that neither block_name nor sequence are highlighted in red
-            if (
-                block_name_item and sequence_item and
-                block_name_item.background().color() != Qt.GlobalColor.red and
-                sequence_item.background().color() != Qt.GlobalColor.red
-            ):
-                valid[block_name_item.text()] = sequence_item.text()
-                
-        return valid
+        return self.sequence_model.valid_entries()
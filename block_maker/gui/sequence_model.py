@@ -0,0 +1,184 @@
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt, pyqtSignal
+from PyQt6.QtGui import QColor
+from ..instrumentation import instrumented
+from ..sequence_store import BLOCK_NAME, SequenceStore
+
+
+class SequenceTableModel(QAbstractTableModel):
+    '''
+    Table model for the block names and sequences, on top of a
+    SequenceStore. Invalid entries are shown with a red background.
+    Rows are made available to the view in batches (lazy loading), so
+    large imports do not have to be laid out at once. With a filter, only
+    the rows containing the filter text are shown; row numbers of the
+    model are those of the shown rows.
+    '''
+    # Row and column of an edited entry that turned out to be invalid.
+    invalidEdit = pyqtSignal(int, int)
+
+    HEADERS = ("Block name", "Sequence")
+    # Number of rows made available to the view at once.
+    BATCH_SIZE = 1000
+
+    def __init__(self, parent = None):
+        super().__init__(parent)
+        self.store = SequenceStore()
+        # Number of rows available to the view.
+        self._loaded = 0
+        # Filter text, and the store rows that contain it (None: all rows).
+        self._filter = ""
+        self._rows = None
+        self._red = QColor(Qt.GlobalColor.red)
+
+    def rowCount(self, parent = QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._loaded
+
+    def columnCount(self, parent = QModelIndex()):
+        if parent.isValid():
+            return 0
+        return 2
+
+    def canFetchMore(self, parent = QModelIndex()):
+        if parent.isValid():
+            return False
+        return self._loaded < self._count()
+
+    def fetchMore(self, parent = QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.BATCH_SIZE, self._count() - self._loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def data(self, index, role = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = self._store_row(index.row()), index.column()
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return self.store.value(row, column)
+        if role == Qt.ItemDataRole.BackgroundRole:
+            if not self.store.is_valid(row, column):
+                return self._red
+        return None
+
+    def headerData(self, section, orientation, role = Qt.ItemDataRole.DisplayRole):
+        if (
+            role == Qt.ItemDataRole.DisplayRole
+            and orientation == Qt.Orientation.Horizontal
+        ):
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        return (
+            Qt.ItemFlag.ItemIsEnabled
+            | Qt.ItemFlag.ItemIsSelectable
+            | Qt.ItemFlag.ItemIsEditable
+        )
+
+    def setData(self, index, value, role = Qt.ItemDataRole.EditRole):
+        '''Store an edited block name or sequence and check its validity.'''
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        row, column = self._store_row(index.row()), index.column()
+        self.store.set_value(row, column, value)
+        self.dataChanged.emit(index, index)
+        if not self.store.is_valid(row, column):
+            self.invalidEdit.emit(index.row(), column)
+        return True
+
+    def sort(self, column, order = Qt.SortOrder.AscendingOrder):
+        '''Sort all rows (also those not loaded yet) by a column.'''
+        self.beginResetModel()
+        self.store.sort(
+            column, descending = order == Qt.SortOrder.DescendingOrder
+        )
+        self._apply_filter()
+        self.endResetModel()
+
+    def contains_sequence(self, sequence):
+        '''Return True if the sequence is already in the table.'''
+        return self.store.contains_sequence(sequence)
+
+    @instrumented("table")
+    def append_sequences(self, sequences):
+        '''
+        Add sequences with generated block names at the end of the table.
+        Sequences that are already present are skipped. Rows beyond the 
+        first batch are loaded when the view needs them.
+        '''
+        fully_loaded = self._loaded == self._count()
+        # New sequences, without duplicates, in their original order.
+        new_sequences = dict.fromkeys(
+            sequence for sequence in sequences 
+            if not self.store.contains_sequence(sequence)
+        )
+        start = len(self.store)
+        self.store.extend(new_sequences)
+        if self._rows is not None:
+            # Only the new rows are checked against the filter.
+            self._rows.extend(self.store.find(self._filter, start))
+        if fully_loaded:
+            self.fetchMore()
+
+    def remove_rows(self, rows):
+        '''Remove a collection of row numbers.'''
+        self.beginResetModel()
+        self.store.remove_rows([self._store_row(row) for row in rows])
+        self._apply_filter()
+        self._loaded = min(max(self._loaded, self.BATCH_SIZE), self._count())
+        self.endResetModel()
+
+    def clear(self):
+        '''Remove all rows.'''
+        self.beginResetModel()
+        self.store.clear()
+        self._apply_filter()
+        self._loaded = 0
+        self.endResetModel()
+
+    @instrumented("table")
+    def set_filter(self, text):
+        '''
+        Only show the rows whose block name or sequence contains the text
+        (not case sensitive). Show all rows if the text is empty.
+        '''
+        self.beginResetModel()
+        self._filter = text.strip()
+        self._apply_filter()
+        self._loaded = min(self.BATCH_SIZE, self._count())
+        self.endResetModel()
+
+    def valid_entries(self):
+        '''
+        Return a dictionary with valid block names as keys and their
+        corresponding sequences as values, also of the rows hidden by
+        the filter.
+        '''
+        return self.store.valid_entries()
+
+    def value(self, row, column = BLOCK_NAME):
+        '''Return the block name or sequence of a row.'''
+        return self.store.value(self._store_row(row), column)
+
+    def _count(self):
+        '''Return the number of rows shown with the filter.'''
+        return len(self.store) if self._rows is None else len(self._rows)
+
+    def _store_row(self, row):
+        '''Return the row in the store of a row of the model.'''
+        return row if self._rows is None else self._rows[row]
+
+    def _apply_filter(self):
+        '''Find the rows that contain the filter text again.'''
+        if self._filter == "":
+            self._rows = None
+        else:
+            self._rows = self.store.find(self._filter)
@@ -0,0 +1,70 @@
+from PyQt6.QtCore import QObject, pyqtSignal
+from .. import parallel
+
+
+class GenerationWorker(QObject):
+    '''
+    Generates block files in a background thread, so the main window keeps
+    responding. Reports progress with signals and can be cancelled.
+    '''
+    # Number of block files done and total number of block files.
+    progress = pyqtSignal(int, int)
+    # Block names of the generated (or up-to-date) files, whether the run
+    # was cancelled, and the number of up-to-date files that were skipped.
+    finished = pyqtSignal(list, bool, int)
+    # Error message when generation failed.
+    failed = pyqtSignal(str)
+
+    def __init__(self, entries, cysteine_treatment, methionine_oxidation,
+                 isotope_labeling, output_dir, cache = None, 
+                 incremental = False, prune = False):
+        super().__init__()
+        self.entries = list(entries)
+        self.cysteine_treatment = cysteine_treatment
+        self.methionine_oxidation = methionine_oxidation
+        self.isotope_labeling = isotope_labeling
+        self.output_dir = output_dir
+        # CompositionCache shared between runs (only used by this worker
+        # while it runs).
+        self.cache = cache
+        self.incremental = incremental
+        self.prune = prune
+        self._cancelled = False
+
+    def cancel(self):
+        '''Request the worker to stop after the block files in progress.'''
+        self._cancelled = True
+
+    def is_cancelled(self):
+        '''Return True when cancelling was requested.'''
+        return self._cancelled
+
+    def run(self):
+        '''Generate the block files. Runs in the worker thread.'''
+        try:
+            writer = parallel.generate_blocks(
+                self.entries,
+                cysteine_treatment = self.cysteine_treatment,
+                methionine_oxidation = self.methionine_oxidation,
+                isotope_labeling = self.isotope_labeling,
+                output_dir = self.output_dir,
+                progress = self.progress.emit,
+                cancelled = self.is_cancelled,
+                cache = self.cache,
+                incremental = self.incremental,
+                prune = self.prune
+            )
+        except Exception as error:
+            # Not only file errors: an exception must not escape the slot
+            # (e.g. a worker process that was killed).
+            if isinstance(error, OSError):
+                self.failed.emit(str(error))
+            else:
+                self.failed.emit(f"{type(error).__name__}: {error}")
+            return
+        # Files are written (or skipped) in the order of the entries.
+        done = writer.files_written + writer.files_skipped
+        block_names = [block_name for block_name, _ in self.entries[:done]]
+        # Cancelled if the run stopped for it (nothing was pruned), even
+        # when the chunks in progress were the last ones.
+        self.finished.emit(block_names, not writer.commit, writer.files_skipped)
@@ -0,0 +1,261 @@
+'''
+Timers and counters for the hot paths of BlockMaker: validation,
+composition, block files, logging and the sequence table. Functions are
+marked with the instrumented decorator, which only registers them; they
+are replaced by timing wrappers when instrumentation is enabled, so the
+marked functions cost nothing extra when it is off.
+
+Enable instrumentation with the environment variable BLOCKMAKER_INSTRUMENT=1
+(also for the GUI), or with --instrument on the command line. At the end
+of every BlockWriter run, a summary with the cumulative time, the number of
+calls and the bytes written per function, and the peak memory use, is
+logged as a single line. It is also written as JSON to
+BLOCKMAKER_INSTRUMENT_JSON (or --instrument-json), and the run is profiled
+with cProfile to BLOCKMAKER_CPROFILE (or --cprofile) if set. Worker
+processes of a parallel run send their counters back with every chunk.
+Times are inclusive: the time of write_block_file includes its logging.
+'''
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+try:
+    import resource
+except ImportError:
+    # Not available on Windows: no peak memory.
+    resource = None
+
+
+ENABLE_VARIABLE = "BLOCKMAKER_INSTRUMENT"
+JSON_VARIABLE = "BLOCKMAKER_INSTRUMENT_JSON"
+CPROFILE_VARIABLE = "BLOCKMAKER_CPROFILE"
+
+# Registered functions: (function, stage, size), where size returns the
+# number of bytes written by a call, from its arguments.
+_targets = []
+# (owner, attribute) -> original function, for the installed wrappers.
+_originals = {}
+# Qualified function name -> [stage, calls, seconds, bytes].
+_counters = {}
+# Held while the counters are changed or read: wrapped functions are also
+# called from worker threads.
+_lock = threading.Lock()
+# Peak memory reported by worker processes (bytes).
+_worker_peak = 0
+_enabled = False
+_json_path = None
+_cprofile_path = None
+_profiler = None
+_start = None
+
+
+def instrumented(stage, size = None):
+    '''
+    Decorator marking a function (or method) as a hot path of a stage.
+    With size, a function of the call arguments, the bytes written by
+    every call are counted as well. The function itself is returned,
+    unless instrumentation is already enabled.
+    '''
+    def decorator(function):
+        _targets.append((function, stage, size))
+        if _enabled:
+            return _wrap(function, stage, size)
+        return function
+    return decorator
+
+
+def enabled():
+    '''Return True if instrumentation is enabled.'''
+    return _enabled
+
+
+def enable(json_path = None, cprofile_path = None):
+    '''
+    Enable instrumentation: replace the registered functions by timing
+    wrappers. Optionally, the summary of every run is written as JSON to
+    json_path, and runs are profiled with cProfile to cprofile_path. The
+    environment variable is set as well, so worker processes started
+    later are instrumented too.
+    '''
+    global _enabled, _json_path, _cprofile_path
+    _json_path = json_path
+    _cprofile_path = cprofile_path
+    os.environ[ENABLE_VARIABLE] = "1"
+    if _enabled:
+        return
+    _enabled = True
+    for function, stage, size in _targets:
+        owner, name = _location(function)
+        if owner is not None and getattr(owner, name) is function:
+            _originals[(owner, name)] = function
+            setattr(owner, name, _wrap(function, stage, size))
+
+
+def disable():
+    '''Restore the original functions and stop counting.'''
+    global _enabled
+    for (owner, name), function in _originals.items():
+        setattr(owner, name, function)
+    _originals.clear()
+    os.environ.pop(ENABLE_VARIABLE, None)
+    _enabled = False
+
+
+def reset():
+    '''Set all counters to zero, e.g. in a new worker process.'''
+    global _worker_peak
+    with _lock:
+        _counters.clear()
+        _worker_peak = 0
+
+
+def take():
+    '''
+    Return the counters of this process and reset them. Used by worker
+    processes, see merge.
+    '''
+    global _worker_peak
+    with _lock:
+        counters = {name: list(values) for name, values in _counters.items()}
+        _counters.clear()
+        _worker_peak = 0
+    return {"counters": counters, "peak_memory": peak_memory()}
+
+
+def merge(stats):
+    '''Add the counters returned by take in a worker process.'''
+    global _worker_peak
+    with _lock:
+        for name, (stage, calls, seconds, size) in stats["counters"].items():
+            values = _counters.setdefault(name, [stage, 0, 0.0, 0])
+            values[1] += calls
+            values[2] += seconds
+            values[3] += size
+        if stats["peak_memory"] is not None:
+            _worker_peak = max(_worker_peak, stats["peak_memory"])
+
+
+def peak_memory():
+    '''Return the peak memory use (resident set) of this process in bytes.'''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def summary():
+    '''
+    Return the counters as a dictionary: seconds since the start of the
+    run, peak memory of this process and of the worker processes, and the
+    stage, calls, seconds and bytes per function.
+    '''
+    with _lock:
+        counters = {name: list(values) for name, values in _counters.items()}
+        worker_peak = _worker_peak
+    return {
+        "seconds": None if _start is None else time.perf_counter() - _start,
+        "peak_memory": peak_memory(),
+        "worker_peak_memory": worker_peak or None,
+        "functions": {
+            name: {
+                "stage": stage, "calls": calls,
+                "seconds": seconds, "bytes": size
+            }
+            for name, (stage, calls, seconds, size) in sorted(
+                counters.items(), key = lambda item: -item[1][2]
+            )
+        }
+    }
+
+
+def format_summary(stats):
+    '''Return a summary as a single log line.'''
+    parts = [
+        f"{name} {values['seconds']:.3f} s/{values['calls']} calls"
+        + (f"/{values['bytes']} bytes" if values["bytes"] else "")
+        for name, values in stats["functions"].items()
+    ]
+    memory = stats["peak_memory"]
+    if memory is not None:
+        parts.append(f"peak memory {memory / 2 ** 20:.1f} MiB")
+    if stats["worker_peak_memory"] is not None:
+        parts.append(
+            f"worker peak memory {stats['worker_peak_memory'] / 2 ** 20:.1f} MiB"
+        )
+    return "Instrumentation: " + ", ".join(parts)
+
+
+def start_run():
+    '''
+    Start a run, if enabled: start the clock and the profiler. Calls since
+    the previous run (e.g. the table import) are part of the summary.
+    '''
+    global _start, _profiler
+    if not _enabled:
+        return
+    _start = time.perf_counter()
+    if _cprofile_path is not None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def finish_run(logger):
+    '''
+    Finish a run, if enabled: log the summary, write it as JSON and save
+    the profile. The counters are reset for the next run.
+    '''
+    global _profiler, _start
+    if not _enabled:
+        return
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(_cprofile_path)
+        _profiler = None
+    stats = summary()
+    logger.info(format_summary(stats))
+    if _json_path is not None:
+        with open(_json_path, "w") as file:
+            json.dump(stats, file, indent = 2)
+    reset()
+    _start = None
+
+
+def _wrap(function, stage, size):
+    '''Return a wrapper that counts the calls, time and bytes of a function.'''
+    # Module and qualified name, e.g. "peptide.Peptide.__init__".
+    name = f"{function.__module__.rsplit('.', 1)[-1]}.{function.__qualname__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            written = 0 if size is None else size(*args, **kwargs)
+            with _lock:
+                values = _counters.get(name)
+                if values is None:
+                    values = _counters[name] = [stage, 0, 0.0, 0]
+                values[1] += 1
+                values[2] += seconds
+                values[3] += written
+    return wrapper
+
+
+def _location(function):
+    '''Return the module or class with a function, and its attribute name.'''
+    owner = sys.modules.get(function.__module__)
+    *path, name = function.__qualname__.split(".")
+    for part in path:
+        owner = getattr(owner, part, None)
+    return owner, name
+
+
+# Worker processes started with spawn import this module again.
+if os.environ.get(ENABLE_VARIABLE, "") not in ("", "0"):
+    enable(os.environ.get(JSON_VARIABLE), os.environ.get(CPROFILE_VARIABLE))
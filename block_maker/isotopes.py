@@ -0,0 +1,211 @@
+'''
+Isotopic distributions of peptides, based on the composition written to the
+block file. The distribution of each element count is a power of the
+polynomial of its isotope abundances, where the exponent of a term is the
+number of extra neutrons. Powers are calculated by repeated squaring and
+truncated to the number of isotopologues needed, and cached per element and
+count, so peptides in a batch share them. Besides the abundances, the
+abundance-weighted mass offsets are convolved as well, which gives the
+average mass of each aggregated isotopologue (M, M+1, M+2, ...).
+
+Truncated to a few terms, the polynomials are short, so direct convolution
+is faster than FFT convolution here.
+'''
+import numpy as np
+from .cache import ELEMENTS
+from .resources import constants
+
+
+# Natural isotopes of the elements: (mass, abundance), by number of extra
+# neutrons. Taken from:
+# https://physics.nist.gov/cgi-bin/Compositions/stand_alone.pl
+ISOTOPES = {
+    "carbons": (
+        (constants.CARBON_MASS, 0.9893),
+        (13.003354835, 0.0107)
+    ),
+    "hydrogens": (
+        (constants.HYDROGEN_MASS, 0.999885),
+        (2.014101778, 0.000115)
+    ),
+    "nitrogens": (
+        (constants.NITROGEN_MASS, 0.99636),
+        (15.000108899, 0.00364)
+    ),
+    "oxygens": (
+        (constants.OXYGEN_MASS, 0.99757),
+        (16.999131757, 0.00038),
+        (17.999159612, 0.00205)
+    ),
+    "sulfurs": (
+        (constants.SULFUR_MASS, 0.9499),
+        (32.971458910, 0.0075),
+        (33.967866900, 0.0425),
+        (None, 0.0),
+        (35.967080760, 0.0001)
+    )
+}
+
+
+class IsotopeCalculator():
+    '''
+    Calculate isotopic distributions with n_peaks isotopologues (M, M+1,
+    ...). Isotopologues with a fraction below threshold (of all molecules)
+    are pruned. Labeled C-13 and N-15 atoms are not part of the block file
+    composition and fully labeled, so they only shift the distribution,
+    which starts at the mass of the peptide.
+
+        calculator = IsotopeCalculator(n_peaks = 5)
+        for mass, abundance in calculator.peptide_distribution(peptide):
+            print(f"{mass:.5f}\\t{abundance:.4f}")
+    '''
+    def __init__(self, n_peaks = 5, threshold = 1e-4):
+        self.n_peaks = n_peaks
+        self.threshold = threshold
+        # Element polynomials: (abundances, abundance-weighted mass offsets).
+        self._base = {}
+        for element, isotopes in ISOTOPES.items():
+            abundances = np.zeros(n_peaks)
+            weighted = np.zeros(n_peaks)
+            for neutrons, (mass, abundance) in enumerate(isotopes[:n_peaks]):
+                if abundance > 0:
+                    abundances[neutrons] = abundance
+                    weighted[neutrons] = abundance * (mass - isotopes[0][0])
+            self._base[element] = (abundances, weighted)
+        # (element, count) -> polynomial of that number of atoms.
+        self._powers = {}
+
+    def element_distribution(self, element, count):
+        '''
+        Return the distribution of count atoms of an element, as arrays of
+        abundances and abundance-weighted mass offsets per isotopologue.
+        Cached, and calculated from cached smaller powers.
+        '''
+        if count < 0:
+            raise ValueError(f"Negative number of {element}: {count}")
+        key = (element, count)
+        power = self._powers.get(key)
+        if power is not None:
+            return power
+        if count == 0:
+            power = (_unit(self.n_peaks), np.zeros(self.n_peaks))
+        elif count == 1:
+            power = self._base[element]
+        else:
+            # Square the power of half the count, times one more atom if odd.
+            half = self.element_distribution(element, count // 2)
+            power = self._multiply(half, half)
+            if count % 2 == 1:
+                power = self._multiply(power, self._base[element])
+        self._powers[key] = power
+        return power
+
+    def distribution(self, composition, mass):
+        '''
+        Return the isotopic distribution of a composition (dictionary with
+        the number of atoms per element) with monoisotopic mass, as a list
+        of (mass, abundance) tuples. Pruned isotopologues are left out.
+        '''
+        abundances = _unit(self.n_peaks)
+        weighted = np.zeros(self.n_peaks)
+        for element in ELEMENTS:
+            abundances, weighted = self._multiply(
+                (abundances, weighted),
+                self.element_distribution(element, composition[element])
+            )
+        return [
+            (float(mass + weighted[i] / abundances[i]), float(abundances[i]))
+            for i in range(self.n_peaks)
+            if abundances[i] >= self.threshold and abundances[i] > 0
+        ]
+
+    def peptide_distribution(self, peptide):
+        '''Return the isotopic distribution of a Peptide (see distribution).'''
+        return self.distribution(peptide.composition, peptide.mass)
+
+    def distributions(self, compositions, masses):
+        '''
+        Return the isotopic distributions of many compositions at once, as
+        two arrays of N x n_peaks: masses and abundances of the
+        isotopologues. Pruned isotopologues have abundance 0 and mass NaN.
+        Each distinct element count is calculated once for the whole batch,
+        and the convolutions are done for all compositions together.
+        '''
+        counts = np.array(
+            [[composition[element] for element in ELEMENTS]
+             for composition in compositions],
+            dtype = np.int64
+        ).reshape(-1, len(ELEMENTS))
+        abundances = np.zeros((len(counts), self.n_peaks))
+        abundances[:, 0] = 1.0
+        weighted = np.zeros((len(counts), self.n_peaks))
+        for column, element in enumerate(ELEMENTS):
+            # Distribution of each distinct count, gathered per composition.
+            values, inverse = np.unique(counts[:, column], return_inverse = True)
+            powers = [
+                self.element_distribution(element, value) 
+                for value in values.tolist()
+            ]
+            shape = (len(powers), self.n_peaks)
+            element_abundances = np.array(
+                [power[0] for power in powers]
+            ).reshape(shape)[inverse]
+            element_weighted = np.array(
+                [power[1] for power in powers]
+            ).reshape(shape)[inverse]
+            abundances, weighted = self._multiply(
+                (abundances, weighted), (element_abundances, element_weighted)
+            )
+        kept = (abundances >= self.threshold) & (abundances > 0)
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            peak_masses = (
+                np.asarray(masses, dtype = np.float64)[:, None]
+                + weighted / abundances
+            )
+        peak_masses[~kept] = np.nan
+        abundances[~kept] = 0.0
+        return peak_masses, abundances
+
+    def peptide_distributions(self, peptides):
+        '''Return the isotopic distributions of Peptides (see distributions).'''
+        peptides = list(peptides)
+        return self.distributions(
+            [peptide.composition for peptide in peptides],
+            [peptide.mass for peptide in peptides]
+        )
+
+    def _multiply(self, first, second):
+        '''
+        Multiply two truncated polynomials given as (abundances, weighted
+        mass offsets); also works on arrays with one polynomial per row.
+        '''
+        abundances_1, weighted_1 = first
+        abundances_2, weighted_2 = second
+        n = self.n_peaks
+        if abundances_1.ndim == 1 and abundances_2.ndim == 1:
+            return (
+                np.convolve(abundances_1, abundances_2)[:n],
+                np.convolve(weighted_1, abundances_2)[:n]
+                + np.convolve(abundances_1, weighted_2)[:n]
+            )
+        abundances = np.zeros(
+            np.broadcast_shapes(abundances_1.shape, abundances_2.shape)
+        )
+        weighted = np.zeros_like(abundances)
+        # One polynomial per row. Only terms up to n_peaks are kept: at
+        # most n_peaks^2 products of columns.
+        for i in range(n):
+            for j in range(n - i):
+                abundances[..., i + j] += abundances_1[..., i] * abundances_2[..., j]
+                weighted[..., i + j] += (
+                    weighted_1[..., i] * abundances_2[..., j]
+                    + abundances_1[..., i] * weighted_2[..., j]
+                )
+        return abundances, weighted
+
+
+def _unit(n_peaks):
+    '''Return the polynomial 1 (no atoms), truncated to n_peaks terms.'''
+    unit = np.zeros(n_peaks)
+    unit[0] = 1.0
+    return unit
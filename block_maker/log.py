@@ -0,0 +1,211 @@
+'''
+Logging for BlockMaker, based on the logging module. Log records are put
+on a queue by a QueueHandler and written to the log files by a
+QueueListener thread, so no file is touched in the code that generates
+block files. The text log keeps the format of BlockMaker.log. Optionally,
+a JSON lines file with one record per block is written as well, and log
+files are rotated when they reach a maximum size.
+'''
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from .instrumentation import instrumented
+
+
+LOGGER_NAME = "block_maker"
+DEFAULT_PATH = "BlockMaker.log"
+
+# Listener thread, queue handler and settings of the current configuration.
+_listener = None
+_queue_handler = None
+_settings = None
+
+
+def format_log_entry(message, timestamp):
+    '''Format a message with its timestamp as an entry for the log file.'''
+    if message.startswith("Start processing block"):
+        # Add empty line before new sequence.
+        return f"\n\n{timestamp}\t{message}"
+    else:
+        return f"\n{timestamp}\t{message}"
+
+
+class TextFormatter(logging.Formatter):
+    '''
+    Format records as entries of BlockMaker.log, with date and time.
+    A record with a list of messages (e.g. all messages of one block) is
+    written as one entry per message, with the same date and time.
+    '''
+    def __init__(self):
+        super().__init__()
+        self._second = None
+        self._timestamp = None
+
+    def format(self, record):
+        # Only format the timestamp again when a new second has started.
+        second = int(record.created)
+        if second != self._second:
+            self._second = second
+            self._timestamp = time.strftime(
+                "%Y-%m-%d %H:%M:%S", time.localtime(second)
+            )
+        messages = getattr(record, "messages", None)
+        if messages is None:
+            return format_log_entry(record.getMessage(), self._timestamp)
+        return "".join(
+            format_log_entry(message, self._timestamp)
+            for message in messages
+        )
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    '''
+    Put log records on the queue as they are. Unlike the standard
+    QueueHandler, records are not formatted (and copied) before they are
+    queued, so formatting is left to the listener thread.
+    '''
+    def prepare(self, record):
+        return record
+
+
+class JsonLinesFormatter(logging.Formatter):
+    '''
+    Format records as JSON objects, one per line. Records of a block
+    contain its name, sequence, mass, composition and settings.
+    '''
+    def format(self, record):
+        entry = {
+            "time": time.strftime(
+                "%Y-%m-%dT%H:%M:%S", time.localtime(record.created)
+            ),
+            "level": record.levelname
+        }
+        block = getattr(record, "block", None)
+        if block is None:
+            entry["message"] = record.getMessage()
+        else:
+            entry.update(block)
+        return json.dumps(entry) + "\n"
+
+
+def configure(path = DEFAULT_PATH, level = "INFO", json_path = None,
+              max_bytes = 0, backup_count = 0):
+    '''
+    Set up logging to a text log file at path and, optionally, a JSON lines
+    file at json_path. Messages below level (e.g. "INFO" or "WARNING") are
+    ignored. With max_bytes > 0, log files are rotated when they would
+    exceed max_bytes, keeping backup_count old files. Replaces an earlier
+    configuration.
+    '''
+    global _listener, _queue_handler, _settings
+    shutdown()
+    handlers = [_file_handler(path, max_bytes, backup_count, TextFormatter())]
+    if json_path is not None:
+        handlers.append(
+            _file_handler(json_path, max_bytes, backup_count, JsonLinesFormatter())
+        )
+    log_queue = queue.Queue()
+    _queue_handler = QueueHandler(log_queue)
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.addHandler(_queue_handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(log_queue, *handlers)
+    _listener.start()
+    _settings = {
+        "path": os.path.abspath(path),
+        "level": level,
+        "json_path": None if json_path is None else os.path.abspath(json_path),
+        "max_bytes": max_bytes,
+        "backup_count": backup_count
+    }
+
+
+def set_path(path):
+    '''Write the text log to another file, keeping the other settings.'''
+    if _settings is None:
+        configure(path = path)
+    elif os.path.abspath(path) != _settings["path"]:
+        configure(**{**_settings, "path": path})
+
+
+def get_logger():
+    '''Return the BlockMaker logger, with the default configuration if needed.'''
+    if _listener is None:
+        configure()
+    return logging.getLogger(LOGGER_NAME)
+
+
+def block_records_enabled():
+    '''Return True if records per block are written (JSON lines).'''
+    return _settings is not None and _settings["json_path"] is not None
+
+
+@instrumented("logging")
+def log_block(logger, messages, record = None):
+    '''
+    Log all messages of one block as a single log record, with an optional
+    dictionary describing the block for the JSON lines file.
+    '''
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            messages[0], extra = {"messages": messages, "block": record}
+        )
+
+
+@instrumented("logging")
+def flush():
+    '''Wait until all queued log records are written to the log files.'''
+    if _listener is None:
+        return
+    _listener.queue.join()
+    for handler in _listener.handlers:
+        handler.flush()
+
+
+def sync():
+    '''Write all queued log records and flush the log files to disk.'''
+    flush()
+    if _listener is None:
+        return
+    for handler in _listener.handlers:
+        if handler.stream is not None:
+            os.fsync(handler.stream.fileno())
+
+
+def shutdown():
+    '''Write all queued log records, stop the listener and close the files.'''
+    global _listener, _queue_handler, _settings
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    logging.getLogger(LOGGER_NAME).removeHandler(_queue_handler)
+    _listener = None
+    _queue_handler = None
+    _settings = None
+
+
+def _file_handler(path, max_bytes, backup_count, formatter):
+    '''
+    Return a handler that appends to a log file, rotating if max_bytes > 0.
+    The file is only created when the first record is written.
+    '''
+    if max_bytes > 0:
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes = max_bytes, backupCount = backup_count, delay = True
+        )
+    else:
+        handler = logging.FileHandler(path, delay = True)
+    # Entries start with a line break instead of ending with one.
+    handler.terminator = ""
+    handler.setFormatter(formatter)
+    return handler
+
+
+atexit.register(shutdown)
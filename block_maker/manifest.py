@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+
+
+# Name of the manifest file in the output directory.
+MANIFEST_NAME = "BlockMaker.manifest.json"
+
+
+def content_hash(content):
+    '''Return the SHA-256 hash of the contents of a block file.'''
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def disk_hash(path):
+    '''
+    Return the hash of the contents of a block file on disk (see 
+    content_hash), or None if it cannot be read.
+    '''
+    try:
+        with open(path, "r") as file:
+            return content_hash(file.read())
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+class Manifest():
+    '''
+    Hashes of the block files written to an output directory, stored in a
+    manifest file in that directory. Used to skip block files that are
+    already up to date. The contents of a block file follow from the
+    sequence and all modification settings, so the hash of the contents
+    changes whenever the block file would change. Block files can also be
+    replaced outside incremental runs, so a file listed with the same hash
+    is only up to date if the file on disk still has that hash.
+    '''
+    def __init__(self, output_dir, hashes = None):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        # Block name -> hash of the block file contents.
+        self.hashes = {}
+        # Block names of the current run.
+        self.seen = set()
+        if hashes is None:
+            self.load()
+        else:
+            # Part of a manifest, e.g. sent to a worker process.
+            self.hashes = hashes
+
+    def load(self):
+        '''
+        Read the manifest file. A missing or unreadable manifest is
+        treated as empty, so all block files are written again.
+        '''
+        try:
+            with open(self.path, "r") as file:
+                hashes = json.load(file)["blocks"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        if isinstance(hashes, dict):
+            self.hashes = hashes
+
+    def is_current(self, block_name, file_hash):
+        '''
+        Return True if the block file was written with the same contents
+        and has not changed since. The block name is counted as part of
+        this run.
+        '''
+        self.seen.add(block_name)
+        return (
+            self.hashes.get(block_name) == file_hash
+            and disk_hash(self.block_path(block_name)) == file_hash
+        )
+
+    def record(self, block_name, file_hash):
+        '''Store the hash of a block file that was written in this run.'''
+        self.seen.add(block_name)
+        self.hashes[block_name] = file_hash
+
+    def block_path(self, block_name):
+        '''Return the path of the block file of a block name.'''
+        return os.path.join(self.output_dir, block_name + ".block")
+
+    def stale(self):
+        '''Return the block names in the manifest that are not in this run.'''
+        return sorted(set(self.hashes) - self.seen)
+
+    def prune(self):
+        '''
+        Delete the block files of earlier runs that are not part of this
+        run. Only files listed in the manifest are deleted. Return the
+        block names of the deleted files.
+        '''
+        pruned = []
+        for block_name in self.stale():
+            try:
+                os.remove(self.block_path(block_name))
+            except FileNotFoundError:
+                pass
+            del self.hashes[block_name]
+            pruned.append(block_name)
+        return pruned
+
+    def save(self):
+        '''Write the manifest file, replacing it only when complete.'''
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump({"version": 1, "blocks": self.hashes}, file)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,131 @@
+'''
+Reverse lookup from observed m/z values to generated peptides. The index
+keeps the monoisotopic masses of the peptides in a sorted array, so the
+peptides matching an m/z value within a ppm tolerance are found with a
+binary search for each charge state, in O(log n).
+'''
+import bisect
+import numpy as np
+from .peptide import Peptide
+from .resources import constants
+
+
+class MassIndex():
+    '''
+    Index of peptides (or any objects with a mass attribute, such as
+    CompactPeptide) sorted by monoisotopic mass. Matches are returned as
+    (peptide, charge, error_ppm) tuples, where error_ppm is the difference
+    between the calculated and observed m/z, relative to the observed m/z.
+    The tolerance is relative to the observed m/z as well.
+
+        index = MassIndex.from_entries(entries, "None (reduced form)", False, [])
+        for peptide, charge, error_ppm in index.query(464.2347, 10, 3):
+            print(peptide.block_name, charge, error_ppm)
+    '''
+    def __init__(self, peptides):
+        peptides = sorted(peptides, key = lambda peptide: peptide.mass)
+        self.peptides = peptides
+        self.masses = np.array(
+            [peptide.mass for peptide in peptides], dtype = np.float64
+        )
+        # Plain list for single queries: bisect is faster on a list.
+        self._masses = self.masses.tolist()
+
+    @classmethod
+    def from_entries(cls, entries, cysteine_treatment, methionine_oxidation,
+                     isotope_labeling, cache = None):
+        '''
+        Build an index for (block_name, sequence) tuples, with the same
+        modifications as the block files (and an optional CompositionCache).
+        '''
+        return cls(
+            Peptide(
+                block_name, sequence, cysteine_treatment, methionine_oxidation,
+                isotope_labeling, cache = cache
+            )
+            for block_name, sequence in entries
+        )
+
+    def __len__(self):
+        return len(self.peptides)
+
+    def mass_range(self, low, high):
+        '''Return the peptides with a mass from low to high (inclusive).'''
+        start = bisect.bisect_left(self._masses, low)
+        end = bisect.bisect_right(self._masses, high, lo = start)
+        return self.peptides[start:end]
+
+    def query(self, mz, tolerance_ppm = 10.0, max_charge = 1):
+        '''
+        Return the matches for an observed m/z value of a protonated
+        peptide, for charge states 1 to max_charge, as (peptide, charge,
+        error_ppm) tuples ordered by charge and mass.
+        '''
+        matches = []
+        for charge in range(1, max_charge + 1):
+            low, high = _mass_bounds(mz, tolerance_ppm, charge)
+            start = bisect.bisect_left(self._masses, low)
+            end = bisect.bisect_right(self._masses, high, lo = start)
+            for i in range(start, end):
+                matches.append((
+                    self.peptides[i], charge,
+                    _error_ppm(self._masses[i], mz, charge)
+                ))
+        return matches
+
+    def query_batch(self, mzs, tolerance_ppm = 10.0, max_charge = 1):
+        '''
+        Return the matches for many observed m/z values at once, as a list
+        with the list of (peptide, charge, error_ppm) tuples of each m/z
+        value (see query). The binary searches and errors for all m/z values
+        and charge states are calculated with NumPy in one pass.
+        '''
+        mzs = np.asarray(mzs, dtype = np.float64)
+        charges = np.arange(1, max_charge + 1)
+        # Bounds for every m/z value (rows) and charge state (columns).
+        low, high = _mass_bounds(mzs[:, None], tolerance_ppm, charges)
+        starts = np.searchsorted(self.masses, low, side = "left").ravel()
+        counts = np.searchsorted(self.masses, high, side = "right").ravel() - starts
+        counts = np.maximum(counts, 0)
+
+        # One element per match: index of the peptide, charge and m/z value.
+        pairs = np.repeat(np.arange(len(counts)), counts)
+        first = np.cumsum(counts) - counts
+        peptide_indices = starts[pairs] + np.arange(len(pairs)) - first[pairs]
+        match_charges = charges[pairs % max_charge]
+        match_mzs = mzs[pairs // max_charge]
+        errors = _error_ppm(self.masses[peptide_indices], match_mzs, match_charges)
+        matches = list(zip(
+            map(self.peptides.__getitem__, peptide_indices.tolist()),
+            match_charges.tolist(), errors.tolist()
+        ))
+
+        # Split the matches per m/z value.
+        ends = np.cumsum(counts.reshape(len(mzs), max_charge).sum(axis = 1))
+        return [
+            matches[start:end]
+            for start, end in zip([0, *ends[:-1].tolist()], ends.tolist())
+        ]
+
+
+def mz_value(mass, charge):
+    '''Return the m/z value of a neutral mass with charge protons added.'''
+    return (mass + charge * constants.PROTON_MASS) / charge
+
+
+def _mass_bounds(mz, tolerance_ppm, charge):
+    '''
+    Return the lowest and highest neutral mass that match an observed m/z
+    value within the tolerance (ppm of the m/z value) at a charge state.
+    Works on numbers and on NumPy arrays.
+    '''
+    tolerance = mz * tolerance_ppm * 1e-6
+    return (
+        (mz - tolerance - constants.PROTON_MASS) * charge,
+        (mz + tolerance - constants.PROTON_MASS) * charge
+    )
+
+
+def _error_ppm(mass, mz, charge):
+    '''Return the error (ppm) of the m/z value of a mass, compared to mz.'''
+    return (mz_value(mass, charge) - mz) / mz * 1e6
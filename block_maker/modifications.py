@@ -0,0 +1,440 @@
+'''
+Registry of fixed modifications. A modification changes the elemental
+composition of every residue of one amino acid, or of the peptide once at
+its N- or C-terminus. The modifications selected for a run are compiled
+once into a composition table per residue, so the composition of a peptide
+is a single sum over its residue counts. Adding a modification only takes
+a new entry in the registry:
+
+    register(Modification(
+        "acetyl_n_term", "Acetylation (N-terminus)", "N-term",
+        {"carbons": 2, "hydrogens": 2, "oxygens": 1}
+    ))
+
+Modifications with an abbreviation can also be variable: then every
+number of modified sites is a separate state of the peptide, with its own
+block file (see variable_states).
+'''
+import hashlib
+from collections import defaultdict
+from functools import lru_cache
+from .cache import ELEMENTS
+from .resources import amino_acids
+from .resources import constants
+
+
+# Sites of terminal modifications, counted once per peptide.
+TERMINI = ("N-term", "C-term")
+
+# Cysteine treatment without a modification (GUI label).
+NO_CYSTEINE_TREATMENT = "None (reduced form)"
+
+# Position of each amino acid in the fixed order in which masses are added.
+_MASS_ORDER = {
+    amino_acid: i for i, amino_acid in enumerate(amino_acids.masses)
+}
+
+
+class Modification():
+    '''
+    A fixed modification: its name in the registry, the label shown in the
+    GUI, the site (a one-letter amino acid code or a terminus), the change
+    in composition (elements not given do not change) and the message for
+    the log file. The mass change follows from the composition, unless
+    mass_terms is given: mass changes that are added to the peptide mass
+    one by one (to reproduce a calculation based on group masses). The
+    abbreviation (letters only) is used in the block names of variable
+    modification states, e.g. "_OxOx" for two oxidized methionines.
+    '''
+    def __init__(self, name, label, site, composition, mass_terms = None,
+                 message = None, group = None, abbreviation = None):
+        if site not in amino_acids.compositions and site not in TERMINI:
+            raise ValueError(f"Unknown site '{site}' of modification '{name}'")
+        self.name = name
+        self.label = label
+        self.site = site
+        self.composition = tuple(
+            composition.get(element, 0) for element in ELEMENTS
+        )
+        if mass_terms is None:
+            mass_terms = (
+                amino_acids.calculate_amino_acid_residue_mass(
+                    dict(zip(ELEMENTS, self.composition))
+                ),
+            )
+        self.mass_terms = tuple(mass_terms)
+        self.message = message
+        # Modifications in the same group exclude each other (e.g. the
+        # cysteine treatments).
+        self.group = group
+        if abbreviation is not None and not abbreviation.isalpha():
+            raise ValueError(
+                f"Abbreviation '{abbreviation}' of modification '{name}' "
+                "must only contain letters"
+            )
+        self.abbreviation = abbreviation
+
+    def __repr__(self):
+        return f"Modification('{self.name}', site = '{self.site}')"
+
+    def labeled_deltas(self):
+        '''
+        Return the change in composition and the mass terms of the
+        modification on a C-13 and N-15 labeled residue. The carbons and
+        nitrogens it adds or removes are labeled too: they are not part of
+        the block file composition, and their mass is that of C-13 or N-15.
+        '''
+        composition = list(self.composition)
+        mass_terms = list(self.mass_terms)
+        for element, mass_diff in (
+            ("carbons", constants.C13_MASS_DIFF),
+            ("nitrogens", constants.N15_MASS_DIFF)
+        ):
+            i = ELEMENTS.index(element)
+            if composition[i] != 0:
+                mass_terms.append(mass_diff * composition[i])
+                composition[i] = 0
+        return tuple(composition), tuple(mass_terms)
+
+
+# Registered modifications by name, in order of registration.
+REGISTRY = {}
+
+
+def register(modification):
+    '''Add a modification to the registry and return it.'''
+    if modification.name in REGISTRY:
+        raise ValueError(f"Modification '{modification.name}' already exists")
+    REGISTRY[modification.name] = modification
+    compile_modifications.cache_clear()
+    _compile_settings.cache_clear()
+    return modification
+
+
+def registry_hash():
+    '''
+    Return a hash of the registered modifications and the amino acid
+    tables, which changes whenever a calculated composition or mass could.
+    '''
+    definition = repr((
+        [
+            (
+                modification.name, modification.label, modification.site,
+                modification.composition, modification.mass_terms
+            )
+            for modification in REGISTRY.values()
+        ],
+        sorted(amino_acids.compositions.items()),
+        sorted(amino_acids.masses.items())
+    ))
+    return hashlib.sha256(definition.encode()).hexdigest()
+
+
+def group(name):
+    '''Return the registered modifications of a group, in order.'''
+    return [
+        modification for modification in REGISTRY.values()
+        if modification.group == name
+    ]
+
+
+def cysteine_treatments():
+    '''Return the GUI labels of the cysteine treatments, no treatment first.'''
+    return [NO_CYSTEINE_TREATMENT] + [
+        modification.label for modification in group("cysteine")
+    ]
+
+
+def label_name(amino_acid):
+    '''Return the registry name of C-13 and N-15 labeling of an amino acid.'''
+    return f"label_{amino_acid}"
+
+
+def selected_modifications(cysteine_treatment, methionine_oxidation,
+                           isotope_labeling):
+    '''
+    Return the names of the registered modifications selected by the
+    settings of a run (GUI labels and one-letter codes), in the order in
+    which they are applied.
+    '''
+    names = [
+        modification.name for modification in group("cysteine")
+        if modification.label == cysteine_treatment
+    ]
+    if methionine_oxidation:
+        names.append("oxidation")
+    names.extend(label_name(amino_acid) for amino_acid in isotope_labeling)
+    return tuple(names)
+
+
+def variable_modifications():
+    '''Return the names of the modifications that can be variable.'''
+    return [
+        modification.name for modification in REGISTRY.values()
+        if modification.abbreviation is not None
+    ]
+
+
+def variable_states(residue_counts, names, max_states = 64,
+                    max_modifications = None):
+    '''
+    Return the states of the variable modifications in names for a peptide
+    with residue counts, as tuples of (name, count) for the modifications
+    with a count above zero. States are enumerated by counts, not by
+    positions: every combination of counts is one state, since all states
+    with the same counts have the same composition. Modifications of the
+    same site share its residues. States are ordered by the total number
+    of modifications, so the unmodified state () comes first, and at most
+    max_states states with at most max_modifications modifications in
+    total are returned.
+    '''
+    chosen = [REGISTRY[name] for name in names]
+    # Number of residues (or termini) per site.
+    capacity = {}
+    for modification in chosen:
+        if modification.site in TERMINI:
+            capacity[modification.site] = 1
+        else:
+            capacity[modification.site] = residue_counts.get(modification.site, 0)
+    chosen = [
+        modification for modification in chosen
+        if capacity[modification.site] > 0
+    ]
+    most = sum(
+        capacity[site] for site in set(modification.site for modification in chosen)
+    )
+    if max_modifications is not None:
+        most = min(most, max_modifications)
+    states = []
+    for total in range(most + 1):
+        for counts in _distribute(chosen, capacity, total):
+            states.append(tuple(
+                (modification.name, count)
+                for modification, count in zip(chosen, counts) if count > 0
+            ))
+            if len(states) >= max_states:
+                return states
+    return states
+
+
+def state_suffix(state):
+    '''
+    Return the block name suffix of a variable modification state: the
+    abbreviation once per modified site, e.g. "_OxOx". Empty for ().
+    '''
+    if len(state) == 0:
+        return ""
+    return "_" + "".join(
+        REGISTRY[name].abbreviation * count for name, count in state
+    )
+
+
+def _distribute(chosen, capacity, total):
+    '''
+    Yield the tuples of counts for the modifications in chosen that add up
+    to total, without using more residues of a site than its capacity.
+    Higher counts of the first modifications come first.
+    '''
+    if len(chosen) == 0:
+        if total == 0:
+            yield ()
+        return
+    modification, rest = chosen[0], chosen[1:]
+    site = modification.site
+    for count in range(min(total, capacity[site]), -1, -1):
+        capacity[site] -= count
+        for counts in _distribute(rest, capacity, total - count):
+            yield (count, *counts)
+        capacity[site] += count
+
+
+def compile_settings(cysteine_treatment, methionine_oxidation,
+                     isotope_labeling):
+    '''Return the CompiledModifications for the settings of a run.'''
+    return _compile_settings(
+        cysteine_treatment, bool(methionine_oxidation), tuple(isotope_labeling)
+    )
+
+
+@lru_cache(maxsize = 256)
+def _compile_settings(cysteine_treatment, methionine_oxidation,
+                      isotope_labeling):
+    '''Cached compile_settings, for hashable settings.'''
+    return compile_modifications(selected_modifications(
+        cysteine_treatment, methionine_oxidation, isotope_labeling
+    ))
+
+
+@lru_cache(maxsize = 256)
+def compile_modifications(names):
+    '''
+    Return the CompiledModifications for a tuple of registry names.
+    Cached: compiled once per set of modifications.
+    '''
+    return CompiledModifications([REGISTRY[name] for name in names])
+
+
+class CompiledModifications():
+    '''
+    Modifications compiled for calculations: the composition per residue
+    including modifications, the composition added once per peptide (water
+    and terminal modifications), and the mass changes per site, in order.
+    '''
+    def __init__(self, modifications):
+        self.modifications = tuple(modifications)
+        # Change in composition per residue.
+        self.residue_deltas = {
+            amino_acid: [0] * len(ELEMENTS)
+            for amino_acid in amino_acids.compositions
+        }
+        # Water molecule (H2O) and terminal modifications.
+        terminal = [0, 2, 0, 1, 0]
+        for modification in self.modifications:
+            if modification.site in TERMINI:
+                delta = terminal
+            else:
+                delta = self.residue_deltas[modification.site]
+            for i, change in enumerate(modification.composition):
+                delta[i] += change
+        self.terminal = tuple(terminal)
+        self.residue_deltas = {
+            amino_acid: tuple(delta)
+            for amino_acid, delta in self.residue_deltas.items()
+        }
+        # Composition per residue, including modifications.
+        self.residue_compositions = {
+            amino_acid: tuple(
+                composition[element] + change
+                for element, change in zip(ELEMENTS, self.residue_deltas[amino_acid])
+            )
+            for amino_acid, composition in amino_acids.compositions.items()
+        }
+        # (amino acid or None for a terminus, mass change), in order.
+        self.mass_terms = tuple(
+            (None if modification.site in TERMINI else modification.site, term)
+            for modification in self.modifications
+            for term in modification.mass_terms
+        )
+
+    def composition(self, residue_counts):
+        '''
+        Return the composition for residue counts (dictionary with the
+        count per one-letter code), as a dictionary with the number of
+        atoms per element.
+        '''
+        carbons, hydrogens, nitrogens, oxygens, sulfurs = self.terminal
+        residue_compositions = self.residue_compositions
+        # One variable per element: faster than indexing a list, which
+        # matters for short sequences.
+        for amino_acid, count in residue_counts.items():
+            c, h, n, o, s = residue_compositions[amino_acid]
+            carbons += c * count
+            hydrogens += h * count
+            nitrogens += n * count
+            oxygens += o * count
+            sulfurs += s * count
+        return {
+            "carbons": carbons,
+            "hydrogens": hydrogens,
+            "nitrogens": nitrogens,
+            "oxygens": oxygens,
+            "sulfurs": sulfurs
+        }
+
+    def mass(self, residue_counts):
+        '''
+        Return the monoisotopic mass for residue counts, rounded to nine
+        decimals. Residue masses are added in a fixed order, followed by
+        water and the mass changes in order, so the result does not depend
+        on the order of the residues in the sequence.
+        '''
+        mass = 0
+        masses = amino_acids.masses
+        # Only the residues in the sequence, sorted: few for short sequences.
+        for amino_acid in sorted(residue_counts, key = _MASS_ORDER.__getitem__):
+            count = residue_counts[amino_acid]
+            if count > 0:
+                mass += masses[amino_acid] * count
+        mass += constants.WATER_MASS
+        for amino_acid, term in self.mass_terms:
+            count = 1 if amino_acid is None else residue_counts.get(amino_acid, 0)
+            if count > 0:
+                mass += term * count
+        return round(mass, 9)
+
+    def residue_masses(self):
+        '''
+        Return a dictionary with residue masses including modifications
+        (terminal modifications excluded). Residues that do not correspond
+        to any amino acid get a mass of 0.
+        '''
+        masses = defaultdict(float, amino_acids.masses)
+        for amino_acid, term in self.mass_terms:
+            if amino_acid is not None:
+                masses[amino_acid] += term
+        return masses
+
+
+# Cysteine treatments: replace H in the -SH group by another group.
+register(Modification(
+    "carbamidomethyl", "Iodo- or chloroacetamide", "C",
+    {"carbons": 2, "hydrogens": 3, "nitrogens": 1, "oxygens": 1},
+    mass_terms = (constants.ACETAMIDE_GROUP_MASS - constants.HYDROGEN_MASS,),
+    message = "Cysteines treated with iodo- or chloroacetamide.",
+    group = "cysteine"
+))
+register(Modification(
+    "carboxymethyl", "Iodo- or chloroacetic acid", "C",
+    {"carbons": 2, "hydrogens": 2, "oxygens": 2},
+    mass_terms = (constants.ACETIC_ACID_GROUP_MASS - constants.HYDROGEN_MASS,),
+    message = "Cysteines treated with iodo- or chloroacetic acid.",
+    group = "cysteine"
+))
+
+# One oxygen atom per methionine residue.
+register(Modification(
+    "oxidation", "Methionine oxidation", "M", {"oxygens": 1},
+    mass_terms = (constants.OXYGEN_MASS,),
+    message = "Methionines oxidized.",
+    group = "methionine",
+    abbreviation = "Ox"
+))
+
+# Deamidation of asparagine and glutamine: -NH2 replaced by -OH.
+register(Modification(
+    "deamidation_n", "Asparagine deamidation", "N",
+    {"hydrogens": -1, "nitrogens": -1, "oxygens": 1},
+    abbreviation = "DeN"
+))
+register(Modification(
+    "deamidation_q", "Glutamine deamidation", "Q",
+    {"hydrogens": -1, "nitrogens": -1, "oxygens": 1},
+    abbreviation = "DeQ"
+))
+
+# C-13 and N-15 labeled amino acids. Their carbons and nitrogens are always
+# C-13 and N-15, so they are removed from the composition of the block file
+# and only add to the mass.
+for _amino_acid, _composition in amino_acids.compositions.items():
+    register(Modification(
+        label_name(_amino_acid), _amino_acid, _amino_acid,
+        {
+            "carbons": -_composition["carbons"],
+            "nitrogens": -_composition["nitrogens"]
+        },
+        mass_terms = (
+            constants.C13_MASS_DIFF * _composition["carbons"],
+            constants.N15_MASS_DIFF * _composition["nitrogens"]
+        ),
+        group = "labeling"
+    ))
+
+# Terminal modifications, not selected by the GUI.
+register(Modification(
+    "acetyl_n_term", "Acetylation (N-terminus)", "N-term",
+    {"carbons": 2, "hydrogens": 2, "oxygens": 1}
+))
+register(Modification(
+    "amidation_c_term", "Amidation (C-terminus)", "C-term",
+    {"hydrogens": 1, "nitrogens": 1, "oxygens": -1}
+))
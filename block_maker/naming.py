@@ -0,0 +1,50 @@
+import string
+
+
+def block_name_suffix(number):
+    '''
+    Return the letter suffix for the n-th duplicate of a block name:
+    1 -> "b", 2 -> "c", ..., 25 -> "z", 26 -> "ba", 27 -> "bb", etc.
+    The suffix is the number written in base 26 with the digits "a" to "z",
+    so every number gets a unique suffix that contains only letters.
+    '''
+    letters = string.ascii_lowercase
+    suffix = ""
+    while number > 0:
+        number, digit = divmod(number, 26)
+        suffix = letters[digit] + suffix
+    return suffix
+
+
+class BlockNameAllocator():
+    '''
+    Generate unique block names from the first four letters of a sequence.
+    If already present, add "_b", "_c", ..., "_z", "_ba", "_bb" etc as suffix.
+    The next suffix to try is remembered per prefix, so generating many
+    names with the same prefix does not test all previous suffixes again.
+    '''
+    def __init__(self, used_names):
+        # Container with the block names in use (e.g. a set or Counter).
+        # It is not changed here; the caller adds the allocated names.
+        self.used_names = used_names
+        self._next_suffix = {}
+
+    def allocate(self, sequence):
+        '''Return a block name for the sequence that is not yet in use.'''
+        return self.allocate_name(sequence[0:4])
+
+    def allocate_name(self, prefix):
+        '''Return the prefix, or the prefix with a suffix if it is in use.'''
+        if prefix not in self.used_names:
+            return prefix
+        number = self._next_suffix.get(prefix, 1)
+        block_name = prefix + "_" + block_name_suffix(number)
+        while block_name in self.used_names:
+            number += 1
+            block_name = prefix + "_" + block_name_suffix(number)
+        self._next_suffix[prefix] = number + 1
+        return block_name
+
+    def reset(self):
+        '''Forget the suffixes used so far, e.g. after clearing all names.'''
+        self._next_suffix.clear()
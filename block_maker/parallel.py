@@ -0,0 +1,269 @@
+import math
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain, islice
+from . import generation
+from . import instrumentation
+from . import sequence_io
+from .cache import CompositionCache
+from .manifest import Manifest, content_hash
+from .peptide import Peptide
+from .writer import BlockWriter, write_block_file
+
+
+# Below this number of sequences, starting worker processes costs more
+# time than it saves and the blocks are generated in the current process.
+PARALLEL_THRESHOLD = 2000
+
+# Maximum number of sequences sent to a worker at once.
+MAX_CHUNK_SIZE = 5000
+
+
+def generate_blocks(entries, cysteine_treatment, methionine_oxidation,
+                    isotope_labeling, output_dir, workers = None,
+                    use_threads = False, progress = None, cancelled = None,
+                    cache = None, variable = None, **writer_options):
+    '''
+    Generate block files for (block_name, sequence) tuples, split over a
+    pool of worker processes (or threads, all CPU cores if workers is None).
+    The log messages are logged in the order of the entries. Optionally,
+    progress(done, total) is called as entries are processed, and the run
+    stops when cancelled() returns True. Cache is a CompositionCache,
+    variable a generation.VariableModifications; other keyword arguments
+    are options of the BlockWriter, which is returned. Worker processes
+    are spawned, so scripts need an if __name__ == "__main__" guard.
+    '''
+    if variable is None:
+        variable = generation.VariableModifications()
+    if len(variable.names) > 0:
+        # All entries are read first, so that no state gets the block name
+        # of a later entry.
+        entries = list(entries)
+        variable.reserve(block_name for block_name, _ in entries)
+    total = len(entries) if hasattr(entries, "__len__") else None
+    entries = iter(entries)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    settings = (cysteine_treatment, methionine_oxidation, isotope_labeling)
+    # Look at the first entries to decide whether a pool is worth it.
+    head = list(islice(entries, PARALLEL_THRESHOLD))
+    entries = chain(head, entries)
+
+    with BlockWriter(output_dir, **writer_options) as writer:
+        if workers <= 1 or len(head) < PARALLEL_THRESHOLD:
+            # Small run: no worker pool needed.
+            # Report progress about every percent.
+            step = max(1, total // 100) if total is not None else 1000
+            for i, (block_name, sequence) in enumerate(entries, start = 1):
+                if cancelled is not None and cancelled():
+                    # Not all entries are known: nothing is pruned, and
+                    # staged block files are discarded.
+                    writer.prune = False
+                    writer.commit = False
+                    break
+                peptide = Peptide(block_name, sequence, *settings, cache = cache)
+                for state in variable.peptides(peptide):
+                    writer.add(state)
+                if progress is not None and (i % step == 0 or i == total):
+                    progress(i, total)
+            return writer
+
+        # A few chunks per worker, to balance the load.
+        if total is None:
+            chunk_size = MAX_CHUNK_SIZE
+        else:
+            chunk_size = min(MAX_CHUNK_SIZE, math.ceil(total / (4 * workers)))
+        # Worker processes send their timers and counters back, if enabled.
+        report = instrumentation.enabled() and not use_threads
+        if use_threads:
+            pool = ThreadPoolExecutor(max_workers = workers)
+        else:
+            # Spawned, not forked: forking while the log listener (or Qt)
+            # has threads running can deadlock the workers.
+            pool = ProcessPoolExecutor(
+                max_workers = workers,
+                mp_context = multiprocessing.get_context("spawn")
+            )
+        job = _Job(settings, writer, report)
+        with pool:
+            # Futures and sizes of the chunks, collected in order.
+            futures = deque()
+            # Number of entries in the collected chunks.
+            done = 0
+            for chunk in sequence_io.chunks(entries, chunk_size):
+                if cancelled is not None and cancelled():
+                    break
+                # Send the named states, the cached results and the hashes
+                # of the existing block files along with the chunk.
+                states = [variable.states(*entry) for entry in chunk]
+                cached = None
+                if cache is not None:
+                    cached = _cached_items(chunk, settings, cache)
+                known_hashes = None
+                if writer.incremental:
+                    known_hashes = writer.known_hashes(
+                        block_name for block_name, _ in chain.from_iterable(states)
+                    )
+                futures.append((pool.submit(
+                    _generate_chunk, chunk, job, states, cached, known_hashes
+                ), len(chunk)))
+                # Limit the number of chunks in memory.
+                while len(futures) >= 2 * workers:
+                    future, size = futures.popleft()
+                    _collect(future, writer, cache)
+                    done += size
+                    if progress is not None:
+                        progress(done, total)
+            stopped = False
+            while futures:
+                # Also check while the last chunks are collected.
+                if not stopped and cancelled is not None and cancelled():
+                    _stop(writer, futures)
+                    stopped = True
+                future, size = futures.popleft()
+                if not future.cancelled():
+                    _collect(future, writer, cache)
+                    done += size
+                    if progress is not None:
+                        progress(done, total)
+    return writer
+
+
+class _Job():
+    '''
+    The settings of a run that every chunk is generated with, taken from
+    its BlockWriter. Workers return the contents for an archive (collect),
+    which is written by the BlockWriter, and with report their timers and
+    counters (see instrumentation.take).
+    '''
+    def __init__(self, settings, writer, report = False):
+        self.settings = settings
+        self.output_dir = writer.location
+        self.write_dir = writer.write_dir
+        self.fsync = writer.fsync
+        self.atomic = writer.atomic
+        self.collect = writer.archive is not None
+        self.block_records = writer.block_records
+        self.report = report
+
+
+def _stop(writer, futures):
+    '''
+    Stop a cancelled run: nothing is pruned or committed, and the chunks
+    that did not start yet are cancelled. Chunks that already started are
+    still completed.
+    '''
+    writer.prune = False
+    writer.commit = False
+    for future, _ in futures:
+        future.cancel()
+
+
+def _cached_items(chunk, settings, cache):
+    '''Return the (key, composition, mass) cache items for a chunk.'''
+    items = []
+    for _, sequence in chunk:
+        key = cache.key(sequence, *settings)
+        cached = cache.get(key)
+        if cached is not None:
+            items.append((key, *cached))
+    return items
+
+
+def _batch_items(chunk, settings, cached):
+    '''
+    Return the cache items of the sequences in a chunk that are not in the
+    cached items, calculated at once (see the vectorized module). Empty if
+    a sequence contains invalid characters: Peptide handles those.
+    '''
+    # NumPy is only imported by the workers.
+    from . import vectorized
+    cached_keys = set(item[0] for item in cached)
+    sequences = [
+        sequence for _, sequence in chunk
+        if CompositionCache.key(sequence, *settings) not in cached_keys
+    ]
+    if len(sequences) == 0:
+        return []
+    try:
+        return vectorized.cache_items(sequences, *settings)
+    except ValueError:
+        return []
+
+
+def _collect(future, writer, cache = None):
+    '''
+    Log the result of a finished chunk and store its compositions and 
+    masses in the cache.
+    '''
+    (files_written, files_skipped, blocks, computed, hashes, 
+     contents, stats) = future.result()
+    writer.add_written(files_written, blocks, files_skipped, hashes, contents)
+    if stats is not None:
+        instrumentation.merge(stats)
+    if cache is not None:
+        cache.update(computed)
+
+
+def _generate_chunk(chunk, job, states, cached = None, known_hashes = None):
+    '''
+    Worker function: create the block files for a chunk of entries in
+    their states (see VariableModifications.states), see _Job.
+    Compositions and masses that are not in the cached items are
+    calculated for the whole chunk at once. With known_hashes (incremental
+    mode), up-to-date block files are skipped, see Manifest.is_current.
+    Return the counts, log messages, new cache items, hashes, contents
+    and timers of the chunk.
+    '''
+    blocks = []
+    hashes = []
+    contents = []
+    files_written = 0
+    # Local cache, large enough for all sequences in the chunk.
+    cache = CompositionCache(max_size = len(chunk) + len(cached or ()))
+    cache.update(cached or ())
+    cache.update(_batch_items(chunk, job.settings, cached or ()))
+    files_skipped = 0
+    output_dir = job.output_dir
+    manifest = None
+    if known_hashes is not None:
+        manifest = Manifest(output_dir, hashes = known_hashes)
+    for (block_name, sequence), entry_states in zip(chunk, states):
+        base = Peptide(block_name, sequence, *job.settings, cache = cache)
+        for peptide in generation.state_peptides(base, entry_states):
+            block_name = peptide.block_name
+            content = peptide.block_file_content()
+            if manifest is not None:
+                file_hash = content_hash(content)
+                hashes.append((block_name, file_hash))
+                if manifest.is_current(block_name, file_hash):
+                    blocks.append((
+                        [generation.skipped_log_message(block_name, output_dir)],
+                        generation.block_record(peptide, output_dir, "skipped")
+                        if job.block_records else None
+                    ))
+                    files_skipped += 1
+                    continue
+            if job.collect:
+                contents.append((block_name, content))
+            else:
+                write_block_file(
+                    job.write_dir, block_name, content, job.fsync, job.atomic
+                )
+            blocks.append((
+                generation.block_log_messages(peptide, output_dir),
+                generation.block_record(peptide, output_dir, "written")
+                if job.block_records else None
+            ))
+            files_written += 1
+    computed = []
+    if cached is not None:
+        # Only return results that were not cached yet.
+        cached_keys = set(item[0] for item in cached)
+        computed = [item for item in cache.items() if item[0] not in cached_keys]
+    return (
+        files_written, files_skipped, blocks, computed, hashes, contents,
+        instrumentation.take() if job.report else None
+    )
@@ -1,146 +1,106 @@
+import copy
 import os
+from collections import Counter
+from . import modifications
 from . import utils
-from .resources import amino_acids
-from .resources import constants
+from .cache import ELEMENTS
+from .instrumentation import instrumented
 
 
 class Peptide():
+    @instrumented("composition")
     def __init__(self, block_name, sequence, cysteine_treatment, 
-                 methionine_oxidation, isotope_labeling):
+                 methionine_oxidation, isotope_labeling, cache = None):
         self.block_name = block_name
         self.sequence = sequence
         self.cysteine_treatment = cysteine_treatment
         self.methionine_oxidation = methionine_oxidation
         self.isotope_labeling = isotope_labeling
-        self.composition = self.get_composition()
-        self.mass = self.calculate_peptide_mass()
+        # Variable modification state: (name, count) tuples.
+        self.variable_modifications = ()
+        # Count each residue once; all calculations below use these counts.
+        self.residue_counts = Counter(sequence)
+        if cache is not None:
+            # Take composition and mass from the CompositionCache if present.
+            key = cache.key(
+                sequence, cysteine_treatment, methionine_oxidation, 
+                isotope_labeling
+            )
+            cached = cache.get(key)
+            if cached is not None:
+                self.composition, self.mass = cached
+                return
+        # Look up the compiled modifications once for both calculations:
+        # for short sequences, the lookup is a large part of the time.
+        compiled = self.compiled_modifications()
+        self.composition = compiled.composition(self.residue_counts)
+        self.mass = compiled.mass(self.residue_counts)
+        if cache is not None:
+            cache.put(key, self.composition, self.mass)
 
     def get_composition(self):
         '''
-        Determine elemental composition based on peptide sequence.
+        Determine elemental composition based on the residue counts.
         Include cysteine treatment, methionine oxidation and C-13/N-15 
-        labeling when applicable. Return a dictionary with number of carbon, 
-        hydrogen, nitrogen, oxygen and sulfur atoms.
+        labeling when applicable (see the modifications registry). Return a 
+        dictionary with number of carbon, hydrogen, nitrogen, oxygen and 
+        sulfur atoms.
         '''
-        # Initialize dictionary with elements.
-        peptide_composition = {
-            "carbons": 0,
-            "hydrogens": 0,
-            "nitrogens": 0,
-            "oxygens": 0,
-            "sulfurs": 0
-        }
-
-        # Loop over amino acids in the sequence.
-        for amino_acid in self.sequence:
-            # Get composition of this amino acid residue.
-            amino_acid_composition = amino_acids.compositions[amino_acid]
-            # Add up elements.
-            peptide_composition["carbons"] += amino_acid_composition["carbons"]
-            peptide_composition["hydrogens"] += amino_acid_composition["hydrogens"]
-            peptide_composition["nitrogens"] += amino_acid_composition["nitrogens"]
-            peptide_composition["oxygens"] += amino_acid_composition["oxygens"]
-            peptide_composition["sulfurs"] += amino_acid_composition["sulfurs"]
-
-        # Add water molecule (H2O).
-        peptide_composition["hydrogens"] += 2
-        peptide_composition["oxygens"] += 1
-        
-        # Check cysteine modifications.
-        if "C" in self.sequence:
-            if self.cysteine_treatment == "Iodo- or chloroacetamide":
-                # Replace H in -SH group by -CH2-CO-NH2 group, for each C.
-                peptide_composition["carbons"] += 2 * self.sequence.count("C")
-                peptide_composition["hydrogens"] += 3 * self.sequence.count("C") 
-                peptide_composition["nitrogens"] += self.sequence.count("C")
-                peptide_composition["oxygens"] += self.sequence.count("C")
-            elif self.cysteine_treatment == "Iodo- or chloroacetic acid":
-                # Replace H in -SH group by -CH2-CO-OH group, for each C.
-                peptide_composition["carbons"] += 2 * self.sequence.count("C")
-                peptide_composition["hydrogens"] += 2 * self.sequence.count("C")
-                peptide_composition["oxygens"] += 2 * self.sequence.count("C")
-
-        # Check methionine oxidation.
-        if "M" in self.sequence and self.methionine_oxidation:
-            # Add oxygen atom for each methionine residue.
-            peptide_composition["oxygens"] += self.sequence.count("M")
-
-        # Check list with isotope labeled amino acids.
-        if len(self.isotope_labeling) > 0:
-            # Loop over the labeled amino acids.
-            # C and N in these amino acids are always C-13 and N-15 (no variation).
-            # Must be removed from the composition written to the block file .
-            for aa in self.isotope_labeling:
-                peptide_composition["carbons"] -= (
-                    amino_acids.compositions[aa]["carbons"] 
-                    * self.sequence.count(aa)
-                )
-                peptide_composition["nitrogens"] -= (
-                    amino_acids.compositions[aa]["nitrogens"] 
-                    * self.sequence.count(aa)
-                ) 
-
-        return peptide_composition
+        # Composition per residue including modifications, compiled once
+        # per set of settings, plus a water molecule (H2O).
+        return self.compiled_modifications().composition(self.residue_counts)
         
     def calculate_peptide_mass(self):
         '''
-        Calculate the monoisotopic mass of the peptide based on its sequence.
-        Include cysteine treatment, methionine oxidation and C-13/N-15 labeling 
-        when applicable. Return the mass in amu rounded to five decimals.
+        Calculate the monoisotopic mass of the peptide based on the residue 
+        counts. Include cysteine treatment, methionine oxidation and C-13/N-15 
+        labeling when applicable. Return the mass in amu rounded to nine 
+        decimals.
         '''
-        # Initiate mass at 0.
-        peptide_mass = 0 
-
-        # Loop over the amino acids and add mass of each residue.
-        for amino_acid in self.sequence:
-            peptide_mass += amino_acids.masses[amino_acid]
-
-        # Add mass of H2O.
-        peptide_mass += constants.WATER_MASS
-
-        # Check cysteine modifications.
-        if "C" in self.sequence:
-            if self.cysteine_treatment == "Iodo- or chloroacetamide":
-                peptide_mass += (
-                    (constants.ACETAMIDE_GROUP_MASS - constants.HYDROGEN_MASS) 
-                    * self.sequence.count("C")
-                )
-            elif self.cysteine_treatment == "Iodo- or chloroacetic acid":
-                peptide_mass += (
-                    (constants.ACETIC_ACID_GROUP_MASS - constants.HYDROGEN_MASS) 
-                    * self.sequence.count("C")
-                )
-
-        # Check methionine oxidation.
-        if "M" in self.sequence and self.methionine_oxidation:
-            # Add oxygen mass for each methionine residue.
-            peptide_mass += constants.OXYGEN_MASS * self.sequence.count("M")
-
-        # Check list with isotope labeled amino acids.
-        if len(self.isotope_labeling) > 0:
-            # Loop over the labeled amino acids and increase mass.
-            for aa in self.isotope_labeling:
-                peptide_mass += (
-                    constants.C13_MASS_DIFF 
-                    * amino_acids.compositions[aa]["carbons"] 
-                    * self.sequence.count(aa)
-                )
-                peptide_mass += (
-                    constants.N15_MASS_DIFF 
-                    * amino_acids.compositions[aa]["nitrogens"] 
-                    * self.sequence.count(aa)
-                )
-        # Return mass rounded to nine decimals.
-        return round(peptide_mass, 9)
+        return self.compiled_modifications().mass(self.residue_counts)
 
-    def write_block_file(self, output_dir):
+    def compiled_modifications(self):
+        '''Return the compiled modifications for the settings of the peptide.'''
+        return modifications.compile_settings(
+            self.cysteine_treatment, self.methionine_oxidation,
+            self.isotope_labeling
+        )
+
+    def with_variable_modifications(self, state, block_name = None):
         '''
-        Create block file based on composition and mass of the peptide.
-        The output directory of the block file is printed for the user.
-        Information is written to the log file.
+        Return a copy of the peptide in a variable modification state, a
+        tuple of (name, count) (see modifications.variable_states). The
+        block name gets the suffix of the state unless a block name is
+        given, and the composition and mass change by count times each
+        modification (with labeled atoms on labeled residues).
         '''
-        # Write message to log file.
-        message = (
+        peptide = copy.copy(self)
+        if block_name is None:
+            block_name = self.block_name + modifications.state_suffix(state)
+        peptide.block_name = block_name
+        peptide.variable_modifications = tuple(state)
+        composition = dict(self.composition)
+        mass = self.mass
+        for name, count in state:
+            modification = modifications.REGISTRY[name]
+            if modification.site in self.isotope_labeling:
+                changes, terms = modification.labeled_deltas()
+            else:
+                changes, terms = modification.composition, modification.mass_terms
+            for element, change in zip(ELEMENTS, changes):
+                composition[element] += change * count
+            for term in terms:
+                mass += term * count
+        peptide.composition = composition
+        peptide.mass = round(mass, 9)
+        return peptide
+
+    def block_file_summary(self):
+        '''
+        Return the log message with the mass and composition that are
+        written to the block file.
+        '''
+        return (
             f"Writing sequence '{self.sequence}' info to block file " 
             f"'{self.block_name}.block':"
             f"\n\tMass = {self.mass:.5f}" 
@@ -150,28 +110,126 @@ class Peptide():
             f"\n\tOxygens = {self.composition['oxygens']}"
             f"\n\tSulfurs = {self.composition['sulfurs']}"
         )
-        utils.write_to_log(message)
-        
-        # Create list with lines that should be written.
+
+    def block_file_content(self):
+        '''Return the contents of the block file as a single string.'''
+        composition = self.composition
         # "\t" is used to separate named and numbers by a tab.
-        lines = [
-            "mass" + "\t" + f"{self.mass:.9f}",  
-            "available_for_charge_carrier" + "\t" + "0",
-            "carbons" + "\t" + str(self.composition["carbons"]),
-            "hydrogens" + "\t" + str(self.composition["hydrogens"]),
-            "nitrogens" + "\t" + str(self.composition["nitrogens"]),
-            "oxygens" + "\t" + str(self.composition["oxygens"]),
-            "sulfurs" + "\t" + str(self.composition["sulfurs"])
-        ]
-
-        # Write each line to the file in the specified output directory.
+        return (
+            f"mass\t{self.mass:.9f}\n"
+            "available_for_charge_carrier\t0\n"
+            f"carbons\t{composition['carbons']}\n"
+            f"hydrogens\t{composition['hydrogens']}\n"
+            f"nitrogens\t{composition['nitrogens']}\n"
+            f"oxygens\t{composition['oxygens']}\n"
+            f"sulfurs\t{composition['sulfurs']}\n"
+        )
+
+    @instrumented("block files")
+    def write_block_file(self, output_dir):
+        '''
+        Create block file based on composition and mass of the peptide.
+        The output directory of the block file is printed for the user.
+        Information is written to the log file.
+        '''
+        # Write message to log file.
+        utils.write_to_log(self.block_file_summary())
+
+        # Write the file in the specified output directory.
+        # Written atomically: never a truncated block file.
         filename = os.path.join(output_dir, self.block_name + ".block")
-        with open(filename, "w") as file:
-            for line in lines:
-                file.write(line + "\n")
+        utils.write_file(filename, self.block_file_content())
                 
         # Print location of the created block file.
         utils.write_to_log(
             f"'{self.block_name}.block' created in '{output_dir}'"
         )
         print(f"\n'{self.block_name}.block' created in '{output_dir}'")
+
+
+class CompactPeptide():
+    '''
+    Memory efficient variant of Peptide for very large numbers of peptides.
+    Uses __slots__ and stores the composition as five integers, which are
+    only calculated on first access of the composition or mass.
+    Offers the same interface as Peptide; the residue counts are counted
+    on first use as well.
+    '''
+    __slots__ = (
+        "block_name", "sequence", "cysteine_treatment", "methionine_oxidation",
+        "isotope_labeling", "_residue_counts", "_carbons", "_hydrogens",
+        "_nitrogens", "_oxygens", "_sulfurs", "_mass"
+    )
+
+    # No variable modifications.
+    variable_modifications = ()
+
+    # Share the calculations with Peptide.
+    get_composition = Peptide.get_composition
+    calculate_peptide_mass = Peptide.calculate_peptide_mass
+    compiled_modifications = Peptide.compiled_modifications
+    block_file_summary = Peptide.block_file_summary
+    block_file_content = Peptide.block_file_content
+
+    def __init__(self, block_name, sequence, cysteine_treatment, 
+                 methionine_oxidation, isotope_labeling):
+        self.block_name = block_name
+        self.sequence = sequence
+        self.cysteine_treatment = cysteine_treatment
+        self.methionine_oxidation = methionine_oxidation
+        # Not copied, so peptides with the same settings share one list.
+        self.isotope_labeling = isotope_labeling
+        self._residue_counts = None
+        self._mass = None
+
+    @instrumented("composition")
+    def _calculate(self):
+        '''Calculate composition and mass, based on a single residue count.'''
+        residue_counts = self.residue_counts
+        compiled = self.compiled_modifications()
+        composition = compiled.composition(residue_counts)
+        self._mass = compiled.mass(residue_counts)
+        self._carbons = composition["carbons"]
+        self._hydrogens = composition["hydrogens"]
+        self._nitrogens = composition["nitrogens"]
+        self._oxygens = composition["oxygens"]
+        self._sulfurs = composition["sulfurs"]
+
+    @property
+    def residue_counts(self):
+        '''Number of residues per one-letter code (counted on first use).'''
+        if self._residue_counts is None:
+            self._residue_counts = Counter(self.sequence)
+        return self._residue_counts
+
+    def write_block_file(self, output_dir):
+        '''Create the block file, see Peptide.write_block_file.'''
+        # Looked up on every call, so it is timed when instrumented.
+        return Peptide.write_block_file(self, output_dir)
+
+    def with_variable_modifications(self, state, block_name = None):
+        '''Return a Peptide in a variable modification state (see Peptide).'''
+        return Peptide(
+            self.block_name, self.sequence, self.cysteine_treatment,
+            self.methionine_oxidation, self.isotope_labeling
+        ).with_variable_modifications(state, block_name)
+
+    @property
+    def composition(self):
+        '''Dictionary with number of C, H, N, O and S atoms.'''
+        if self._mass is None:
+            self._calculate()
+        return {
+            "carbons": self._carbons,
+            "hydrogens": self._hydrogens,
+            "nitrogens": self._nitrogens,
+            "oxygens": self._oxygens,
+            "sulfurs": self._sulfurs
+        }
+
+    @property
+    def mass(self):
+        '''Monoisotopic mass in amu, rounded to nine decimals.'''
+        if self._mass is None:
+            self._calculate()
+        return self._mass
@@ -7,6 +7,10 @@ OXYGEN_MASS = 15.994914620
 NITROGEN_MASS = 14.003074004
 SULFUR_MASS = 31.972071174
 
+# Proton (charge carrier of protonated peptides), rounded to 9 decimal places.
+# Taken from: https://physics.nist.gov/cgi-bin/cuu/Value?mpu
+PROTON_MASS = 1.007276467
+
 
 # Mass differences for some heavier stable isotopes (compared to monoisotopic mass).
 C13_MASS_DIFF = 13.003354835 - CARBON_MASS 
@@ -0,0 +1,101 @@
+'''
+Streaming import of peptide sequences. Every stage is a generator, so
+files of any size are processed with a bounded amount of memory:
+
+    read_entries -> valid_entries -> unique_entries -> parallel.generate_blocks
+
+Only the sets used to skip duplicate sequences and block names grow,
+with the number of unique entries.
+'''
+from itertools import islice
+from . import utils
+from .naming import BlockNameAllocator
+from .sequence_store import is_valid_block_name
+
+
+def read_entries(file):
+    '''
+    Read block names and sequences from an open text file, line by line.
+    Lines contain a sequence, or a block name and a sequence separated by
+    whitespace. Sequences are capitalized. Yield (block_name, sequence)
+    tuples, where block_name is None when it should be generated.
+    '''
+    for line in file:
+        fields = line.split()
+        # Skip empty lines.
+        if len(fields) == 0:
+            continue
+        elif len(fields) == 1:
+            yield None, fields[0].upper()
+        else:
+            yield fields[0], fields[1].upper()
+
+
+def read_sequence_chunks(file, chunk_size = 10000):
+    '''
+    Read sequences from an open text file with one sequence per line.
+    Leading and trailing spaces are removed, letters are capitalized and
+    empty lines are skipped. Yield lists of at most chunk_size sequences.
+    '''
+    sequences = (line.strip().upper() for line in file)
+    return chunks((sequence for sequence in sequences if sequence != ""), chunk_size)
+
+
+def chunks(iterable, chunk_size):
+    '''Yield lists with at most chunk_size consecutive items.'''
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def valid_entries(entries, on_invalid = None):
+    '''
+    Yield the (block_name, sequence) entries with a valid sequence.
+    For invalid entries, on_invalid(entry, message) is called with a
+    warning message that describes the invalid characters.
+    '''
+    for entry in entries:
+        if utils.is_valid_sequence(entry[1]):
+            yield entry
+        elif on_invalid is not None:
+            invalid = utils.check_sequence_validity(entry[1])
+            on_invalid(
+                entry, utils.generate_invalid_sequence_warning(invalid, entry[1])
+            )
+
+
+def unique_entries(entries, on_skipped = None):
+    '''
+    Yield (block_name, sequence) entries with unique sequences and block
+    names. Missing block names are generated. Entries with a duplicate
+    sequence are skipped silently; entries with an invalid or duplicate
+    block name are skipped and reported with on_skipped(entry, message).
+    '''
+    sequences = set()
+    block_names = set()
+    allocator = BlockNameAllocator(block_names)
+    for block_name, sequence in entries:
+        if sequence in sequences:
+            continue
+        if block_name is None:
+            block_name = allocator.allocate(sequence)
+        elif not is_valid_block_name(block_name):
+            if on_skipped is not None:
+                on_skipped(
+                    (block_name, sequence),
+                    f"\nInvalid block name '{block_name}' skipped."
+                )
+            continue
+        elif block_name in block_names:
+            if on_skipped is not None:
+                on_skipped(
+                    (block_name, sequence),
+                    f"\nDuplicate block name '{block_name}' skipped."
+                )
+            continue
+        sequences.add(sequence)
+        block_names.add(block_name)
+        yield block_name, sequence
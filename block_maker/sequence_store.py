@@ -0,0 +1,175 @@
+from collections import Counter
+from . import utils
+from .naming import BlockNameAllocator
+
+
+# Columns of the sequence table.
+BLOCK_NAME = 0
+SEQUENCE = 1
+
+
+def is_valid_block_name(block_name):
+    '''Block names may only contain letters and underscores.'''
+    return block_name != "" and all(
+        char.isalpha() or char == "_" for char in block_name
+    )
+
+
+class SequenceStore():
+    '''
+    Compact storage of the block names and sequences in the sequence table,
+    with their validity. Rows are stored in plain lists, validity flags in
+    bytearrays. The number of occurrences of every block name and sequence
+    is indexed, for fast duplicate checks and block name generation.
+    '''
+    def __init__(self):
+        self.block_names = []
+        self.sequences = []
+        self.block_name_valid = bytearray()
+        self.sequence_valid = bytearray()
+        self.index = {BLOCK_NAME: Counter(), SEQUENCE: Counter()}
+        self.allocator = BlockNameAllocator(self.index[BLOCK_NAME])
+
+    def __len__(self):
+        return len(self.sequences)
+
+    def contains_sequence(self, sequence):
+        '''Return True if the sequence is already present.'''
+        return sequence in self.index[SEQUENCE]
+
+    def append(self, sequence):
+        '''
+        Add a sequence with an automatically generated block name.
+        The sequence is marked invalid if it contains characters that
+        do not correspond to any amino acid. Return the block name.
+        '''
+        block_name = self.allocator.allocate(sequence)
+        self.block_names.append(block_name)
+        self.sequences.append(sequence)
+        self.block_name_valid.append(True)
+        self.sequence_valid.append(utils.is_valid_sequence(sequence))
+        self.index[BLOCK_NAME][block_name] += 1
+        self.index[SEQUENCE][sequence] += 1
+        return block_name
+
+    def extend(self, sequences):
+        '''
+        Add many sequences with automatically generated block names.
+        The validity of all sequences is checked at once.
+        '''
+        sequences = list(sequences)
+        for sequence in sequences:
+            block_name = self.allocator.allocate(sequence)
+            self.block_names.append(block_name)
+            self.sequences.append(sequence)
+            self.index[BLOCK_NAME][block_name] += 1
+            self.index[SEQUENCE][sequence] += 1
+        self.block_name_valid.extend(b"\x01" * len(sequences))
+        self.sequence_valid.extend(utils.are_valid_sequences(sequences))
+
+    def value(self, row, column):
+        '''Return the block name or sequence of a row.'''
+        if column == BLOCK_NAME:
+            return self.block_names[row]
+        return self.sequences[row]
+
+    def is_valid(self, row, column):
+        '''Return True if the block name or sequence of a row is valid.'''
+        if column == BLOCK_NAME:
+            return bool(self.block_name_valid[row])
+        return bool(self.sequence_valid[row])
+
+    def set_value(self, row, column, text):
+        '''
+        Change the block name or sequence of a row. Leading and trailing
+        spaces are removed and sequences are capitalized. The validity is
+        checked and stored. Return the new (normalized) value.
+        '''
+        if column == BLOCK_NAME:
+            value = text.strip()
+            old = self.block_names[row]
+            self.block_names[row] = value
+            self.block_name_valid[row] = is_valid_block_name(value)
+        else:
+            value = text.strip().upper()
+            old = self.sequences[row]
+            self.sequences[row] = value
+            self.sequence_valid[row] = (
+                value != "" and utils.is_valid_sequence(value)
+            )
+        self._remove_from_index(column, old)
+        self.index[column][value] += 1
+        return value
+
+    def remove_rows(self, rows):
+        '''Remove a collection of row numbers.'''
+        rows = set(rows)
+        for row in rows:
+            self._remove_from_index(BLOCK_NAME, self.block_names[row])
+            self._remove_from_index(SEQUENCE, self.sequences[row])
+        keep = [row for row in range(len(self)) if row not in rows]
+        self._reorder(keep)
+
+    def clear(self):
+        '''Remove all rows.'''
+        self.block_names = []
+        self.sequences = []
+        self.block_name_valid = bytearray()
+        self.sequence_valid = bytearray()
+        self.index[BLOCK_NAME].clear()
+        self.index[SEQUENCE].clear()
+        self.allocator.reset()
+
+    def sort(self, column, descending = False):
+        '''Sort the rows by block name or sequence.'''
+        values = self.block_names if column == BLOCK_NAME else self.sequences
+        order = sorted(
+            range(len(self)), key = values.__getitem__, reverse = descending
+        )
+        self._reorder(order)
+
+    def find(self, text, start = 0):
+        '''
+        Return the rows (from row start) whose block name or sequence
+        contains the text, not case sensitive.
+        '''
+        text = text.upper()
+        return [
+            row for row, (block_name, sequence) in enumerate(
+                zip(self.block_names[start:], self.sequences[start:]),
+                start = start
+            )
+            if text in sequence.upper() or text in block_name.upper()
+        ]
+
+    def valid_entries(self):
+        '''
+        Return a dictionary with the valid block names as keys and their
+        corresponding sequences as values.
+        '''
+        return {
+            block_name: sequence
+            for block_name, sequence, name_valid, sequence_valid in zip(
+                self.block_names, self.sequences,
+                self.block_name_valid, self.sequence_valid
+            )
+            if name_valid and sequence_valid
+        }
+
+    def _reorder(self, rows):
+        '''Keep only the given rows, in the given order.'''
+        self.block_names = [self.block_names[row] for row in rows]
+        self.sequences = [self.sequences[row] for row in rows]
+        self.block_name_valid = bytearray(
+            self.block_name_valid[row] for row in rows
+        )
+        self.sequence_valid = bytearray(
+            self.sequence_valid[row] for row in rows
+        )
+
+    def _remove_from_index(self, column, text):
+        '''Decrease the count of a text in an index, remove it at zero.'''
+        index = self.index[column]
+        index[text] -= 1
+        if index[text] <= 0:
+            del index[text]
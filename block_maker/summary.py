@@ -0,0 +1,166 @@
+'''
+Summary table of a run, with one row per block file: block name, sequence,
+mass, number of C, H, N, O and S atoms and the applied modifications. The
+rows come from the block records of the run (see generation.block_record),
+so the table is written in the same pass as the block files. Supported
+formats, depending on the file extension:
+
+- .csv: written row by row, while the block files are generated.
+- .npy: a NumPy structured array, load with numpy.load(path).
+- .parquet: requires pyarrow, load with e.g. pandas.read_parquet(path).
+'''
+import csv
+import os
+from .cache import ELEMENTS
+
+
+# Column names of the summary table, in order.
+COLUMNS = (
+    "block_name", "sequence", "mass", *ELEMENTS, "cysteine_treatment",
+    "methionine_oxidation", "isotope_labeling", "variable_modifications",
+    "status"
+)
+SUMMARY_EXTENSIONS = (".csv", ".npy", ".parquet")
+
+
+def is_summary_path(path):
+    '''Return True if the path has the extension of a supported format.'''
+    return path.lower().endswith(SUMMARY_EXTENSIONS)
+
+
+def summary_row(record):
+    '''
+    Return the row of the summary table for a block record, as a tuple in
+    the order of COLUMNS. Labeled amino acids are joined, e.g. "KR", and
+    variable modifications are given as e.g. "oxidation:2;deamidation_n:1".
+    '''
+    composition = record["composition"]
+    return (
+        record["block_name"],
+        record["sequence"],
+        record["mass"],
+        *(composition[element] for element in ELEMENTS),
+        record["cysteine_treatment"],
+        record["methionine_oxidation"],
+        "".join(record["isotope_labeling"]),
+        ";".join(
+            f"{name}:{count}"
+            for name, count in record["variable_modifications"].items()
+        ),
+        record["status"]
+    )
+
+
+class SummaryTable():
+    '''
+    Write the summary table of a run. A CSV file is written row by row,
+    columnar formats (.npy, .parquet) are collected per column and written
+    when the table is closed. The table is written to a temporary file
+    that replaces the table when closed, and is removed after an error.
+    Use as a context manager:
+
+        with SummaryTable("summary.csv") as table:
+            table.add(generation.block_record(peptide, output_dir))
+    '''
+    def __init__(self, path):
+        if not is_summary_path(path):
+            raise ValueError(
+                f"Unknown summary table type '{path}', use one of: "
+                + ", ".join(SUMMARY_EXTENSIONS)
+            )
+        self.path = path
+        self.temp_path = path + ".tmp"
+        self.format = os.path.splitext(path)[1].lower()
+        if self.format == ".parquet":
+            # Fail before the run instead of after it.
+            _import_pyarrow()
+        self.rows_added = 0
+        self._file = None
+        self._csv = None
+        self._columns = None
+
+    def __enter__(self):
+        if self.format == ".csv":
+            self._file = open(self.temp_path, "w", newline = "")
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(COLUMNS)
+        else:
+            self._columns = tuple([] for _ in COLUMNS)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        completed = exc_type is None
+        try:
+            if self._file is not None:
+                self._file.close()
+            elif completed:
+                self._write_columns()
+        except BaseException:
+            completed = False
+            raise
+        finally:
+            self._file = None
+            self._csv = None
+            self._columns = None
+            if completed:
+                os.replace(self.temp_path, self.path)
+            elif os.path.exists(self.temp_path):
+                os.remove(self.temp_path)
+        return False
+
+    def add(self, record):
+        '''Add the row of a block record (see generation.block_record).'''
+        row = summary_row(record)
+        if self._csv is not None:
+            self._csv.writerow(row)
+        else:
+            for column, value in zip(self._columns, row):
+                column.append(value)
+        self.rows_added += 1
+
+    def _write_columns(self):
+        '''Write the collected columns in the columnar format.'''
+        if self.format == ".npy":
+            # Imported here: NumPy is only needed for .npy tables, and
+            # slows down starting the command-line interface.
+            import numpy as np
+            # A file object, so numpy.save does not add .npy to the name.
+            with open(self.temp_path, "wb") as file:
+                np.save(file, self._structured_array(), allow_pickle = False)
+            return
+        pyarrow, parquet = _import_pyarrow()
+        table = pyarrow.table(dict(zip(COLUMNS, self._columns)))
+        parquet.write_table(table, self.temp_path)
+
+    def _structured_array(self):
+        '''Return the columns as a NumPy structured array.'''
+        import numpy as np
+        dtypes = []
+        for name, column in zip(COLUMNS, self._columns):
+            if name == "mass":
+                dtype = np.float64
+            elif name in ELEMENTS:
+                dtype = np.int64
+            elif name == "methionine_oxidation":
+                dtype = np.bool_
+            else:
+                # Fixed-width strings, as wide as the longest value.
+                dtype = f"U{max(map(len, column), default = 0) or 1}"
+            dtypes.append((name, dtype))
+        array = np.empty(self.rows_added, dtype = dtypes)
+        for name, column in zip(COLUMNS, self._columns):
+            array[name] = column
+        return array
+
+
+def _import_pyarrow():
+    '''Return the pyarrow and pyarrow.parquet modules, needed for Parquet.'''
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError(
+            "Writing a Parquet summary table requires pyarrow "
+            "(pip install pyarrow); use .csv or .npy instead."
+        ) from None
+    return pyarrow, pyarrow.parquet
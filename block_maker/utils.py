@@ -1,18 +1,58 @@
-import datetime
+import bisect
+import os
+import re
+import uuid
+from itertools import accumulate
+from . import log
+from .instrumentation import instrumented
 from .resources import amino_acids
 
 
+# Sequences that only contain one-letter codes of amino acids.
+VALID_SEQUENCE = re.compile(f"[{"".join(amino_acids.compositions)}]*")
+# Sequences separated by line breaks.
+VALID_SEQUENCES = re.compile(f"[{"".join(amino_acids.compositions)}\n]*")
+
+
+@instrumented("logging")
 def write_to_log(message):
-    '''Write message to log file with date and time'''
-    with open("BlockMaker.log", "a") as file:  
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        if message.startswith("Start processing block"):
-            # Add empty line before new sequence.
-            file.write(f"\n\n{timestamp}\t{message}")
-        else:
-            file.write(f"\n{timestamp}\t{message}")
+    '''
+    Write message to log file with date and time.
+    Kept for compatibility: messages go to the logger of the log module.
+    '''
+    log.get_logger().info(message)
+
+
+@instrumented(
+    "block files", size = lambda path, content, *args, **kwargs: len(content)
+)
+def write_file(path, content, fsync = False, atomic = True):
+    '''
+    Write a text file. When atomic, the content is written to a new
+    temporary file with a unique name in the same directory, which then
+    replaces the file, so an interrupted write never leaves a truncated
+    file behind. With fsync, the file is flushed to disk (before it
+    replaces the old file).
+    '''
+    # Created exclusively, so that no other file is overwritten, and with
+    # the permissions of a normal file (unlike tempfile).
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp" if atomic else path
+    try:
+        with open(temp_path, "x" if atomic else "w") as file:
+            file.write(content)
+            if fsync:
+                file.flush()
+                os.fsync(file.fileno())
+        if atomic:
+            os.replace(temp_path, path)
+    except BaseException:
+        # Do not leave the temporary file behind.
+        if atomic and os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
 
 
+@instrumented("validation")
 def check_sequence_validity(sequence_input):
     '''
     Check the validity of an input peptide sequence.
@@ -20,6 +60,9 @@ def check_sequence_validity(sequence_input):
     The position count starts at 1.
     '''
     invalid = {"positions": [], "characters": []}
+    # Most sequences are valid: no need to look at every character.
+    if is_valid_sequence(sequence_input):
+        return invalid
     # Loop over each character in the sequence and look for invalid entries.
     for i, char in enumerate(sequence_input):
         if char not in amino_acids.compositions.keys():
@@ -30,6 +73,48 @@ def check_sequence_validity(sequence_input):
     return invalid
 
 
+@instrumented("validation")
+def is_valid_sequence(sequence):
+    '''
+    Return True if the sequence only contains characters that correspond
+    to amino acids. Use check_sequence_validity for the invalid positions.
+    '''
+    return VALID_SEQUENCE.fullmatch(sequence) is not None
+
+
+@instrumented("validation")
+def are_valid_sequences(sequences):
+    '''
+    Check the validity of many sequences (e.g. a list or array) at once.
+    Return a list with True for every valid and False for every invalid
+    sequence. The sequences are joined by line breaks and matched in one
+    pass, so the common case of only valid sequences is fast.
+    '''
+    sequences = list(sequences)
+    valid = [True] * len(sequences)
+    joined = "\n".join(sequences)
+    if joined.count("\n") != len(sequences) - 1:
+        # Line breaks within sequences: check them one by one.
+        return [is_valid_sequence(sequence) for sequence in sequences]
+    if VALID_SEQUENCES.fullmatch(joined) is not None:
+        return valid
+    # Start position of every sequence in the joined text.
+    starts = list(accumulate(
+        (len(sequence) + 1 for sequence in sequences), initial = 0
+    ))
+    # Jump from one invalid character to the next, skipping the rest of
+    # every invalid sequence.
+    position = 0
+    while position < len(joined):
+        position = VALID_SEQUENCES.match(joined, position).end()
+        if position == len(joined):
+            break
+        index = bisect.bisect_right(starts, position) - 1
+        valid[index] = False
+        position = starts[index + 1]
+    return valid
+
+
 def generate_invalid_sequence_warning(invalid, sequence):
     '''
     Generates a warning message based on invalid positions and characters
@@ -0,0 +1,170 @@
+'''
+Vectorized composition and mass calculation for large batches of peptides.
+Sequences are counted into a residue count matrix (one row per peptide, one
+column per amino acid) so all compositions are obtained with a single matrix
+multiplication. Results are identical to those of the Peptide class.
+Used by the workers of a parallel run, for a chunk of sequences at once.
+'''
+import numpy as np
+from . import modifications
+from .cache import CompositionCache, ELEMENTS
+from .instrumentation import instrumented
+from .resources import amino_acids
+from .resources import constants
+
+
+# Fixed order of amino acid residues (columns of the count matrix).
+RESIDUES = tuple(amino_acids.compositions.keys())
+
+# Residue composition table (20 x 5) and residue masses.
+COMPOSITION_TABLE = np.array(
+    [[amino_acids.compositions[aa][element] for element in ELEMENTS]
+     for aa in RESIDUES],
+    dtype = np.int64
+)
+RESIDUE_MASSES = np.array(
+    [amino_acids.masses[aa] for aa in RESIDUES], dtype = np.float64
+)
+
+# Lookup table from byte value to residue index, -1 for invalid characters.
+_BYTE_TO_INDEX = np.full(256, -1, dtype = np.int64)
+for _index, _aa in enumerate(RESIDUES):
+    _BYTE_TO_INDEX[ord(_aa)] = _index
+
+
+def residue_counts(sequences):
+    '''
+    Count the residues of a list of sequences in a single pass.
+    Return an integer matrix of N x 20, columns ordered as RESIDUES.
+    Raise ValueError if a sequence contains an invalid character.
+    '''
+    lengths = np.fromiter(
+        (len(sequence) for sequence in sequences),
+        dtype = np.int64, count = len(sequences)
+    )
+    joined = "".join(sequences).encode("ascii", errors = "replace")
+    indices = _BYTE_TO_INDEX[np.frombuffer(joined, dtype = np.uint8)]
+    if np.any(indices < 0):
+        position = int(np.argmax(indices < 0))
+        row = int(np.searchsorted(np.cumsum(lengths), position, side = "right"))
+        raise ValueError(
+            f"Sequence '{sequences[row]}' contains characters that "
+            "do not correspond to any amino acid."
+        )
+
+    # Offset the residue index of each character by its row.
+    rows = np.repeat(np.arange(len(sequences), dtype = np.int64), lengths)
+    counts = np.bincount(
+        rows * len(RESIDUES) + indices,
+        minlength = len(sequences) * len(RESIDUES)
+    )
+    return counts.reshape(len(sequences), len(RESIDUES))
+
+
+def modification_table(cysteine_treatment, methionine_oxidation,
+                       isotope_labeling):
+    '''
+    Return a 20 x 5 table with the change in elemental composition per
+    residue caused by cysteine treatment, methionine oxidation and
+    C-13/N-15 labeling (see the modifications registry).
+    '''
+    compiled = modifications.compile_settings(
+        cysteine_treatment, methionine_oxidation, isotope_labeling
+    )
+    return np.array(
+        [compiled.residue_deltas[aa] for aa in RESIDUES], dtype = np.int64
+    )
+
+
+def calculate_compositions(counts, cysteine_treatment, methionine_oxidation,
+                           isotope_labeling):
+    '''
+    Calculate the elemental compositions for a residue count matrix.
+    Return an integer matrix of N x 5, columns ordered as ELEMENTS.
+    '''
+    compiled = modifications.compile_settings(
+        cysteine_treatment, methionine_oxidation, isotope_labeling
+    )
+    table = COMPOSITION_TABLE + modification_table(
+        cysteine_treatment, methionine_oxidation, isotope_labeling
+    )
+    compositions = counts @ table
+    # Add water molecule (H2O) and terminal modifications.
+    compositions += np.array(compiled.terminal, dtype = np.int64)
+    return compositions
+
+
+def calculate_masses(counts, cysteine_treatment, methionine_oxidation,
+                     isotope_labeling):
+    '''
+    Calculate the monoisotopic masses for a residue count matrix.
+    Residue masses and modifications are added in the same order as
+    Peptide.calculate_peptide_mass, so the floating point results are
+    identical. Return a list of masses rounded to nine decimals.
+    '''
+    masses = np.zeros(counts.shape[0], dtype = np.float64)
+    for column in range(len(RESIDUES)):
+        masses += RESIDUE_MASSES[column] * counts[:, column]
+    masses += constants.WATER_MASS
+
+    compiled = modifications.compile_settings(
+        cysteine_treatment, methionine_oxidation, isotope_labeling
+    )
+    for aa, term in compiled.mass_terms:
+        if aa is None:
+            # Terminal modification: once per peptide.
+            masses += term
+        else:
+            masses += term * counts[:, RESIDUES.index(aa)]
+    # Python's round (not np.round) to match the scalar path exactly.
+    return [round(mass, 9) for mass in masses.tolist()]
+
+
+def calculate_batch(sequences, cysteine_treatment, methionine_oxidation,
+                    isotope_labeling):
+    '''
+    Calculate compositions and masses for a list of sequences at once.
+    Return the composition matrix (N x 5, columns ordered as ELEMENTS) and
+    a list with masses, in the same order as the input sequences.
+    '''
+    counts = residue_counts(sequences)
+    compositions = calculate_compositions(
+        counts, cysteine_treatment, methionine_oxidation, isotope_labeling
+    )
+    masses = calculate_masses(
+        counts, cysteine_treatment, methionine_oxidation,
+        isotope_labeling
+    )
+    return compositions, masses
+
+
+def composition_dicts(compositions):
+    '''
+    Convert a composition matrix into a list of dictionaries, in the
+    format of Peptide.composition.
+    '''
+    return [dict(zip(ELEMENTS, row)) for row in compositions.tolist()]
+
+
+@instrumented("composition")
+def cache_items(sequences, cysteine_treatment, methionine_oxidation,
+                isotope_labeling):
+    '''
+    Calculate compositions and masses for a list of sequences at once.
+    Return them as (key, composition, mass) items for a CompositionCache.
+    '''
+    compositions, masses = calculate_batch(
+        sequences, cysteine_treatment, methionine_oxidation, isotope_labeling
+    )
+    return [
+        (
+            CompositionCache.key(
+                sequence, cysteine_treatment, methionine_oxidation,
+                isotope_labeling
+            ),
+            composition, mass
+        )
+        for sequence, composition, mass in zip(
+            sequences, composition_dicts(compositions), masses
+        )
+    ]
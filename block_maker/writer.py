@@ -0,0 +1,392 @@
+import os
+import shutil
+import tempfile
+import time
+from . import generation
+from . import instrumentation
+from . import log
+from . import utils
+from .archive import BlockArchive
+from .manifest import Manifest, content_hash
+from .summary import SummaryTable
+
+
+# Prefix of the temporary directories of staged runs.
+STAGING_PREFIX = ".BlockMaker-staged-"
+
+def write_block_file(write_dir, block_name, content, fsync = False,
+                     atomic = True):
+    '''
+    Write the content of a block file to a directory. With fsync, the file
+    is only flushed here if the whole disk cannot be synced at the end.
+    '''
+    # No os.sync (Windows): flush each file instead.
+    utils.write_file(
+        os.path.join(write_dir, block_name + ".block"), content,
+        fsync = fsync and not hasattr(os, "sync"), atomic = atomic
+    )
+
+
+class BlockWriter():
+    '''
+    Write block files for many peptides in one run, with the log messages
+    of every block as a single record. Use as a context manager:
+
+        with BlockWriter(output_dir) as writer:
+            for peptide in peptides:
+                writer.add(peptide)
+
+    Options: skip up-to-date files with a manifest (incremental) and delete
+    files of earlier runs (prune), replace files atomically, write all files
+    of the run to a staging directory first (staged) or into one archive,
+    and write a summary table of the run (.csv, .npy or .parquet).
+    '''
+    def __init__(self, output_dir, log_path = None,
+                 fsync = False, buffer_size = 10000, incremental = False,
+                 prune = False, atomic = True, staged = False, archive = None,
+                 summary = None):
+        if archive is not None and (incremental or staged):
+            raise ValueError(
+                "An archive cannot be combined with incremental or staged runs."
+            )
+        self.output_dir = output_dir
+        # Text log file; None to keep the current logging configuration.
+        self.log_path = log_path
+        # Flush written files to disk once, at the end of the run.
+        self.fsync = fsync
+        # Maximum number of block files kept in memory before writing.
+        self.buffer_size = buffer_size
+        self.incremental = incremental
+        self.prune = prune
+        self.staged = staged
+        # Staged block files are written to a new directory and moved as a
+        # whole, so they do not need temporary files of their own.
+        self.atomic = atomic and not staged
+        # Move the staged block files into the output directory at the end.
+        self.commit = True
+        # Directory the block files are written to.
+        self.write_dir = output_dir
+        self.archive = archive
+        # Where the block files end up, for the log messages.
+        self.location = output_dir if archive is None else archive
+        self._archive = None
+        self.summary = summary
+        self._summary = None
+        self.manifest = None
+        self.files_written = 0
+        self.files_skipped = 0
+        self.files_pruned = 0
+        self.seconds = 0.0
+        self.logger = None
+        # Add a record per block for the JSON lines log or summary table.
+        self.block_records = False
+        self._pending = []
+        self._start = None
+
+    def __enter__(self):
+        if self.log_path is not None:
+            log.set_path(self.log_path)
+        self.logger = log.get_logger()
+        self.block_records = (
+            log.block_records_enabled() or self.summary is not None
+        )
+        if self.incremental:
+            self.manifest = Manifest(self.output_dir)
+        if self.summary is not None:
+            # Check the format before anything is written.
+            self._summary = SummaryTable(self.summary)
+        if self.archive is not None:
+            self._archive = BlockArchive(self.archive).__enter__()
+        if self._summary is not None:
+            self._summary.__enter__()
+        if self.staged:
+            self._remove_stale_staging()
+            # Same file system as the output directory, so files are moved
+            # without copying.
+            self.write_dir = tempfile.mkdtemp(
+                prefix = STAGING_PREFIX, dir = self.output_dir
+            )
+        self._start = time.perf_counter()
+        instrumentation.start_run()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self._finish(completed = exc_type is None)
+        finally:
+            self.seconds = time.perf_counter() - self._start
+            if exc_type is None and self.files_written > 0:
+                self.log(
+                    f"{self.files_written} block files written in "
+                    f"{self.seconds:.2f} s ({self.files_per_second:.0f} files/s)"
+                )
+            if exc_type is None and self.manifest is not None:
+                self.log(
+                    f"Incremental run: {self.files_written} block files "
+                    f"written, {self.files_skipped} skipped, "
+                    f"{self.files_pruned} removed"
+                )
+            # Summary of the timers and counters, if enabled.
+            instrumentation.finish_run(self.logger)
+            # The log is complete when the run returns.
+            log.flush()
+        return False
+
+    def _finish(self, completed):
+        '''
+        Write the remaining block files, close the archive or move staged 
+        block files into the output directory (or discard them), close the
+        summary table, prune and save the manifest.
+        '''
+        try:
+            self.flush()
+        except BaseException as error:
+            if self.staged:
+                self._discard_staged()
+            if self._archive is not None:
+                self._close_archive(error)
+            if self._summary is not None:
+                self._close_summary(error)
+            raise
+        if self._archive is not None:
+            if completed and self.commit:
+                self._close_archive()
+            else:
+                self._close_archive(RuntimeError("Run not completed."))
+        if self.staged:
+            if not (completed and self.commit):
+                self._discard_staged()
+            else:
+                if self.fsync:
+                    # Staged files on disk before they are moved.
+                    self._sync()
+                try:
+                    self._commit_staged()
+                except BaseException as error:
+                    self._discard_staged()
+                    if self._summary is not None:
+                        self._close_summary(error)
+                    raise
+        if self._summary is not None:
+            # Staged or archived block files are only kept after a complete run.
+            if (completed and self.commit) or not (
+                self.staged or self.archive is not None
+            ):
+                self._close_summary()
+            else:
+                self._close_summary(RuntimeError("Run not completed."))
+        if self.staged and not (completed and self.commit):
+            return
+        if self.manifest is not None:
+            # Only prune after a complete run.
+            if self.prune and completed:
+                for block_name in self.manifest.prune():
+                    self.log(
+                        f"'{block_name}.block' removed from "
+                        f"'{self.output_dir}'"
+                    )
+                    self.files_pruned += 1
+            self.manifest.save()
+        if self.fsync:
+            self._sync()
+
+    @property
+    def files_per_second(self):
+        '''Throughput of the run, in block files per second.'''
+        if self.seconds == 0:
+            return 0.0
+        return self.files_written / self.seconds
+
+    def log(self, message):
+        '''Log a message of the run.'''
+        self.logger.info(message)
+
+    @instrumentation.instrumented("block files")
+    def add(self, peptide):
+        '''
+        Add the block file of a peptide to the run, together with the
+        same log messages as for a single block file. In incremental mode,
+        the block file is skipped if it is up to date.
+        '''
+        content = peptide.block_file_content()
+        if self.manifest is not None:
+            file_hash = content_hash(content)
+            if self.manifest.is_current(peptide.block_name, file_hash):
+                self.files_skipped += 1
+                self._log_block(
+                    [generation.skipped_log_message(
+                        peptide.block_name, self.output_dir
+                    )],
+                    self._block_record(peptide, "skipped")
+                )
+                return
+            self.manifest.record(peptide.block_name, file_hash)
+        self._log_block(
+            generation.block_log_messages(peptide, self.location),
+            self._block_record(peptide, "written")
+        )
+        self._pending.append((peptide.block_name, content))
+        if len(self._pending) >= self.buffer_size:
+            self.flush()
+
+    def add_written(self, files_written, blocks, files_skipped = 0,
+                    hashes = (), contents = ()):
+        '''
+        Count block files that were written or skipped elsewhere (e.g. by 
+        a worker process) for this run, and log the (messages, record) 
+        tuples in blocks, one per block file (see _block_record). In
+        incremental mode, hashes contains (block_name, hash) tuples for all
+        block files of the run, written or skipped. When writing an 
+        archive, contents contains the (block_name, content) tuples of the
+        block files, to be added to the archive.
+        '''
+        self.files_written += files_written
+        self.files_skipped += files_skipped
+        if self.manifest is not None:
+            for block_name, file_hash in hashes:
+                self.manifest.record(block_name, file_hash)
+        for block_name, content in contents:
+            self._archive.add(block_name, content)
+        for messages, record in blocks:
+            self._log_block(messages, record)
+
+    def known_hashes(self, block_names):
+        '''
+        Return a dictionary with the hashes in the manifest of block names,
+        so a worker process can skip up-to-date files. Empty if the run
+        is not incremental.
+        '''
+        if self.manifest is None:
+            return {}
+        hashes = self.manifest.hashes
+        return {
+            block_name: hashes[block_name] 
+            for block_name in block_names if block_name in hashes
+        }
+
+    @instrumentation.instrumented("block files")
+    def flush(self):
+        '''Write all buffered block files and log entries.'''
+        for block_name, content in self._pending:
+            if self._archive is not None:
+                self._archive.add(block_name, content)
+                self.files_written += 1
+                continue
+            write_block_file(
+                self.write_dir, block_name, content, self.fsync, self.atomic
+            )
+            self.files_written += 1
+        self._pending = []
+
+    def _log_block(self, messages, record):
+        '''
+        Log the messages of a block file and add its record to the summary
+        table, if any.
+        '''
+        log.log_block(self.logger, messages, record)
+        if self._summary is not None:
+            self._summary.add(record)
+
+    def _close_summary(self, error = None):
+        '''Close the summary table. After an error, it is removed again.'''
+        summary = self._summary
+        self._summary = None
+        if error is None:
+            summary.__exit__(None, None, None)
+            return
+        summary.__exit__(type(error), error, error.__traceback__)
+        self.log(f"Run not completed: '{self.summary}' not created")
+
+    def _close_archive(self, error = None):
+        '''
+        Close the archive. After an error, the archive is removed again 
+        and the files written so far are not counted.
+        '''
+        archive = self._archive
+        self._archive = None
+        if error is None:
+            archive.__exit__(None, None, None)
+            return
+        archive.__exit__(type(error), error, error.__traceback__)
+        self.log(
+            f"Run not completed: {self.files_written} block files "
+            f"discarded, '{self.archive}' not created"
+        )
+        self.files_written = 0
+
+    def _commit_staged(self):
+        '''
+        Move the staged block files into the output directory. The block
+        files they replace are moved aside first, and only deleted when all
+        staged files were moved. If a move fails, the moves are undone, so
+        the output directory keeps the old block files.
+        '''
+        replaced_dir = tempfile.mkdtemp(
+            prefix = STAGING_PREFIX, dir = self.output_dir
+        )
+        # Moved filenames, and the filenames of replaced files.
+        moved = []
+        replaced = []
+        try:
+            for filename in os.listdir(self.write_dir):
+                path = os.path.join(self.output_dir, filename)
+                if os.path.exists(path):
+                    os.replace(path, os.path.join(replaced_dir, filename))
+                    replaced.append(filename)
+                os.replace(os.path.join(self.write_dir, filename), path)
+                moved.append(filename)
+        except BaseException:
+            for filename in moved:
+                os.replace(
+                    os.path.join(self.output_dir, filename),
+                    os.path.join(self.write_dir, filename)
+                )
+            for filename in replaced:
+                os.replace(
+                    os.path.join(replaced_dir, filename),
+                    os.path.join(self.output_dir, filename)
+                )
+            os.rmdir(replaced_dir)
+            raise
+        shutil.rmtree(replaced_dir, ignore_errors = True)
+        os.rmdir(self.write_dir)
+        self.write_dir = self.output_dir
+
+    def _remove_stale_staging(self):
+        '''
+        Delete the staging directories left in the output directory by
+        staged runs that crashed.
+        '''
+        for filename in os.listdir(self.output_dir):
+            path = os.path.join(self.output_dir, filename)
+            if filename.startswith(STAGING_PREFIX) and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors = True)
+                self.log(f"Removed staging directory '{path}' of an earlier run")
+
+    def _discard_staged(self):
+        '''
+        Delete the staged block files, leaving the output directory and
+        the manifest unchanged.
+        '''
+        shutil.rmtree(self.write_dir, ignore_errors = True)
+        self.write_dir = self.output_dir
+        self.log(
+            f"Staged run not completed: {self.files_written} block files "
+            f"discarded, '{self.output_dir}' unchanged"
+        )
+        self.files_written = 0
+
+    def _block_record(self, peptide, status):
+        '''
+        Return the record of a block for the JSON lines log and summary
+        table, or None if neither is written.
+        '''
+        if not self.block_records:
+            return None
+        return generation.block_record(peptide, self.location, status)
+
+    def _sync(self):
+        '''Flush the log files and all written block files to disk.'''
+        log.sync()
+        if hasattr(os, "sync"):
+            os.sync()
@@ -2,9 +2,824 @@ import os
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from BlockMaker import utils
-from BlockMaker.peptide import Peptide
+import contextlib
+import csv
+import io
+import itertools
+import json
+import tempfile
+import time
+import unittest
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+
+from block_maker import archive
+from block_maker import cache
+from block_maker import cli
+from block_maker import digestion
+from block_maker import generation
+from block_maker import instrumentation
+from block_maker import isotopes
+from block_maker import log
+from block_maker import mass_index
+from block_maker import modifications
+from block_maker import naming
+from block_maker import parallel
+from block_maker import summary
+from block_maker import utils
+from block_maker import vectorized
+from block_maker.peptide import CompactPeptide, Peptide
+from block_maker.resources import amino_acids
+from block_maker.sequence_store import SequenceStore
+from block_maker.writer import BlockWriter
+
+
+def block_mass(path):
+    '''Return the mass in a block file.'''
+    with open(path, "r") as file:
+        return float(file.readline().split("\t")[1])
+
+
+class IncrementalTest(unittest.TestCase):
+    '''Skipping up-to-date block files with the manifest.'''
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.input_path = os.path.join(self.output_dir, "sequences.txt")
+        with open(self.input_path, "w") as file:
+            file.write("MPEPTIDEK\nAAAAK\n")
+
+    def tearDown(self):
+        log.shutdown()
+
+    def run_cli(self, *args):
+        '''Run the command-line interface quietly.'''
+        with contextlib.redirect_stdout(io.StringIO()):
+            return cli.main([
+                self.input_path, "-o", self.output_dir, "-j", "1",
+                "--log-file", os.path.join(self.output_dir, "BlockMaker.log"),
+                *args
+            ])
+
+    def test_replaced_file_is_written_again(self):
+        # An incremental run, a run with other settings without the
+        # manifest, and an incremental run with the first settings.
+        self.run_cli("-i")
+        self.run_cli("-m")
+        self.run_cli("-i")
+        expected = Peptide("MPEP", "MPEPTIDEK", "None (reduced form)", False, [])
+        self.assertAlmostEqual(
+            block_mass(os.path.join(self.output_dir, "MPEP.block")),
+            expected.mass
+        )
+
+    def test_unchanged_files_are_skipped(self):
+        self.run_cli("-i")
+        with mock.patch.object(utils, "write_file") as write_file:
+            self.run_cli("-i")
+        write_file.assert_not_called()
+
+    def test_replaced_file_is_written_again_by_workers(self):
+        entries = [("MPEP", "MPEPTIDEK"), ("AAAA", "AAAAK")]
+        settings = ("None (reduced form)", False, [])
+        log_path = os.path.join(self.output_dir, "BlockMaker.log")
+        with mock.patch.object(parallel, "PARALLEL_THRESHOLD", 1):
+            parallel.generate_blocks(
+                entries, *settings, self.output_dir, workers = 2,
+                use_threads = True, log_path = log_path, incremental = True
+            )
+            parallel.generate_blocks(
+                entries, "None (reduced form)", True, [], self.output_dir,
+                workers = 2, use_threads = True, log_path = log_path
+            )
+            writer = parallel.generate_blocks(
+                entries, *settings, self.output_dir, workers = 2,
+                use_threads = True, log_path = log_path, incremental = True
+            )
+        self.assertEqual(writer.files_written, 1)
+        self.assertEqual(writer.files_skipped, 1)
+        self.assertAlmostEqual(
+            block_mass(os.path.join(self.output_dir, "MPEP.block")),
+            Peptide("MPEP", "MPEPTIDEK", *settings).mass
+        )
+
+
+class CommandLineTest(unittest.TestCase):
+    '''User errors of the command-line interface.'''
+    def tearDown(self):
+        log.shutdown()
+
+    def test_missing_input_file(self):
+        output_dir = tempfile.mkdtemp()
+        with contextlib.redirect_stderr(io.StringIO()) as stderr, \
+                self.assertRaises(SystemExit) as context:
+            cli.main([
+                os.path.join(output_dir, "missing.txt"), "-o", output_dir,
+                "--log-file", os.path.join(output_dir, "BlockMaker.log")
+            ])
+        self.assertEqual(context.exception.code, 2)
+        self.assertIn("cannot read input file", stderr.getvalue())
+
+
+class CompositionCacheTest(unittest.TestCase):
+    '''The LRU cache of compositions and masses.'''
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "cache.json")
+
+    def put(self, composition_cache, sequence):
+        '''Store the composition and mass of a sequence.'''
+        settings = ("Iodo- or chloroacetamide", True, ["K"])
+        peptide = Peptide("BLCK", sequence, *settings)
+        key = composition_cache.key(sequence, *settings)
+        composition_cache.put(key, peptide.composition, peptide.mass)
+        return key, peptide
+
+    def test_least_recently_used_is_evicted(self):
+        composition_cache = cache.CompositionCache(max_size = 2)
+        first, _ = self.put(composition_cache, "PEPTIDEK")
+        second, _ = self.put(composition_cache, "AAAAK")
+        composition_cache.get(first)
+        self.put(composition_cache, "GGGGR")
+        self.assertIsNone(composition_cache.get(second))
+        self.assertIsNotNone(composition_cache.get(first))
+        self.assertEqual(composition_cache.evictions, 1)
+        self.assertEqual(len(composition_cache), 2)
+
+    def test_save_and_load(self):
+        composition_cache = cache.CompositionCache()
+        keys = [self.put(composition_cache, sequence) for sequence in ("MCMK", "AAAAK")]
+        composition_cache.save(self.path)
+        loaded = cache.CompositionCache.load(self.path, max_size = 1)
+        self.assertEqual(len(loaded), 1)
+        (key, peptide), = keys[1:]
+        self.assertEqual(loaded.get(key), (peptide.composition, peptide.mass))
+
+    def test_malformed_file_is_rejected(self):
+        current = {
+            "version": cache.CACHE_VERSION,
+            "registry": modifications.registry_hash()
+        }
+        for data in (
+            [[1, 2]],
+            {**current, "entries": [[1, 2]]},
+            {**current, "entries": [["AK", "None", False, "", 1, 2, 3, 4, "5", 6.0]]}
+        ):
+            with open(self.path, "w") as file:
+                json.dump(data, file)
+            with self.assertRaises(ValueError):
+                cache.CompositionCache.load(self.path)
+
+    def test_other_version_is_discarded(self):
+        composition_cache = cache.CompositionCache()
+        self.put(composition_cache, "PEPTIDEK")
+        composition_cache.save(self.path)
+        with mock.patch.object(modifications, "registry_hash", return_value = ""):
+            self.assertEqual(len(cache.CompositionCache.load(self.path)), 0)
+        # Format of earlier versions: a list of entries.
+        with open(self.path, "w") as file:
+            json.dump([["AK", "None", False, "", 1, 2, 3, 4, 5, 6.0]], file)
+        self.assertEqual(len(cache.CompositionCache.load(self.path)), 0)
+
+
+class StagedTest(unittest.TestCase):
+    '''Staged runs.'''
+    def tearDown(self):
+        log.shutdown()
+
+    def test_stale_staging_directory_is_removed(self):
+        output_dir = tempfile.mkdtemp()
+        # Left by a run that crashed.
+        stale = tempfile.mkdtemp(prefix = ".BlockMaker-staged-", dir = output_dir)
+        with open(os.path.join(stale, "MPEP.block"), "w") as file:
+            file.write("")
+        with BlockWriter(
+            output_dir, staged = True,
+            log_path = os.path.join(output_dir, "BlockMaker.log")
+        ) as writer:
+            writer.add(Peptide("MPEP", "MPEPTIDEK", "None (reduced form)", False, []))
+        self.assertEqual(
+            sorted(os.listdir(output_dir)), ["BlockMaker.log", "MPEP.block"]
+        )
+
+    def test_failed_move_keeps_old_files(self):
+        output_dir = tempfile.mkdtemp()
+        for block_name in ["MPEP", "APEP"]:
+            with open(os.path.join(output_dir, block_name + ".block"), "w") as file:
+                file.write("old")
+        replace = os.replace
+        # Moves into the output directory.
+        moves = []
+
+        def failing_replace(source, destination):
+            if os.path.dirname(destination) == output_dir:
+                moves.append(destination)
+                if len(moves) == 2:
+                    raise OSError("Disk full")
+            replace(source, destination)
+
+        with mock.patch("block_maker.writer.os.replace", failing_replace):
+            with self.assertRaises(OSError):
+                with BlockWriter(
+                    output_dir, staged = True,
+                    log_path = os.path.join(output_dir, "BlockMaker.log")
+                ) as writer:
+                    writer.add(Peptide("MPEP", "MPEPTIDEK", "None (reduced form)", False, []))
+                    writer.add(Peptide("APEP", "APEPTIDEK", "None (reduced form)", False, []))
+        self.assertEqual(
+            sorted(os.listdir(output_dir)),
+            ["APEP.block", "BlockMaker.log", "MPEP.block"]
+        )
+        for block_name in ["MPEP", "APEP"]:
+            with open(os.path.join(output_dir, block_name + ".block")) as file:
+                self.assertEqual(file.read(), "old")
+
+    def test_write_file_keeps_other_temporary_files(self):
+        output_dir = tempfile.mkdtemp()
+        path = os.path.join(output_dir, "MPEP.block")
+        with open(path + ".tmp", "w") as file:
+            file.write("other")
+        utils.write_file(path, "new")
+        self.assertEqual(
+            sorted(os.listdir(output_dir)), ["MPEP.block", "MPEP.block.tmp"]
+        )
+        with open(path + ".tmp") as file:
+            self.assertEqual(file.read(), "other")
+
+
+class DigestionTest(unittest.TestCase):
+    '''In-silico digestion of protein sequences.'''
+    def test_trypsin(self):
+        self.assertEqual(
+            list(digestion.digest("PEPTIDEKAAAAAAKPGGGGGGR", min_length = 1)),
+            ["PEPTIDEK", "AAAAAAKPGGGGGGR"]
+        )
+
+    def test_missed_cleavages(self):
+        self.assertEqual(
+            list(digestion.digest(
+                "PEPTIDEKAAAAAAKGGGGGGR", missed_cleavages = 1
+            )),
+            ["PEPTIDEK", "PEPTIDEKAAAAAAK", "AAAAAAK", "AAAAAAKGGGGGGR", "GGGGGGR"]
+        )
+
+    def test_invalid_residue_only_skips_its_peptides(self):
+        protein = "PEPTIDEKAAAAAAKXAAAAAAKGGGGGGKLLLLLLR"
+        self.assertEqual(
+            list(digestion.digest(protein)),
+            ["PEPTIDEK", "AAAAAAK", "GGGGGGK", "LLLLLLR"]
+        )
+        self.assertEqual(
+            list(digestion.digest(protein, missed_cleavages = 1)),
+            [
+                "PEPTIDEK", "PEPTIDEKAAAAAAK", "AAAAAAK", "GGGGGGK",
+                "GGGGGGKLLLLLLR", "LLLLLLR"
+            ]
+        )
+
+    def test_mass_limits(self):
+        peptide = Peptide("PEPT", "PEPTIDEK", "None (reduced form)", False, [])
+        self.assertEqual(
+            list(digestion.digest(
+                "PEPTIDEKUAAAAAAK", min_mass = peptide.mass - 0.01,
+                max_mass = peptide.mass + 0.01
+            )),
+            ["PEPTIDEK"]
+        )
+
+
+class VariableModificationsTest(unittest.TestCase):
+    '''Variable modification states of peptides.'''
+    def test_states_by_count(self):
+        states = modifications.variable_states(
+            Counter("MMNK"), ("oxidation", "deamidation_n")
+        )
+        self.assertEqual(states, [
+            (),
+            (("oxidation", 1),),
+            (("deamidation_n", 1),),
+            (("oxidation", 2),),
+            (("oxidation", 1), ("deamidation_n", 1)),
+            (("oxidation", 2), ("deamidation_n", 1)),
+        ])
+
+    def test_limits(self):
+        residue_counts = Counter("MMMNNQ")
+        names = ("oxidation", "deamidation_n", "deamidation_q")
+        self.assertEqual(
+            len(modifications.variable_states(
+                residue_counts, names, max_states = 5
+            )),
+            5
+        )
+        states = modifications.variable_states(
+            residue_counts, names, max_modifications = 1
+        )
+        self.assertEqual(len(states), 4)
+        self.assertEqual(modifications.state_suffix(states[1]), "_Ox")
+
+    def test_deamidation_is_aspartic_acid(self):
+        for labeling in ([], ["N", "K"]):
+            settings = ("None (reduced form)", False, labeling)
+            peptide = Peptide("NNGG", "NNGGGK", *settings)
+            *_, state = generation.variable_peptides(
+                peptide, ("deamidation_n",)
+            )
+            expected = Peptide(
+                "DDGG", "DDGGGK", "None (reduced form)", False,
+                [{"N": "D"}.get(amino_acid, amino_acid) for amino_acid in labeling]
+            )
+            self.assertEqual(state.block_name, "NNGG_DeNDeN")
+            self.assertEqual(state.composition, expected.composition)
+            self.assertAlmostEqual(state.mass, expected.mass, places = 8)
+
+    def test_oxidation_is_fixed_oxidation(self):
+        settings = ("Iodo- or chloroacetamide", False, ["M"])
+        peptide = Peptide("MCMK", "MCMK", *settings)
+        *_, state = generation.variable_peptides(peptide, ("oxidation",))
+        expected = Peptide("MCMK", "MCMK", settings[0], True, settings[2])
+        self.assertEqual(state.composition, expected.composition)
+        self.assertAlmostEqual(state.mass, expected.mass, places = 8)
+
+    def test_state_names_are_unique(self):
+        # The oxidized state of the first entry would be named "PEPT_Ox".
+        entries = [("PEPT", "PEPTMIDEK"), ("PEPT_Ox", "PEPTIDEK")]
+        expected = Peptide("PEPT_Ox", "PEPTIDEK", "None (reduced form)", False, [])
+        for workers, threshold in ((1, parallel.PARALLEL_THRESHOLD), (2, 1)):
+            output_dir = tempfile.mkdtemp()
+            with mock.patch.object(parallel, "PARALLEL_THRESHOLD", threshold):
+                parallel.generate_blocks(
+                    entries, "None (reduced form)", False, [], output_dir,
+                    workers = workers, use_threads = True,
+                    variable = generation.VariableModifications(("oxidation",)),
+                    log_path = os.path.join(output_dir, "BlockMaker.log")
+                )
+            self.assertEqual(
+                sorted(os.listdir(output_dir)),
+                ["BlockMaker.log", "PEPT.block", "PEPT_Ox.block", "PEPT_Ox_b.block"]
+            )
+            with open(os.path.join(output_dir, "PEPT_Ox.block")) as file:
+                self.assertEqual(file.read(), expected.block_file_content())
+            log.shutdown()
+
+
+class BlockNameTest(unittest.TestCase):
+    '''Generated block names.'''
+    def test_suffixes(self):
+        self.assertEqual(
+            [naming.block_name_suffix(number) for number in (1, 25, 26, 27, 676)],
+            ["b", "z", "ba", "bb", "baa"]
+        )
+
+    def test_allocate(self):
+        used_names = Counter()
+        allocator = naming.BlockNameAllocator(used_names)
+        block_names = []
+        for _ in range(28):
+            block_name = allocator.allocate("PEPTIDEK")
+            used_names[block_name] += 1
+            block_names.append(block_name)
+        self.assertEqual(block_names[:3], ["PEPT", "PEPT_b", "PEPT_c"])
+        self.assertEqual(block_names[-3:], ["PEPT_z", "PEPT_ba", "PEPT_bb"])
+        # A freed name is not reused, an edited name in use is skipped.
+        del used_names["PEPT_b"]
+        used_names["PEPT_bc"] += 1
+        self.assertEqual(allocator.allocate("PEPTIDEK"), "PEPT_bd")
+        self.assertEqual(allocator.allocate("AAAAK"), "AAAA")
+
+
+class ValidatorTest(unittest.TestCase):
+    '''Validation of sequences.'''
+    def test_batch_matches_single(self):
+        sequences = [
+            "PEPTIDEK", "PEPXIDEK", "", "AAAAK", "peptide", "B", "PEP\nTIDE",
+            "MPEPK*", "GGGGR"
+        ]
+        self.assertEqual(
+            utils.are_valid_sequences(sequences),
+            [utils.is_valid_sequence(sequence) for sequence in sequences]
+        )
+        self.assertEqual(
+            utils.are_valid_sequences(sequences[:2] + sequences[3:4]),
+            [True, False, True]
+        )
+        self.assertEqual(utils.are_valid_sequences([]), [])
+
+    def test_invalid_positions(self):
+        self.assertEqual(
+            utils.check_sequence_validity("PEPXIDEBK"),
+            {"positions": [4, 8], "characters": ["X", "B"]}
+        )
+        self.assertEqual(
+            utils.check_sequence_validity("PEPTIDEK"),
+            {"positions": [], "characters": []}
+        )
+
+
+class SequenceStoreTest(unittest.TestCase):
+    '''Rows of the sequence table.'''
+    def test_find(self):
+        store = SequenceStore()
+        store.extend(["PEPTIDEK", "AAAAK", "MPEPK", "GGGGR"])
+        store.set_value(3, 0, "Pep_b")
+        self.assertEqual(store.find("pep"), [0, 2, 3])
+        self.assertEqual(store.find("PEP", start = 1), [2, 3])
+        self.assertEqual(store.find(""), [0, 1, 2, 3])
+
+
+class VectorizedTest(unittest.TestCase):
+    '''Batch compositions and masses, as used by parallel runs.'''
+    def test_same_as_peptide(self):
+        sequences = [
+            "PEPTIDEK", "C", "MCMCWWYK", "ACDEFGHIKLMNPQRSTVWY" * 3, "GGGGR"
+        ]
+        for settings in itertools.product(
+            modifications.cysteine_treatments(), (False, True),
+            ([], ["K", "R"], list(amino_acids.compositions))
+        ):
+            for (_, composition, mass), sequence in zip(
+                vectorized.cache_items(sequences, *settings), sequences
+            ):
+                peptide = Peptide("BLCK", sequence, *settings)
+                self.assertEqual(composition, peptide.composition)
+                # Bit for bit, so block files do not depend on the path.
+                self.assertEqual(mass, peptide.mass)
+
+    def test_invalid_sequence(self):
+        with self.assertRaises(ValueError):
+            vectorized.residue_counts(["PEPTIDEK", "PEPXIDEK"])
+
+
+class CancelTest(unittest.TestCase):
+    '''Cancelling a parallel run.'''
+    def tearDown(self):
+        log.shutdown()
+
+    def test_cancel_while_collecting_the_last_chunks(self):
+        output_dir = tempfile.mkdtemp()
+        entries = [(f"B_{chr(97 + i)}", "PEPTIDEK") for i in range(20)]
+        generate_chunk = parallel._generate_chunk
+
+        def slow_chunk(chunk, *args):
+            # All workers are busy with the last chunks.
+            if chunk[0] in entries[14:]:
+                time.sleep(0.5)
+            return generate_chunk(chunk, *args)
+
+        # With one entry per chunk and 4 workers, the last 7 chunks are
+        # collected after all chunks were submitted. Cancel after the
+        # first of those.
+        state = {"cancelled": False}
+
+        def progress(done, total):
+            if done >= 14:
+                state["cancelled"] = True
+
+        with mock.patch.object(parallel, "PARALLEL_THRESHOLD", 1), \
+                mock.patch.object(parallel, "MAX_CHUNK_SIZE", 1), \
+                mock.patch.object(parallel, "_generate_chunk", slow_chunk):
+            writer = parallel.generate_blocks(
+                entries, "None (reduced form)", False, [], output_dir,
+                workers = 4, use_threads = True, progress = progress,
+                cancelled = lambda: state["cancelled"],
+                log_path = os.path.join(output_dir, "BlockMaker.log")
+            )
+        self.assertFalse(writer.commit)
+        self.assertLess(writer.files_written, len(entries))
+        # The written block files are those of the first entries.
+        written = sorted(
+            name[:-len(".block")] for name in os.listdir(output_dir)
+            if name.endswith(".block")
+        )
+        self.assertEqual(
+            written,
+            [block_name for block_name, _ in entries[:writer.files_written]]
+        )
+
+
+class CompactPeptideTest(unittest.TestCase):
+    '''CompactPeptide in place of Peptide.'''
+    def tearDown(self):
+        log.shutdown()
+
+    def test_residues_are_counted_once(self):
+        compact = CompactPeptide("MCMK", "MCMK", "None (reduced form)", False, [])
+        with mock.patch("block_maker.peptide.Counter", wraps = Counter) as counter:
+            compact.mass
+            list(generation.modification_messages(compact))
+            compact.residue_counts
+        counter.assert_called_once_with("MCMK")
+
+    def test_block_writer_with_variable_modifications(self):
+        output_dir = tempfile.mkdtemp()
+        settings = ("Iodo- or chloroacetamide", False, ["K"])
+        compact = CompactPeptide("MCMK", "MCMK", *settings)
+        with BlockWriter(
+            output_dir, log_path = os.path.join(output_dir, "BlockMaker.log")
+        ) as writer:
+            for peptide in generation.variable_peptides(compact, ("oxidation",)):
+                writer.add(peptide)
+        self.assertEqual(writer.files_written, 3)
+        peptide = Peptide("MCMK", "MCMK", *settings)
+        self.assertEqual(compact.composition, peptide.composition)
+        self.assertEqual(compact.block_file_content(), peptide.block_file_content())
+        with open(os.path.join(output_dir, "MCMK.block")) as file:
+            self.assertEqual(file.read(), peptide.block_file_content())
+
+
+class MassIndexTest(unittest.TestCase):
+    '''m/z lookups of peptides.'''
+    def setUp(self):
+        # Many peptides with the same mass.
+        self.entries = [
+            ("".join(residues), "".join(residues))
+            for residues in itertools.product("GAMK", repeat = 3)
+        ]
+        self.index = mass_index.MassIndex.from_entries(
+            self.entries, "None (reduced form)", False, []
+        )
+        peptides = self.index.peptides
+        self.mzs = [
+            mass_index.mz_value(peptides[0].mass, 1),
+            mass_index.mz_value(peptides[20].mass, 2) * (1 + 5e-6),
+            mass_index.mz_value(peptides[-1].mass, 3) * (1 - 9e-6),
+            100.0
+        ]
+
+    def brute_force(self, mz, tolerance_ppm, max_charge):
+        '''Return the block names and charges of all matches of an m/z value.'''
+        return [
+            (peptide.block_name, charge)
+            for charge in range(1, max_charge + 1)
+            for peptide in self.index.peptides
+            if abs(mz - mass_index.mz_value(peptide.mass, charge))
+            <= mz * tolerance_ppm * 1e-6
+        ]
+
+    def check(self, matches, mz, tolerance_ppm, max_charge):
+        '''Compare matches of an m/z value with the brute force matches.'''
+        self.assertEqual(
+            [(peptide.block_name, charge) for peptide, charge, _ in matches],
+            self.brute_force(mz, tolerance_ppm, max_charge)
+        )
+        for peptide, charge, error_ppm in matches:
+            self.assertAlmostEqual(
+                error_ppm,
+                (mass_index.mz_value(peptide.mass, charge) - mz) / mz * 1e6
+            )
+
+    def test_query(self):
+        for mz in self.mzs:
+            self.check(self.index.query(mz, 10, 3), mz, 10, 3)
+        self.assertEqual(self.index.query(100.0, 10, 3), [])
+
+    def test_query_batch(self):
+        for matches, mz in zip(self.index.query_batch(self.mzs, 10, 3), self.mzs):
+            self.check(matches, mz, 10, 3)
+        self.assertEqual(self.index.query_batch([], 10, 3), [])
+
+    def test_empty_index(self):
+        index = mass_index.MassIndex([])
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.query(self.mzs[0], 10, 3), [])
+        self.assertEqual(index.query_batch(self.mzs, 10, 3), [[]] * len(self.mzs))
+
+
+class IsotopesTest(unittest.TestCase):
+    '''Isotopic distributions of peptides.'''
+    def setUp(self):
+        settings = ("Iodo- or chloroacetamide", True, [])
+        self.peptides = [
+            Peptide(sequence, sequence, *settings)
+            for sequence in ("PEPTIDEK", "MCMCWWYK", "G")
+        ]
+
+    def naive_distribution(self, composition, mass, n_peaks):
+        '''
+        Return the abundances and masses of the first n_peaks isotopologues,
+        by convolving the isotopes of every atom without truncation.
+        '''
+        abundances = [1.0]
+        weighted = [0.0]
+        for element in isotopes.ISOTOPES:
+            isotope_abundances = [
+                abundance for _, abundance in isotopes.ISOTOPES[element]
+            ]
+            isotope_weighted = [
+                abundance * (isotope_mass - isotopes.ISOTOPES[element][0][0])
+                if abundance > 0 else 0.0
+                for isotope_mass, abundance in isotopes.ISOTOPES[element]
+            ]
+            for _ in range(composition[element]):
+                abundances, weighted = (
+                    np.convolve(abundances, isotope_abundances),
+                    np.convolve(weighted, isotope_abundances)
+                    + np.convolve(abundances, isotope_weighted)
+                )
+        abundances, weighted = abundances[:n_peaks], weighted[:n_peaks]
+        return abundances, mass + weighted / abundances
+
+    def test_same_as_full_convolution(self):
+        calculator = isotopes.IsotopeCalculator(n_peaks = 6, threshold = 0)
+        for peptide in self.peptides:
+            abundances, masses = self.naive_distribution(
+                peptide.composition, peptide.mass, 6
+            )
+            distribution = calculator.peptide_distribution(peptide)
+            self.assertEqual(len(distribution), 6)
+            for (mass, abundance), expected_abundance, expected_mass in zip(
+                distribution, abundances, masses
+            ):
+                self.assertAlmostEqual(abundance, expected_abundance, places = 12)
+                self.assertAlmostEqual(mass, expected_mass, places = 9)
+        peak_masses, peak_abundances = calculator.peptide_distributions(self.peptides)
+        for peptide, row_masses, row_abundances in zip(
+            self.peptides, peak_masses, peak_abundances
+        ):
+            abundances, masses = self.naive_distribution(
+                peptide.composition, peptide.mass, 6
+            )
+            np.testing.assert_allclose(row_abundances, abundances, atol = 1e-12)
+            np.testing.assert_allclose(row_masses, masses, rtol = 0, atol = 1e-9)
+
+    def test_truncated_distribution_sums_to_one(self):
+        calculator = isotopes.IsotopeCalculator(n_peaks = 8)
+        for peptide in self.peptides:
+            total = sum(
+                abundance
+                for _, abundance in calculator.peptide_distribution(peptide)
+            )
+            self.assertLessEqual(total, 1 + 1e-12)
+            self.assertGreater(total, 0.999)
+
+
+class ArchiveTest(unittest.TestCase):
+    '''Block files in a single archive.'''
+    def setUp(self):
+        settings = ("Iodo- or chloroacetamide", False, [])
+        self.peptides = [
+            Peptide(sequence[0:4], sequence, *settings)
+            for sequence in ("PEPTIDEK", "AAAAK", "MCMCK")
+        ]
+        self.directory = tempfile.mkdtemp()
+
+    def write(self, filename):
+        '''Write the block files of the peptides to an archive.'''
+        path = os.path.join(self.directory, filename)
+        with archive.BlockArchive(path) as block_archive:
+            for peptide in self.peptides:
+                block_archive.add(peptide.block_name, peptide.block_file_content())
+        return path
+
+    def test_round_trip(self):
+        for filename in ("blocks.zip", "blocks.tar.gz"):
+            path = self.write(filename)
+            self.assertFalse(os.path.exists(path + ".tmp"))
+            self.assertEqual(
+                list(archive.read_blocks(path)),
+                [
+                    (peptide.block_name, peptide.block_file_content())
+                    for peptide in self.peptides
+                ]
+            )
+
+    def test_read_selected_blocks(self):
+        for filename in ("blocks.zip", "blocks.tar.gz"):
+            path = self.write(filename)
+            self.assertEqual(
+                [
+                    block_name for block_name, _ in
+                    archive.read_blocks(path, block_names = ["MCMC", "PEPT", "GGGG"])
+                ],
+                ["PEPT", "MCMC"]
+            )
+
+    def test_unknown_extension(self):
+        self.assertFalse(archive.is_archive_path("blocks.rar"))
+        with self.assertRaises(ValueError):
+            archive.BlockArchive(os.path.join(self.directory, "blocks.rar"))
+
+
+class SummaryTest(unittest.TestCase):
+    '''Summary tables of runs.'''
+    def setUp(self):
+        settings = ("Iodo- or chloroacetamide", True, ["K"])
+        self.peptides = [
+            Peptide(sequence[0:4], sequence, *settings)
+            for sequence in ("PEPTIDEK", "MCMCK")
+        ]
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        log.shutdown()
+
+    def run_writer(self, filename, cancel = False, **options):
+        '''Write the block files with a summary table, return its path.'''
+        path = os.path.join(self.output_dir, filename)
+        with BlockWriter(
+            self.output_dir, summary = path,
+            log_path = os.path.join(self.output_dir, "BlockMaker.log"),
+            **options
+        ) as writer:
+            for peptide in self.peptides:
+                writer.add(peptide)
+            if cancel:
+                writer.commit = False
+        return path
+
+    def test_csv(self):
+        path = self.run_writer("summary.csv")
+        with open(path, newline = "") as file:
+            rows = list(csv.reader(file))
+        self.assertEqual(tuple(rows[0]), summary.COLUMNS)
+        self.assertEqual(len(rows), 3)
+        for row, peptide in zip(rows[1:], self.peptides):
+            row = dict(zip(summary.COLUMNS, row))
+            self.assertEqual(row["block_name"], peptide.block_name)
+            self.assertEqual(row["sequence"], peptide.sequence)
+            self.assertEqual(float(row["mass"]), peptide.mass)
+            self.assertEqual(int(row["sulfurs"]), peptide.composition["sulfurs"])
+            self.assertEqual(row["isotope_labeling"], "K")
+            self.assertEqual(row["status"], "written")
+
+    def test_npy(self):
+        table = np.load(self.run_writer("summary.npy"))
+        self.assertEqual(table.dtype.names, summary.COLUMNS)
+        self.assertEqual(
+            table["block_name"].tolist(),
+            [peptide.block_name for peptide in self.peptides]
+        )
+        self.assertEqual(
+            table["mass"].tolist(), [peptide.mass for peptide in self.peptides]
+        )
+        self.assertEqual(
+            table["carbons"].tolist(),
+            [peptide.composition["carbons"] for peptide in self.peptides]
+        )
+        self.assertTrue(table["methionine_oxidation"].all())
+
+    def test_cancelled_staged_run(self):
+        path = self.run_writer("summary.csv", cancel = True, staged = True)
+        self.assertEqual(os.listdir(self.output_dir), ["BlockMaker.log"])
+        self.assertFalse(os.path.exists(path))
+
+
+class InstrumentationTest(unittest.TestCase):
+    '''Timers and counters of the hot paths.'''
+    def setUp(self):
+        self.original = utils.check_sequence_validity
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def calls(self):
+        '''Return the number of counted calls of check_sequence_validity.'''
+        functions = instrumentation.summary()["functions"]
+        return functions.get("utils.check_sequence_validity", {"calls": 0})["calls"]
+
+    def test_enable_and_disable(self):
+        instrumentation.enable()
+        self.assertTrue(instrumentation.enabled())
+        self.assertIsNot(utils.check_sequence_validity, self.original)
+        utils.check_sequence_validity("PEPTIDEK")
+        self.assertEqual(self.calls(), 1)
+        instrumentation.disable()
+        self.assertFalse(instrumentation.enabled())
+        self.assertIs(utils.check_sequence_validity, self.original)
+        self.assertNotIn(instrumentation.ENABLE_VARIABLE, os.environ)
+        utils.check_sequence_validity("PEPTIDEK")
+        self.assertEqual(self.calls(), 1)
+
+    def test_calls_from_threads(self):
+        instrumentation.enable()
+        with ThreadPoolExecutor(max_workers = 8) as pool:
+            for _ in pool.map(
+                utils.check_sequence_validity, ["PEPTIDEK"] * 4000
+            ):
+                pass
+        self.assertEqual(self.calls(), 4000)
+
+    def test_summary(self):
+        json_path = os.path.join(tempfile.mkdtemp(), "instrumentation.json")
+        instrumentation.enable(json_path = json_path)
+        instrumentation.start_run()
+        utils.check_sequence_validity("PEPTIDEK")
+        logger = mock.Mock()
+        instrumentation.finish_run(logger)
+        line, = logger.info.call_args.args
+        self.assertTrue(line.startswith("Instrumentation: "))
+        self.assertIn("utils.check_sequence_validity", line)
+        with open(json_path) as file:
+            stats = json.load(file)
+        self.assertEqual(
+            stats["functions"]["utils.check_sequence_validity"]["calls"], 1
+        )
+        self.assertIsNotNone(stats["seconds"])
+        # The counters are reset for the next run.
+        self.assertEqual(self.calls(), 0)
 
 
 if __name__ == "__main__":
-    pass
\ No newline at end of file
+    unittest.main()